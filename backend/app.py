@@ -1,22 +1,61 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+
+# Cold-start clock for the Lambda handler; started before the heavy imports below
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session, g, stream_with_context
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
 from functools import wraps
 import os
+import re
+import io
 import json
+import random
+import base64
+import bisect
+import atexit
+import sqlite3
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks; the journal stays one-process by convention
+    fcntl = None
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from collections import OrderedDict
+from array import array
+import gzip
 import uuid
-from datetime import datetime
-from typing import List, Dict, Optional
+import hashlib
+import itertools
+from urllib.parse import urlencode, unquote_to_bytes
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import List, Dict, Optional, Iterator, Tuple
 import boto3
-from boto3.dynamodb.conditions import Key
-from werkzeug.test import EnvironBuilder
-from werkzeug.wrappers import Response
+from botocore.config import Config as BotoConfig
+from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeSerializer
+import sys
+import queue
 import logging
+import logging.handlers
 from dotenv import load_dotenv
 
+try:
+    import brotli  # optional: enables Content-Encoding: br for the JSON API
+except ImportError:
+    brotli = None
+
 try:
     from .config import Config
+    from .worker_pool import start_process_pool
+    from .receipts import ReceiptRenderer
 except ImportError:
     from config import Config
+    from worker_pool import start_process_pool
+    from receipts import ReceiptRenderer
 
 # Load environment variables from .env if present
 load_dotenv()
@@ -28,10 +67,52 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 _config = Config()
 USE_MOCK_AWS = _config.USE_MOCK_AWS
 MOCK_UPLOADS_DIR = _config.MOCK_UPLOADS_DIR
+LAMBDA_LOG_SAMPLE_RATE = _config.LAMBDA_LOG_SAMPLE_RATE
+COLD_START_BUDGET_MS = _config.COLD_START_BUDGET_MS
 AWS_REGION = _config.AWS_REGION
 DYNAMODB_TABLE_TRAINS = _config.DYNAMODB_TABLE_TRAINS
 DYNAMODB_TABLE_BOOKINGS = _config.DYNAMODB_TABLE_BOOKINGS
 DYNAMODB_TABLE_USERS = _config.DYNAMODB_TABLE_USERS
+DYNAMODB_TABLE_INVENTORY = _config.DYNAMODB_TABLE_INVENTORY
+BOOKING_WINDOW_DAYS = _config.BOOKING_WINDOW_DAYS
+MOCK_STATE_BACKEND = _config.MOCK_STATE_BACKEND
+MOCK_STATE_DB = _config.MOCK_STATE_DB
+MOCK_DB_FILE = _config.MOCK_DB_FILE
+MOCK_JOURNAL_COMPACT_RECORDS = _config.MOCK_JOURNAL_COMPACT_RECORDS
+MOCK_JOURNAL_FSYNC_INTERVAL = _config.MOCK_JOURNAL_FSYNC_INTERVAL
+DYNAMODB_TABLE_COUNTERS = _config.DYNAMODB_TABLE_COUNTERS
+DYNAMODB_TABLE_LOGIN_KEYS = _config.DYNAMODB_TABLE_LOGIN_KEYS
+DYNAMODB_TABLE_OUTBOX = _config.DYNAMODB_TABLE_OUTBOX
+ID_BLOCK_SIZE = _config.ID_BLOCK_SIZE
+AWS_MAX_POOL_CONNECTIONS = _config.AWS_MAX_POOL_CONNECTIONS
+AWS_CONNECT_TIMEOUT = _config.AWS_CONNECT_TIMEOUT
+AWS_READ_TIMEOUT = _config.AWS_READ_TIMEOUT
+AWS_MAX_ATTEMPTS = _config.AWS_MAX_ATTEMPTS
+USER_CACHE_TTL = _config.USER_CACHE_TTL
+TRAIN_CACHE_TTL = _config.TRAIN_CACHE_TTL
+TRAIN_AVAILABILITY_TTL = _config.TRAIN_AVAILABILITY_TTL
+TRAIN_CACHE_STRONG_PAYMENT = _config.TRAIN_CACHE_STRONG_PAYMENT
+API_CACHE_TTL = _config.API_CACHE_TTL
+API_CACHE_MAX_AGE = _config.API_CACHE_MAX_AGE
+API_STALE_WHILE_REVALIDATE = _config.API_STALE_WHILE_REVALIDATE
+PNR_CACHE_TTL = _config.PNR_CACHE_TTL
+PNR_MISS_CACHE_TTL = _config.PNR_MISS_CACHE_TTL
+TRUST_PROXY = _config.TRUST_PROXY
+PNR_RATE_LIMIT = _config.PNR_RATE_LIMIT
+PNR_RATE_BURST = _config.PNR_RATE_BURST
+OPS_STREAM_INTERVAL = _config.OPS_STREAM_INTERVAL
+OPS_STREAM_SECONDS = _config.OPS_STREAM_SECONDS
+SESSION_USER_SNAPSHOT = _config.SESSION_USER_SNAPSHOT
+SESSION_SNAPSHOT_MAX_AGE = _config.SESSION_SNAPSHOT_MAX_AGE
+PASSWORD_HASH_METHOD = _config.PASSWORD_HASH_METHOD
+PASSWORD_HASH_WORKERS = _config.PASSWORD_HASH_WORKERS
+PASSWORD_HASH_QUEUE = _config.PASSWORD_HASH_QUEUE
+OUTBOX_WORKERS = _config.OUTBOX_WORKERS
+OUTBOX_MAX_ATTEMPTS = _config.OUTBOX_MAX_ATTEMPTS
+NOTIFY_BATCH_SIZE = _config.NOTIFY_BATCH_SIZE
+NOTIFY_BATCH_WAIT = _config.NOTIFY_BATCH_WAIT
+NOTIFY_MAX_PENDING = _config.NOTIFY_MAX_PENDING
+RECEIPT_FORMAT = _config.RECEIPT_FORMAT if _config.RECEIPT_FORMAT in ('txt', 'pdf') else 'txt'
 S3_BUCKET_NAME = _config.S3_BUCKET_NAME
 LAMBDA_FUNCTION_NAME = _config.LAMBDA_FUNCTION_NAME
 BOOTSTRAP_ADMIN_EMAIL = _config.BOOTSTRAP_ADMIN_EMAIL
@@ -434,418 +515,3183 @@ mock_trains = [
 mock_users = []
 mock_bookings = []
 
+
+def login_keys(username: str, email: str) -> List[str]:
+    """
+    Lowercased login keys of a user. Usernames and emails share one
+    namespace, so a single lookup resolves either and a value can never
+    belong to two users.
+    """
+    keys = []
+    for value in (username, email):
+        key = (value or '').strip().lower()
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+def ops_increments(booking: Dict) -> List[Tuple[str, str, float]]:
+    """
+    Counter increments a committed booking adds to the operations summary,
+    as (document, field, amount). Documents: day#<booking date> holds
+    bookings per hour and that day's totals, and totals the all-time totals.
+    Seats per journey are not counted here; they are read from the seat
+    inventory (see DatabaseService.get_ops_summary).
+    """
+    booked_at = booking.get("BookingDate") or datetime.now().isoformat()
+    day, hour = booked_at[:10], booked_at[11:13]
+    seats = int(booking.get("Seats") or 0)
+    revenue = float(booking.get("TotalFare") or 0)
+    return [
+        (f"day#{day}", f"Hour#{hour}", 1),
+        (f"day#{day}", "Bookings", 1),
+        (f"day#{day}", "Revenue", revenue),
+        ("totals", "Bookings", 1),
+        ("totals", "Seats", seats),
+        ("totals", "Revenue", revenue),
+    ]
+
 # Counter for generating unique booking IDs and PNR
 booking_id_counter = 10000
 pnr_counter = 8000000000  # PNR numbers are 10 digits
 
+# Last value issued before the first lease, per durable ID counter. Deployments
+# holding bookings from before the counters must seed them above the highest
+# BookingID and PNR in use first (backfill_id_counters.py)
+ID_COUNTER_STARTS = {'booking_id': booking_id_counter, 'pnr': pnr_counter}
+PNR_MAX = 9999999999
 
-class DatabaseService:
-    """Service class for database operations"""
-    
-    def __init__(self):
-        self.use_mock = USE_MOCK_AWS
-        
-        if not self.use_mock:
-            # Initialize DynamoDB client when USE_MOCK_AWS = False
-            self.dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-            self.trains_table = self.dynamodb.Table(DYNAMODB_TABLE_TRAINS)
-            self.bookings_table = self.dynamodb.Table(DYNAMODB_TABLE_BOOKINGS)
-    
-    def search_trains(self, route_query: str = None) -> List[Dict]:
-        """
-        Search for trains by route
-        Args:
-            route_query: Optional search term to filter routes
-        Returns:
-            List of train dictionaries matching the search
-        """
-        if self.use_mock:
-            # Mock implementation: Filter trains from in-memory list
-            if route_query:
-                route_query_lower = route_query.lower()
-                results = [
-                    train for train in mock_trains
-                    if route_query_lower in train["Route"].lower()
-                ]
-                return results
-            return mock_trains.copy()
-        
-        else:
-            # Real DynamoDB implementation
-            try:
-                if route_query:
-                    response = self.trains_table.scan(
-                        FilterExpression=Key('Route').contains(route_query)
-                    )
-                else:
-                    response = self.trains_table.scan()
-                
-                return response.get('Items', [])
-            except Exception as e:
-                print(f"Error searching trains in DynamoDB: {str(e)}")
-                return []
-    
-    def get_train_by_id(self, train_id: str) -> Optional[Dict]:
-        """
-        Get a specific train by TrainID
-        Args:
-            train_id: The TrainID to search for
-        Returns:
-            Train dictionary or None if not found
-        """
-        if self.use_mock:
-            # Mock implementation: Search in-memory list
-            for train in mock_trains:
-                if train["TrainID"] == train_id:
-                    return train.copy()
-            return None
-        
-        else:
-            # Real DynamoDB implementation
-            try:
-                response = self.trains_table.get_item(
-                    Key={'TrainID': train_id}
-                )
-                return response.get('Item')
-            except Exception as e:
-                print(f"Error getting train from DynamoDB: {str(e)}")
-                return None
-    
-    def update_train_availability(self, train_id: str, class_name: str, seats_to_reserve: int) -> bool:
-        """
-        Decrement train availability when booking seats for a specific class
-        Args:
-            train_id: The TrainID to update
-            class_name: The class name (AC1, AC2, AC3, SL, GN, etc.)
-            seats_to_reserve: Number of seats to reserve
-        Returns:
-            True if successful, False if insufficient availability
-        """
-        if self.use_mock:
-            # Mock implementation: Update in-memory list
-            for train in mock_trains:
-                if train["TrainID"] == train_id:
-                    if "Classes" in train and class_name in train["Classes"]:
-                        if train["Classes"][class_name]["Availability"] >= seats_to_reserve:
-                            train["Classes"][class_name]["Availability"] -= seats_to_reserve
-                            return True
-                    return False
-            return False
-        
-        else:
-            # Real DynamoDB implementation
-            try:
-                self.trains_table.update_item(
-                    Key={'TrainID': train_id},
-                    UpdateExpression='SET #classes.#class.#availability = #classes.#class.#availability - :seats',
-                    ExpressionAttributeNames={
-                        '#classes': 'Classes',
-                        '#class': class_name,
-                        '#availability': 'Availability'
-                    },
-                    ExpressionAttributeValues={':seats': seats_to_reserve},
-                    ConditionExpression='#classes.#class.#availability >= :seats',
-                    ReturnValues='UPDATED_NEW'
-                )
-                return True
-            except self.dynamodb.meta.client.exceptions.ClientError as e:
-                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
-                    print(f"Insufficient availability for train {train_id}, class {class_name}")
-                else:
-                    print(f"Error updating train availability in DynamoDB: {str(e)}")
-                return False
-    
-    def generate_pnr(self) -> str:
-        """Generate a 10-digit PNR number"""
-        global pnr_counter
-        pnr_counter += 1
-        return str(pnr_counter)
-    
-    def allocate_berth(self, class_name: str, seats: int) -> list:
+# Work done after a booking commits, through the outbox (see PostBookingOutbox)
+POST_BOOKING_EFFECTS = ('receipt', 'notification', 'summary')
+# Automatic reloads of the booking success page while its receipt is pending
+RECEIPT_REFRESH_LIMIT = 5
+
+# Bookings GSI: UserID partition, BookingDate sort key (newest first with ScanIndexForward=False)
+USER_BOOKINGS_INDEX = 'UserBookingDateIndex'
+# Bookings GSI: PNR partition, for PNR status enquiries
+PNR_INDEX = 'PnrIndex'
+
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    Values are stored and returned as-is; callers copy mutable values.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl: float = None):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RateLimiter:
+    """
+    Per-client token buckets: each client may make `rate` requests per second
+    with bursts of up to `burst`. Buckets live in this process only; the
+    least recently seen clients are forgotten beyond `max_clients`.
+    A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 100000):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()  # client -> [tokens, last refill time]
+        self._lock = threading.Lock()
+
+    def hit(self, client: str) -> float:
         """
-        Allocate berth/seat numbers based on class
-        Args:
-            class_name: The class name
-            seats: Number of seats
+        Take one token for `client`
         Returns:
-            List of berth/seat allocations
+            0 if the request may proceed, else the seconds until it may retry
         """
-        import random
-        
-        berths = []
-        berth_types = ["Lower", "Middle", "Upper", "Side Lower", "Side Upper"]
-        coach_prefixes = {
-            "AC1": "A",
-            "AC2": "B",
-            "AC3": "C",
-            "SL": "S",
-            "GN": "G",
-            "AC Chair Car": "CC",
-            "Executive": "E"
-        }
-        
-        prefix = coach_prefixes.get(class_name, "X")
-        
-        for i in range(seats):
-            coach_num = random.randint(1, 10)
-            berth_num = random.randint(1, 72)
-            berth_type = random.choice(berth_types) if class_name in ["AC2", "AC3", "SL"] else "Seat"
-            berths.append({
-                "Coach": f"{prefix}{coach_num}",
-                "Berth": f"{berth_num}",
-                "Type": berth_type
-            })
-        
-        return berths
-    
-    def create_booking(self, train_id: str, route: str, time: str, seats: int, 
-                       passenger_name: str, train_name: str = None, class_name: str = None,
-                       journey_date: str = None, passengers: list = None, berth_preference: str = None,
-                       user_id: str = None) -> Dict:
+        if self.rate <= 0:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is None:
+                bucket = self._buckets[client] = [float(self.burst), now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / self.rate
+
+
+class AwsClients:
+    """
+    Process-wide registry of boto3 clients, resources and DynamoDB tables.
+    Everything is built on first use from one shared session and one client
+    config (connection pool, keep-alive, timeouts, adaptive retries), so all
+    services reuse the same connections. boto3 objects must not cross a
+    fork, so a new process (e.g. a gunicorn worker after --preload) starts
+    from a fresh session.
+    """
+
+    # Services used through a resource; their client is the resource's own
+    RESOURCE_SERVICES = ('dynamodb',)
+
+    def __init__(self, region: str, max_pool_connections: int, connect_timeout: float,
+                 read_timeout: float, max_attempts: int):
+        self.region = region
+        self.config = BotoConfig(
+            region_name=region,
+            max_pool_connections=max_pool_connections,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            tcp_keepalive=True,
+            retries={'mode': 'adaptive', 'total_max_attempts': max_attempts}
+        )
+        self._lock = threading.RLock()  # tables are built from the resource under the lock
+        self._pid = None
+        self._session = None
+        self._objects = {}
+
+    def _get(self, key: tuple, build):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Inherited from the parent process (or first use): start over
+                self._pid = os.getpid()
+                self._session = boto3.session.Session(region_name=self.region)
+                self._objects = {}
+            obj = self._objects.get(key)
+            if obj is None:
+                obj = self._objects[key] = build(self._session)
+            return obj
+
+    def resource(self, service: str):
+        return self._get(('resource', service), lambda session: session.resource(service, config=self.config))
+
+    def client(self, service: str):
+        if service in self.RESOURCE_SERVICES:
+            return self.resource(service).meta.client
+        return self._get(('client', service), lambda session: session.client(service, config=self.config))
+
+    def table(self, name: str):
+        return self._get(('table', name), lambda session: self.resource('dynamodb').Table(name))
+
+
+# Request threads plus the outbox and notification batcher threads share the pool
+aws_clients = AwsClients(
+    AWS_REGION,
+    AWS_MAX_POOL_CONNECTIONS + OUTBOX_WORKERS + 1,
+    AWS_CONNECT_TIMEOUT,
+    AWS_READ_TIMEOUT,
+    AWS_MAX_ATTEMPTS
+)
+
+
+def _tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    return re.findall(r"[a-z0-9]+", (text or "").lower())
+
+
+def _split_route(route: str) -> tuple:
+    """
+    Split a "Origin - Destination" route string into its two stations
+    Args:
+        route: Route string as stored on the train record
+    Returns:
+        (origin, destination) tuple; destination is '' for malformed routes
+    """
+    parts = [part.strip() for part in (route or "").split(" - ", 1)]
+    if len(parts) < 2:
+        return parts[0], ""
+    return parts[0], parts[1]
+
+
+class StationIndex:
+    """
+    Prefix and trigram index over station names for typeahead and
+    origin/destination resolution ("Mum" -> "Mumbai", "Mumbai Central").
+    """
+
+    def __init__(self):
+        self.names = {}            # station_lower -> display name
+        self.prefix_entries = []   # sorted (name or word-suffix, station_lower) pairs
+        self.trigrams = {}         # trigram -> set of station_lower
+
+    @staticmethod
+    def _trigrams(text: str) -> set:
+        padded = f"  {text} "
+        return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+    def add(self, name: str):
+        """Index a station name (no-op for blanks and duplicates)"""
+        key = (name or "").strip().lower()
+        if not key or key in self.names:
+            return
+        self.names[key] = name.strip()
+
+        # Index every word boundary so "Central" also finds "Mumbai Central"
+        words = key.split()
+        for i in range(len(words)):
+            bisect.insort(self.prefix_entries, (" ".join(words[i:]), key))
+
+        for gram in self._trigrams(key):
+            self.trigrams.setdefault(gram, set()).add(key)
+
+    def prefix(self, query: str) -> List[str]:
+        """Stations with a word starting with query, via binary search"""
+        query = (query or "").strip().lower()
+        if not query:
+            return []
+        matches = []
+        i = bisect.bisect_left(self.prefix_entries, (query,))
+        while i < len(self.prefix_entries) and self.prefix_entries[i][0].startswith(query):
+            station = self.prefix_entries[i][1]
+            if station not in matches:
+                matches.append(station)
+            i += 1
+        return sorted(matches)
+
+    def similar(self, query: str, threshold: float = 0.3) -> List[str]:
+        """Stations ranked by trigram similarity, for misspelled input"""
+        query = (query or "").strip().lower()
+        if not query:
+            return []
+        query_grams = self._trigrams(query)
+        shared = {}
+        for gram in query_grams:
+            for station in self.trigrams.get(gram, ()):
+                shared[station] = shared.get(station, 0) + 1
+
+        scored = []
+        for station, count in shared.items():
+            score = count / len(query_grams | self._trigrams(station))
+            if score >= threshold:
+                scored.append((-score, station))
+        return [station for _, station in sorted(scored)]
+
+    def resolve(self, query: str) -> List[str]:
         """
-        Create a new booking record with IRCTC-style details
-        Args:
-            train_id: The TrainID
-            route: The route name
-            time: Departure time
-            seats: Number of seats booked
-            passenger_name: Name of the passenger
-            train_name: Optional train name
-            class_name: Train class (AC1, AC2, AC3, SL, GN, etc.)
-            journey_date: Date of journey
-            passengers: List of passenger details (name, age, gender)
-            berth_preference: Berth preference (Lower, Middle, Upper, etc.)
+        Resolve user input to indexed stations
         Returns:
-            Booking dictionary with BookingID and PNR
+            Stations with a word starting with the input ("Delhi" also covers
+            "New Delhi"), or fuzzy matches when nothing matches by prefix
         """
-        global booking_id_counter
-        
-        if self.use_mock:
-            # Mock implementation: Add to in-memory list
-            booking_id_counter += 1
-            pnr = self.generate_pnr()
-            
-            # Get fare for the class
-            fare_per_seat = 0
-            for train in mock_trains:
-                if train["TrainID"] == train_id and "Classes" in train:
-                    if class_name and class_name in train["Classes"]:
-                        fare_per_seat = train["Classes"][class_name]["Fare"]
-                        break
-            
-            total_fare = fare_per_seat * seats
-            
-            # Allocate berths
-            berth_allocations = self.allocate_berth(class_name, seats) if class_name else []
-            
-            booking = {
-                "BookingID": str(booking_id_counter),
-                "PNR": pnr,
-                "TrainID": train_id,
-                "Route": route,
-                "Time": time,
-                "Seats": seats,
-                "PassengerName": passenger_name,
-                "BookingDate": datetime.now().isoformat(),
-                "Status": "Confirmed",
-                "Class": class_name or "GN",
-                "JourneyDate": journey_date or datetime.now().strftime("%Y-%m-%d"),
-                "TotalFare": total_fare,
-                "FarePerSeat": fare_per_seat,
-                "BerthAllocations": berth_allocations,
-                "BerthPreference": berth_preference or "No Preference",
-                "UserID": user_id
-            }
-            
-            if train_name:
-                booking["TrainName"] = train_name
-            
-            if passengers:
-                booking["Passengers"] = passengers
-            else:
-                # Default passenger if not provided
-                booking["Passengers"] = [{
-                    "Name": passenger_name,
-                    "Age": "N/A",
-                    "Gender": "N/A"
-                }]
-            
-            mock_bookings.append(booking)
-            return booking
-        
-        else:
-            # Real DynamoDB implementation
-            import uuid
-            booking_id = f"BK{datetime.now().strftime('%Y%m%d%H%M%S')}{str(uuid.uuid4())[:8].upper()}"
-            pnr = self.generate_pnr()
-            
-            # Get fare for the class
-            train_details = self.get_train_by_id(train_id)
-            fare_per_seat = 0
-            if train_details and "Classes" in train_details:
-                if class_name and class_name in train_details["Classes"]:
-                    fare_per_seat = train_details["Classes"][class_name]["Fare"]
-            
-            total_fare = fare_per_seat * seats
-            
-            # Allocate berths
-            berth_allocations = self.allocate_berth(class_name, seats) if class_name else []
-            
-            booking = {
-                "BookingID": booking_id,
-                "PNR": pnr,
-                "TrainID": train_id,
-                "Route": route,
-                "Time": time,
-                "Seats": seats,
-                "PassengerName": passenger_name,
-                "BookingDate": datetime.now().isoformat(),
-                "Status": "Confirmed",
-                "Class": class_name or "GN",
-                "JourneyDate": journey_date or datetime.now().strftime("%Y-%m-%d"),
-                "TotalFare": total_fare,
-                "FarePerSeat": fare_per_seat,
-                "BerthAllocations": berth_allocations,
-                "BerthPreference": berth_preference or "No Preference",
-                "UserID": user_id
-            }
-            
-            if train_name:
-                booking["TrainName"] = train_name
-            
-            if passengers:
-                booking["Passengers"] = passengers
-            else:
-                # Default passenger if not provided
-                booking["Passengers"] = [{
-                    "Name": passenger_name,
-                    "Age": "N/A",
-                    "Gender": "N/A"
-                }]
-            
-            try:
-                self.bookings_table.put_item(Item=booking)
-                return booking
-            except Exception as e:
-                print(f"Error creating booking in DynamoDB: {str(e)}")
-                return {}
-    
-    def get_booking_by_id(self, booking_id: str) -> Optional[Dict]:
+        return self.prefix(query) or self.similar(query)
+
+    def containing(self, query: str) -> List[str]:
+        """Stations whose name contains query anywhere (the station list is small)"""
+        query = (query or "").lower()
+        return sorted(station for station in self.names if query in station)
+
+    def suggest(self, query: str, limit: int = 10) -> List[str]:
+        """Display names for typeahead: prefix matches first, then fuzzy ones"""
+        stations = self.prefix(query)
+        if len(stations) < limit:
+            stations += [s for s in self.similar(query) if s not in stations]
+        return [self.names[station] for station in stations[:limit]]
+
+
+class TrainCatalog:
+    """
+    In-memory index over the train catalog.
+    Holds references to the train records (not copies), so availability
+    changes made through the catalog are visible everywhere immediately.
+    Postings are row positions rather than TrainIDs because the same
+    TrainID can appear on more than one row.
+    """
+
+    def __init__(self, trains: List[Dict]):
+        self.trains = trains
+        self.by_id = {}          # TrainID -> first train record with that ID
+        self.route_lower = []    # row -> lowercased route, computed once
+        self.token_index = {}    # station token -> set of rows
+        self.pair_index = {}     # (origin_lower, destination_lower) -> list of rows
+        self.origin_index = {}   # origin_lower -> list of rows
+        self.destination_index = {}  # destination_lower -> list of rows
+        self.stations = StationIndex()
+        for row, train in enumerate(trains):
+            self._index(row, train)
+
+    def _index(self, row: int, train: Dict):
+        route = train.get("Route", "")
+        self.by_id.setdefault(train["TrainID"], train)
+        self.route_lower.append(route.lower())
+
+        for token in _tokenize(route):
+            self.token_index.setdefault(token, set()).add(row)
+
+        origin, destination = _split_route(route)
+        self.pair_index.setdefault((origin.lower(), destination.lower()), []).append(row)
+        self.origin_index.setdefault(origin.lower(), []).append(row)
+        self.destination_index.setdefault(destination.lower(), []).append(row)
+        self.stations.add(origin)
+        self.stations.add(destination)
+
+    def add(self, train: Dict):
+        """Add a train record to the catalog and its indexes"""
+        self.trains.append(train)
+        self._index(len(self.trains) - 1, train)
+
+    def get(self, train_id: str) -> Optional[Dict]:
+        """O(1) lookup by TrainID; returns the live record"""
+        return self.by_id.get(train_id)
+
+    def _rows(self, rows) -> List[Dict]:
+        return [self.trains[row] for row in sorted(rows)]
+
+    def search(self, route_query: str) -> List[Dict]:
         """
-        Get a booking by BookingID
+        Substring search over routes, answered from the token index.
+        Every query token must be contained in some station token of the
+        route, so candidates come from the (small) token vocabulary rather
+        than from every train; the exact substring check then runs only on
+        those candidates.
         Args:
-            booking_id: The BookingID to search for
+            route_query: Search term, matched case-insensitively
         Returns:
-            Booking dictionary or None if not found
+            List of live train records in catalog order
         """
-        if self.use_mock:
-            # Mock implementation: Search in-memory list
-            for booking in mock_bookings:
-                if booking["BookingID"] == booking_id:
-                    return booking.copy()
-            return None
-    
-    def get_bookings_by_user_id(self, user_id: str) -> List[Dict]:
+        return [self.trains[row] for row in self.search_rows(route_query)]
+
+    def search_rows(self, route_query: str) -> List[int]:
+        """Row numbers of the trains matching `route_query` (see search), in catalog order"""
+        query = (route_query or "").lower()
+        tokens = _tokenize(query)
+        if not tokens:
+            return [row for row, route in enumerate(self.route_lower) if query in route]
+
+        candidates = None
+        for token in tokens:
+            matches = set()
+            for indexed_token, rows in self.token_index.items():
+                if token in indexed_token:
+                    matches |= rows
+            candidates = matches if candidates is None else candidates & matches
+            if not candidates:
+                return []
+
+        return sorted(row for row in candidates if query in self.route_lower[row])
+
+    def find_by_stations(self, origin: str = None, destination: str = None) -> List[Dict]:
         """
-        Get all bookings for a specific user
+        Structured origin/destination search.
+        Each side is resolved through the station index (so "Mum" matches
+        "Mumbai" and "Mumbai Central"); a blank side matches any station.
         Args:
-            user_id: The UserID to search for
+            origin: Origin station name or prefix
+            destination: Destination station name or prefix
         Returns:
-            List of booking dictionaries
+            List of live train records in catalog order
         """
-        if self.use_mock:
-            # Mock implementation: Filter bookings by user_id
-            user_bookings = [
-                booking.copy() for booking in mock_bookings
-                if booking.get("UserID") == user_id
-            ]
-            # Sort by booking date (newest first)
-            user_bookings.sort(key=lambda x: x.get("BookingDate", ""), reverse=True)
-            return user_bookings
-        
+        origin = (origin or "").strip()
+        destination = (destination or "").strip()
+        if not origin and not destination:
+            return list(self.trains)
+
+        origins = self.stations.resolve(origin) if origin else None
+        destinations = self.stations.resolve(destination) if destination else None
+        if origins == [] or destinations == []:
+            return []
+
+        rows = set()
+        if origins is not None and destinations is not None:
+            for o in origins:
+                for d in destinations:
+                    rows.update(self.pair_index.get((o, d), ()))
+        elif origins is not None:
+            for o in origins:
+                rows.update(self.origin_index.get(o, ()))
         else:
-            # Real DynamoDB implementation
-            try:
-                response = self.bookings_table.query(
-                    IndexName='UserIdIndex',
-                    KeyConditionExpression=Key('UserID').eq(user_id)
-                )
-                user_bookings = response.get('Items', [])
-                # Sort by booking date (newest first)
-                user_bookings.sort(key=lambda x: x.get("BookingDate", ""), reverse=True)
-                return user_bookings
-            except Exception as e:
-                print(f"Error getting bookings by user ID from DynamoDB: {str(e)}")
-                return []
+            for d in destinations:
+                rows.update(self.destination_index.get(d, ()))
+        return self._rows(rows)
 
 
-# Global instance for easy import
-db_service = DatabaseService()
+# Index built once over the mock catalog
+train_catalog = TrainCatalog(mock_trains)
 
 
-class UserService:
-    """Service class for user authentication and management"""
+class TrainCache:
+    """
+    Per-process read-through cache for DynamoDB train data, in two tiers.
+    Static attributes (route, time, name, fares, class templates) and search
+    results almost never change and live for `static_ttl`. Per-date seat
+    availability moves with every booking, so it lives for `availability_ttl`
+    and is dropped whenever this process writes the inventory; other
+    processes' bookings show up within that TTL. A TTL of 0 disables a tier.
+    `version` counts this process's seat writes (in both modes), so anything
+    derived from train data can be keyed on it.
+    """
 
-    def __init__(self):
-        self.use_mock = USE_MOCK_AWS
-        if not self.use_mock:
-            self.dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-            self.users_table = self.dynamodb.Table(DYNAMODB_TABLE_USERS)
+    def __init__(self, static_ttl: float, availability_ttl: float):
+        self.trains = TTLCache(maxsize=5000 if static_ttl > 0 else 0, ttl=static_ttl)
+        self.searches = TTLCache(maxsize=1000 if static_ttl > 0 else 0, ttl=static_ttl)
+        self.availability = TTLCache(maxsize=20000 if availability_ttl > 0 else 0, ttl=availability_ttl)
+        self._versions = itertools.count(1)
+        self.version = 0
 
-    def _normalize_user(self, user: Optional[Dict]) -> Optional[Dict]:
-        if not user:
-            return None
+    def put_search(self, key: tuple, trains: List[Dict]):
+        """Remember a search result and the train records it returned"""
+        self.searches.set(key, trains)
+        for train in trains:
+            self.trains.set(train["TrainID"], train)
 
-        if 'user_id' in user:
-            user_copy = user.copy()
-            user_copy.pop('password_hash', None)
-            return user_copy
+    def invalidate_availability(self, train_id: str, day: date):
+        self.availability.invalidate((train_id, day))
+        self.version = next(self._versions)
 
+    def stats(self) -> Dict:
+        """Hit/miss counters and current size per tier"""
         return {
-            'user_id': user.get('UserID'),
-            'username': user.get('Username'),
-            'email': user.get('Email'),
-            'full_name': user.get('FullName'),
-            'phone': user.get('Phone'),
-            'created_at': user.get('CreatedAt'),
-            'bookings': user.get('Bookings', []),
-            'is_admin': user.get('IsAdmin', False)
+            name: {'hits': tier.hits, 'misses': tier.misses, 'size': len(tier)}
+            for name, tier in (('trains', self.trains), ('searches', self.searches), ('availability', self.availability))
         }
 
-    def _get_user_by_username_or_email(self, login_value: str) -> Optional[Dict]:
-        if self.use_mock:
-            for user in mock_users:
-                if user['username'] == login_value or user['email'] == login_value:
-                    return user.copy()
-            return None
 
-        login_value = (login_value or '').strip().lower()
-        if not login_value:
-            return None
+def parse_journey_date(journey_date: str) -> Optional[date]:
+    """Parse a YYYY-MM-DD journey date, returning None if it is malformed"""
+    try:
+        return datetime.strptime((journey_date or "").strip(), "%Y-%m-%d").date()
+    except ValueError:
+        return None
 
-        try:
-            response = self.users_table.query(
-                IndexName='UsernameLowerIndex',
-                KeyConditionExpression=Key('UsernameLower').eq(login_value)
-            )
-            items = response.get('Items', [])
-            if items:
-                return items[0]
-        except Exception:
-            pass
 
-        try:
-            response = self.users_table.query(
-                IndexName='EmailLowerIndex',
-                KeyConditionExpression=Key('EmailLower').eq(login_value)
-            )
-            items = response.get('Items', [])
-            if items:
-                return items[0]
-        except Exception:
-            pass
+def class_capacity(train: Optional[Dict], class_name: str) -> Optional[int]:
+    """
+    Seats per journey date for a class. The Availability on the train record
+    is the per-date template; live counts are kept by the seat inventory.
+    """
+    if not train or class_name not in (train.get("Classes") or {}):
+        return None
+    return int(train["Classes"][class_name]["Availability"])
+
+
+class SeatInventory:
+    """
+    Per-journey-date seat counters for mock mode, keyed by
+    (TrainID, JourneyDate, Class).
+    Each (train, class) pair owns one contiguous array('i') indexed by day,
+    so a date lookup is O(1) and a rolling window is a slice. Days that were
+    never booked hold UNSET and read as the class template from the catalog,
+    which is how dates are created lazily.
+    """
+
+    UNSET = -1
+
+    def __init__(self, catalog: TrainCatalog):
+        self.catalog = catalog
+        self._counters = {}  # (train_id, class_name) -> [first day ordinal, array of remaining seats]
+
+    def _read(self, train_id: str, class_name: str, day: int, capacity: int) -> int:
+        entry = self._counters.get((train_id, class_name))
+        if entry is None:
+            return capacity
+        first, counters = entry
+        index = day - first
+        if index < 0 or index >= len(counters) or counters[index] == self.UNSET:
+            return capacity
+        return counters[index]
+
+    def _slot(self, train_id: str, class_name: str, day: int) -> Tuple[array, int]:
+        """Return (counters, index) for a day, growing the array to cover it"""
+        entry = self._counters.get((train_id, class_name))
+        if entry is None:
+            entry = [day, array('i', [self.UNSET])]
+            self._counters[(train_id, class_name)] = entry
+        first, counters = entry
+        if day < first:
+            counters[0:0] = array('i', [self.UNSET]) * (first - day)
+            entry[0] = first = day
+        index = day - first
+        if index >= len(counters):
+            counters.extend(array('i', [self.UNSET]) * (index - len(counters) + 1))
+        return counters, index
+
+    def get(self, train_id: str, journey_date: date, class_name: str) -> Optional[int]:
+        """Remaining seats for one class on one date, or None for an unknown class"""
+        capacity = class_capacity(self.catalog.get(train_id), class_name)
+        if capacity is None:
+            return None
+        return self._read(train_id, class_name, journey_date.toordinal(), capacity)
+
+    def get_classes(self, train_id: str, journey_date: date) -> Dict[str, int]:
+        """Remaining seats for every class of a train on one date"""
+        train = self.catalog.get(train_id)
+        if not train:
+            return {}
+        day = journey_date.toordinal()
+        return {
+            class_name: self._read(train_id, class_name, day, int(class_info["Availability"]))
+            for class_name, class_info in (train.get("Classes") or {}).items()
+        }
+
+    def window(self, train_id: str, class_name: str, start: date, days: int) -> List[int]:
+        """Remaining seats for `days` consecutive dates starting at `start`"""
+        capacity = class_capacity(self.catalog.get(train_id), class_name)
+        if capacity is None:
+            return []
+        first_day = start.toordinal()
+        entry = self._counters.get((train_id, class_name))
+        if entry is None:
+            return [capacity] * days
+        first, counters = entry
+        lo, hi = max(first_day - first, 0), min(first_day - first + days, len(counters))
+        result = [capacity] * days
+        for index in range(lo, hi):
+            if counters[index] != self.UNSET:
+                result[index - (first_day - first)] = counters[index]
+        return result
+
+    def set_remaining(self, train_id: str, journey_date: date, class_name: str, remaining: int):
+        """Record the remaining seats for one date (derived from the berth allocator)"""
+        counters, index = self._slot(train_id, class_name, journey_date.toordinal())
+        counters[index] = remaining
+
+
+seat_inventory = SeatInventory(train_catalog)
+
+
+class CoachLayout:
+    """Berth geometry of one coach type: coach prefix and the repeating bay pattern"""
+
+    def __init__(self, prefix: str, bay: List[str], berths_per_coach: int):
+        self.prefix = prefix
+        self.bay = bay
+        self.berths_per_coach = berths_per_coach
+
+    def berth_type(self, berth_number: int) -> str:
+        return self.bay[(berth_number - 1) % len(self.bay)]
+
+
+COACH_LAYOUTS = {
+    "AC1": CoachLayout("A", ["Lower", "Upper"], 24),
+    "AC2": CoachLayout("B", ["Lower", "Upper", "Lower", "Upper", "Side Lower", "Side Upper"], 48),
+    "AC3": CoachLayout("C", ["Lower", "Middle", "Upper", "Lower", "Middle", "Upper", "Side Lower", "Side Upper"], 72),
+    "SL": CoachLayout("S", ["Lower", "Middle", "Upper", "Lower", "Middle", "Upper", "Side Lower", "Side Upper"], 72),
+    "GN": CoachLayout("G", ["Seat"], 90),
+    "AC Chair Car": CoachLayout("CC", ["Window", "Middle", "Aisle", "Aisle", "Window"], 78),
+    "Executive": CoachLayout("E", ["Window", "Aisle", "Aisle", "Window"], 56),
+}
+DEFAULT_COACH_LAYOUT = CoachLayout("X", ["Seat"], 72)
+
+
+def _lowest_bit(mask: int) -> int:
+    """Position of the lowest set bit (mask must be non-zero)"""
+    return (mask & -mask).bit_length() - 1
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+class SeatMap:
+    """
+    Seat geometry for one class with a given capacity, as bitmasks.
+    Position i is berth (i % berths_per_coach) + 1 in coach (i // berths_per_coach) + 1;
+    only the first `capacity` positions are sellable. Occupancy is a plain int
+    bitset over those positions, so "next free lower berth" is a mask AND plus
+    a lowest-set-bit, and runs of free neighbours come from shifted ANDs.
+    """
+
+    def __init__(self, class_name: str, capacity: int):
+        self.layout = COACH_LAYOUTS.get(class_name, DEFAULT_COACH_LAYOUT)
+        self.capacity = capacity
+        self.all_mask = (1 << capacity) - 1
+        self.type_masks = {}
+        for position in range(capacity):
+            berth_type = self.layout.berth_type(position % self.layout.berths_per_coach + 1)
+            self.type_masks[berth_type] = self.type_masks.get(berth_type, 0) | (1 << position)
+        self._run_starts = {}
+
+    def run_starts(self, length: int) -> int:
+        """Positions where `length` consecutive berths fit inside one coach"""
+        if length not in self._run_starts:
+            per_coach = self.layout.berths_per_coach
+            mask = 0
+            for position in range(self.capacity - length + 1):
+                if position % per_coach <= per_coach - length:
+                    mask |= 1 << position
+            self._run_starts[length] = mask
+        return self._run_starts[length]
+
+    def remaining(self, occupied: int) -> int:
+        return self.capacity - _popcount(occupied & self.all_mask)
+
+    def describe(self, position: int) -> Dict:
+        per_coach = self.layout.berths_per_coach
+        berth_number = position % per_coach + 1
+        return {
+            "Coach": f"{self.layout.prefix}{position // per_coach + 1}",
+            "Berth": f"{berth_number}",
+            "Type": self.layout.berth_type(berth_number)
+        }
+
+    def position(self, berth: Dict) -> int:
+        """Inverse of describe(): bit position of an allocated berth"""
+        coach_number = int(berth["Coach"][len(self.layout.prefix):])
+        return (coach_number - 1) * self.layout.berths_per_coach + int(berth["Berth"]) - 1
+
+    def release(self, occupied: int, berths: List[Dict]) -> int:
+        """Occupancy bitset with the given berths freed"""
+        for berth in berths:
+            occupied &= ~(1 << self.position(berth))
+        return occupied
+
+    def allocate(self, occupied: int, seats: int, preference: str = None) -> Optional[Tuple[List[Dict], int]]:
+        """
+        Pick berths for a booking without mutating anything
+        Args:
+            occupied: Current occupancy bitset
+            seats: Number of passengers
+            preference: Preferred berth type (honoured subject to availability)
+        Returns:
+            (berth allocations, new occupancy bitset), or None if not enough seats
+        """
+        free = self.all_mask & ~occupied
+        if seats <= 0 or _popcount(free) < seats:
+            return None
+        preferred = self.type_masks.get(preference, 0)
+
+        positions = []
+        if seats > 1:
+            # Seat groups together: start positions of a free run inside one coach
+            runs = free
+            for shift in range(1, seats):
+                runs &= free >> shift
+            runs &= self.run_starts(seats)
+            if runs:
+                if preferred:
+                    # Prefer runs that include a berth of the preferred type
+                    covers_preferred = 0
+                    for shift in range(seats):
+                        covers_preferred |= preferred >> shift
+                    if runs & covers_preferred:
+                        runs &= covers_preferred
+                start = _lowest_bit(runs)
+                positions = list(range(start, start + seats))
+
+        if not positions:
+            # No contiguous block (or a single passenger): preferred berths first, then lowest free
+            remaining_free = free
+            for _ in range(seats):
+                candidates = remaining_free & preferred or remaining_free
+                position = _lowest_bit(candidates)
+                positions.append(position)
+                remaining_free &= ~(1 << position)
+
+        new_occupied = occupied
+        for position in positions:
+            new_occupied |= 1 << position
+        return [self.describe(position) for position in positions], new_occupied
+
+
+_seat_maps = {}
+
+
+def get_seat_map(class_name: str, capacity: int) -> SeatMap:
+    """Seat maps depend only on class and capacity, so they are built once and shared"""
+    key = (class_name, capacity)
+    if key not in _seat_maps:
+        _seat_maps[key] = SeatMap(class_name, capacity)
+    return _seat_maps[key]
+
+
+class BerthAllocator:
+    """
+    Mock-mode occupancy store: one bitset per (TrainID, JourneyDate, Class).
+    This is the source of truth for seats; the per-date counters in
+    SeatInventory are derived from it after every allocation.
+    """
+
+    def __init__(self, catalog: TrainCatalog, inventory: SeatInventory):
+        self.catalog = catalog
+        self.inventory = inventory
+        self._occupancy = {}  # (train_id, day ordinal, class_name) -> occupancy bitset
+        self._journeys = {}   # day ordinal -> {(train_id, class_name)} with an occupancy
+
+    def allocate(self, train_id: str, journey_date: date, class_name: str, seats: int,
+                 preference: str = None) -> Optional[List[Dict]]:
+        """
+        Allocate berths and update the derived availability counter
+        Returns:
+            List of berth allocations, or None if the class is unknown or short of seats
+        """
+        capacity = class_capacity(self.catalog.get(train_id), class_name)
+        if capacity is None:
+            return None
+        seat_map = get_seat_map(class_name, capacity)
+        key = (train_id, journey_date.toordinal(), class_name)
+        result = seat_map.allocate(self._occupancy.get(key, 0), seats, preference)
+        if result is None:
+            return None
+        berths, occupied = result
+        self._store(key, seat_map, occupied)
+        return berths
+
+    def release(self, train_id: str, journey_date: date, class_name: str, berths: List[Dict]):
+        """Free previously allocated berths (used to compensate a failed booking)"""
+        capacity = class_capacity(self.catalog.get(train_id), class_name)
+        if capacity is None:
+            return
+        seat_map = get_seat_map(class_name, capacity)
+        key = (train_id, journey_date.toordinal(), class_name)
+        self._store(key, seat_map, seat_map.release(self._occupancy.get(key, 0), berths))
+
+    def occupancy(self) -> Dict[Tuple, int]:
+        """Occupancy bitsets keyed by (train_id, day ordinal, class_name)"""
+        return self._occupancy
+
+    def journeys(self, journey_date: date) -> List[Tuple[str, str]]:
+        """(train_id, class_name) pairs whose seats were ever written for a date"""
+        return list(self._journeys.get(journey_date.toordinal(), ()))
+
+    def restore(self, train_id: str, day: int, class_name: str, occupied: int):
+        """Set the occupancy of one journey (used when loading persisted state)"""
+        capacity = class_capacity(self.catalog.get(train_id), class_name)
+        if capacity is None:
+            return
+        self._store((train_id, day, class_name), get_seat_map(class_name, capacity), occupied)
+
+    def _store(self, key: Tuple, seat_map: SeatMap, occupied: int):
+        train_id, day, class_name = key
+        self._occupancy[key] = occupied
+        self._journeys.setdefault(day, set()).add((train_id, class_name))
+        self.inventory.set_remaining(train_id, date.fromordinal(day), class_name, seat_map.remaining(occupied))
+
+
+berth_allocator = BerthAllocator(train_catalog, seat_inventory)
+
+
+class MemoryStateStore:
+    """
+    Mock-mode state held in this process (mock_users, mock_bookings, the ID
+    counters and the berth allocator). Fine for a single worker; every
+    gunicorn worker gets its own diverging copy.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()  # re-entrant: JournaledStateStore logs under it
+        self._users_by_id = {}   # user_id -> user record (the same dicts as mock_users)
+        self._login_keys = {}    # lowercased username/email -> user_id
+        self._outbox = {}        # (booking_id, effect) -> [available_at, attempts, booking]
+        self._bookings_by_id = {}  # booking_id -> booking (the same dicts as mock_bookings)
+        self._pnr_index = {}       # PNR -> booking_id
+        self._user_bookings = {} # user_id -> [(BookingDate, BookingID, booking)], oldest first
+        self._ops = {}           # summary document -> {field: counter}
+        self._ops_recorded = set()  # booking IDs already counted in the summary
+        for user in mock_users:
+            self._index_user(user)
+        for booking in mock_bookings:
+            self._index_booking(booking)
+
+    def _index_user(self, user: Dict):
+        self._users_by_id[user['user_id']] = user
+        for key in login_keys(user['username'], user['email']):
+            self._login_keys[key] = user['user_id']
+
+    def _index_booking(self, booking: Dict):
+        self._bookings_by_id[booking["BookingID"]] = booking
+        if booking.get("PNR"):
+            self._pnr_index[booking["PNR"]] = booking["BookingID"]
+        if booking.get("UserID"):
+            bisect.insort(
+                self._user_bookings.setdefault(booking["UserID"], []),
+                (booking.get("BookingDate", ""), booking["BookingID"], booking)
+            )
+
+    def lease_ids(self, name: str, count: int) -> int:
+        """
+        Reserve `count` consecutive values of the 'booking_id' or 'pnr' counter
+        Returns:
+            The first value of the reserved block
+        """
+        global booking_id_counter, pnr_counter
+        with self._lock:
+            if name == 'pnr':
+                pnr_counter += count
+                return pnr_counter - count + 1
+            booking_id_counter += count
+            return booking_id_counter - count + 1
+
+    def allocate_berths(self, train_id: str, journey_date: date, class_name: str, seats: int,
+                        preference: str = None) -> Optional[List[Dict]]:
+        with self._lock:
+            return berth_allocator.allocate(train_id, journey_date, class_name, seats, preference)
+
+    def release_berths(self, train_id: str, journey_date: date, class_name: str, berths: List[Dict]):
+        with self._lock:
+            berth_allocator.release(train_id, journey_date, class_name, berths)
+
+    def journey_availability(self, train_id: str, journey_date: date) -> Dict[str, int]:
+        return seat_inventory.get_classes(train_id, journey_date)
+
+    def journey_inventory(self, journey_date: date) -> Dict[Tuple[str, str], int]:
+        """Remaining seats of every (train_id, class_name) booked on a date; other classes are at capacity"""
+        with self._lock:
+            return {
+                (train_id, class_name): seat_inventory.get(train_id, journey_date, class_name)
+                for train_id, class_name in berth_allocator.journeys(journey_date)
+            }
+
+    def put_booking(self, booking: Dict):
+        with self._lock:
+            mock_bookings.append(booking)
+            self._index_booking(booking)
+
+    def delete_booking(self, booking_id: str):
+        with self._lock:
+            booking = self._bookings_by_id.pop(booking_id, None)
+            if booking is None:
+                return
+            mock_bookings[:] = [other for other in mock_bookings if other["BookingID"] != booking_id]
+            self._pnr_index.pop(booking.get("PNR"), None)
+            entries = self._user_bookings.get(booking.get("UserID"), [])
+            entries[:] = [entry for entry in entries if entry[1] != booking_id]
+
+    def get_booking(self, booking_id: str) -> Optional[Dict]:
+        booking = self._bookings_by_id.get(booking_id)
+        return booking.copy() if booking else None
+
+    def get_booking_by_pnr(self, pnr: str) -> Optional[Dict]:
+        booking_id = self._pnr_index.get(pnr)
+        return self.get_booking(booking_id) if booking_id else None
+
+    def get_bookings(self, booking_ids: List[str]) -> List[Dict]:
+        """The bookings that exist among `booking_ids`, in the order given"""
+        return [
+            self._bookings_by_id[booking_id].copy()
+            for booking_id in booking_ids if booking_id in self._bookings_by_id
+        ]
+
+    def bookings_for_user(self, user_id: str, limit: int = None, offset: int = 0) -> List[Dict]:
+        """A user's bookings, newest first, skipping the newest `offset`; only the page is copied"""
+        entries = self._user_bookings.get(user_id, [])
+        end = max(len(entries) - offset, 0)
+        start = max(end - limit, 0) if limit else 0
+        return [booking.copy() for _, _, booking in reversed(entries[start:end])]
+
+    def set_side_effect(self, booking_id: str, effect: str, status: str, fields: Dict = None):
+        with self._lock:
+            booking = self._bookings_by_id.get(booking_id)
+            if booking:
+                booking["SideEffects"] = dict(booking.get("SideEffects") or {}, **{effect: status})
+                booking.update(fields or {})
+
+    def outbox_add(self, booking: Dict, effects):
+        with self._lock:
+            for effect in effects:
+                self._outbox[(booking["BookingID"], effect)] = [time.time(), 0, booking]
+
+    def outbox_claim(self, limit: int, lease: float) -> List[Tuple[Dict, str, int]]:
+        """Lease up to `limit` due jobs for `lease` seconds; returns (booking, effect, attempts)"""
+        now = time.time()
+        claimed = []
+        with self._lock:
+            for (booking_id, effect), job in self._outbox.items():
+                if len(claimed) >= limit:
+                    break
+                if job[0] <= now:
+                    job[0] = now + lease
+                    claimed.append((job[2], effect, job[1]))
+        return claimed
+
+    def outbox_retry(self, booking_id: str, effect: str, delay: float):
+        with self._lock:
+            job = self._outbox.get((booking_id, effect))
+            if job:
+                job[0] = time.time() + delay
+                job[1] += 1
+
+    def outbox_done(self, booking_id: str, effect: str):
+        with self._lock:
+            self._outbox.pop((booking_id, effect), None)
+
+    def ops_record(self, booking: Dict):
+        """Add a booking to the operations summary (once per booking)"""
+        with self._lock:
+            if booking["BookingID"] in self._ops_recorded:
+                return
+            self._ops_recorded.add(booking["BookingID"])
+            for document, field, amount in ops_increments(booking):
+                counters = self._ops.setdefault(document, {})
+                counters[field] = counters.get(field, 0) + amount
+
+    def ops_documents(self, documents: List[str]) -> Dict[str, Dict]:
+        with self._lock:
+            return {document: dict(self._ops.get(document, {})) for document in documents}
+
+    def find_user(self, login_value: str) -> Optional[Dict]:
+        user_id = self._login_keys.get((login_value or '').strip().lower())
+        return self.get_user(user_id) if user_id else None
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        user = self._users_by_id.get(user_id)
+        return user.copy() if user else None
+
+    def create_user(self, user: Dict) -> Optional[Dict]:
+        """
+        Insert a user unless the username or email is taken.
+        The first user becomes admin (simple bootstrap).
+        """
+        with self._lock:
+            if any(key in self._login_keys for key in login_keys(user['username'], user['email'])):
+                return None
+            user = dict(user, is_admin=len(mock_users) == 0)
+            mock_users.append(user)
+            self._index_user(user)
+            return user.copy()
+
+    def update_user(self, user_id: str, changes: Dict) -> bool:
+        """Apply field changes; fails if the user is missing or the new email is taken"""
+        with self._lock:
+            user = self._users_by_id.get(user_id)
+            if user is None:
+                return False
+            if 'email' in changes:
+                old_key = user['email'].strip().lower()
+                new_key = changes['email'].strip().lower()
+                # Check if email already belongs to another user
+                if self._login_keys.get(new_key, user_id) != user_id:
+                    return False
+                if old_key != user['username'].strip().lower():
+                    self._login_keys.pop(old_key, None)
+                self._login_keys[new_key] = user_id
+            user.update(changes)
+            user['session_version'] = user.get('session_version', 0) + 1
+            return True
+
+    def add_user_booking(self, user_id: str, booking_id: str):
+        with self._lock:
+            user = self._users_by_id.get(user_id)
+            if user and booking_id not in user['bookings']:
+                user['bookings'].append(booking_id)
+                user['booking_count'] = user.get('booking_count', 0) + 1
+
+
+class SqliteStateStore:
+    """
+    Mock-mode state shared by every process on the host through one SQLite
+    database in WAL mode, so a multi-worker gunicorn deployment behaves like
+    production: seat allocation and ID generation are atomic across workers
+    (BEGIN IMMEDIATE serialises writers) while readers never block.
+    The train catalog itself is static and stays in each process.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS occupancy (
+            train_id TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            class_name TEXT NOT NULL,
+            occupied BLOB NOT NULL,
+            remaining INTEGER NOT NULL,
+            PRIMARY KEY (train_id, day, class_name)
+        );
+        CREATE INDEX IF NOT EXISTS occupancy_by_day ON occupancy (day);
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            username TEXT NOT NULL UNIQUE,
+            email TEXT NOT NULL UNIQUE,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS bookings (
+            booking_id TEXT PRIMARY KEY,
+            user_id TEXT,
+            booking_date TEXT,
+            pnr TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS login_keys (
+            login_key TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS ops_counters (
+            document TEXT NOT NULL,
+            field TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (document, field)
+        );
+        CREATE TABLE IF NOT EXISTS ops_recorded (
+            booking_id TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS outbox (
+            booking_id TEXT NOT NULL,
+            effect TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at REAL NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (booking_id, effect)
+        );
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+        with self._transaction() as conn:
+            for name, start in ID_COUNTER_STARTS.items():
+                conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, ?)", (name, start))
+            # Databases created before the login_keys table
+            conn.execute(
+                "INSERT OR IGNORE INTO login_keys (login_key, user_id) "
+                "SELECT lower(trim(username)), user_id FROM users "
+                "UNION ALL SELECT lower(trim(email)), user_id FROM users"
+            )
+            # Databases created before bookings were indexed by (user_id, booking_date) and PNR
+            booking_columns = {row[1] for row in conn.execute("PRAGMA table_info(bookings)")}
+            if 'booking_date' not in booking_columns:
+                conn.execute("ALTER TABLE bookings ADD COLUMN booking_date TEXT")
+                conn.execute("UPDATE bookings SET booking_date = json_extract(data, '$.BookingDate')")
+            if 'pnr' not in booking_columns:
+                conn.execute("ALTER TABLE bookings ADD COLUMN pnr TEXT")
+                conn.execute("UPDATE bookings SET pnr = json_extract(data, '$.PNR')")
+            conn.execute("DROP INDEX IF EXISTS bookings_user_id")
+            conn.execute("CREATE INDEX IF NOT EXISTS bookings_user_date ON bookings (user_id, booking_date)")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS bookings_pnr ON bookings (pnr)")
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, reopened after a fork (gunicorn --preload)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def lease_ids(self, name: str, count: int) -> int:
+        with self._transaction() as conn:
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = ?", (count, name))
+            return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0] - count + 1
+
+    def allocate_berths(self, train_id: str, journey_date: date, class_name: str, seats: int,
+                        preference: str = None) -> Optional[List[Dict]]:
+        capacity = class_capacity(train_catalog.get(train_id), class_name)
+        if capacity is None:
+            return None
+        seat_map = get_seat_map(class_name, capacity)
+        day = journey_date.toordinal()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT occupied FROM occupancy WHERE train_id = ? AND day = ? AND class_name = ?",
+                (train_id, day, class_name)
+            ).fetchone()
+            result = seat_map.allocate(int.from_bytes(row[0], 'big') if row else 0, seats, preference)
+            if result is None:
+                return None
+            berths, occupied = result
+            conn.execute(
+                "INSERT OR REPLACE INTO occupancy (train_id, day, class_name, occupied, remaining) VALUES (?, ?, ?, ?, ?)",
+                (train_id, day, class_name, occupied.to_bytes((occupied.bit_length() + 7) // 8, 'big'),
+                 seat_map.remaining(occupied))
+            )
+            return berths
+
+    def release_berths(self, train_id: str, journey_date: date, class_name: str, berths: List[Dict]):
+        capacity = class_capacity(train_catalog.get(train_id), class_name)
+        if capacity is None:
+            return
+        seat_map = get_seat_map(class_name, capacity)
+        day = journey_date.toordinal()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT occupied FROM occupancy WHERE train_id = ? AND day = ? AND class_name = ?",
+                (train_id, day, class_name)
+            ).fetchone()
+            if not row:
+                return
+            occupied = seat_map.release(int.from_bytes(row[0], 'big'), berths)
+            conn.execute(
+                "UPDATE occupancy SET occupied = ?, remaining = ? WHERE train_id = ? AND day = ? AND class_name = ?",
+                (occupied.to_bytes((occupied.bit_length() + 7) // 8, 'big'), seat_map.remaining(occupied),
+                 train_id, day, class_name)
+            )
+
+    def journey_availability(self, train_id: str, journey_date: date) -> Dict[str, int]:
+        train = train_catalog.get(train_id)
+        if not train:
+            return {}
+        availability = {
+            class_name: int(class_info["Availability"])
+            for class_name, class_info in (train.get("Classes") or {}).items()
+        }
+        rows = self._connection().execute(
+            "SELECT class_name, remaining FROM occupancy WHERE train_id = ? AND day = ?",
+            (train_id, journey_date.toordinal())
+        )
+        for class_name, remaining in rows:
+            if class_name in availability:
+                availability[class_name] = remaining
+        return availability
+
+    def journey_inventory(self, journey_date: date) -> Dict[Tuple[str, str], int]:
+        rows = self._connection().execute(
+            "SELECT train_id, class_name, remaining FROM occupancy WHERE day = ?", (journey_date.toordinal(),)
+        )
+        return {(train_id, class_name): remaining for train_id, class_name, remaining in rows}
+
+    def put_booking(self, booking: Dict):
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO bookings (booking_id, user_id, booking_date, pnr, data) VALUES (?, ?, ?, ?, ?)",
+                (booking["BookingID"], booking.get("UserID"), booking.get("BookingDate", ""), booking.get("PNR"),
+                 json.dumps(booking))
+            )
+
+    def delete_booking(self, booking_id: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM bookings WHERE booking_id = ?", (booking_id,))
+
+    def get_booking(self, booking_id: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            "SELECT data FROM bookings WHERE booking_id = ?", (booking_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_booking_by_pnr(self, pnr: str) -> Optional[Dict]:
+        row = self._connection().execute("SELECT data FROM bookings WHERE pnr = ?", (pnr,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_bookings(self, booking_ids: List[str]) -> List[Dict]:
+        found = {}
+        conn = self._connection()
+        for start in range(0, len(booking_ids), 500):
+            chunk = booking_ids[start:start + 500]
+            rows = conn.execute(
+                f"SELECT booking_id, data FROM bookings WHERE booking_id IN ({', '.join('?' * len(chunk))})", chunk
+            )
+            found.update((booking_id, json.loads(data)) for booking_id, data in rows)
+        return [found[booking_id] for booking_id in booking_ids if booking_id in found]
+
+    def bookings_for_user(self, user_id: str, limit: int = None, offset: int = 0) -> List[Dict]:
+        rows = self._connection().execute(
+            "SELECT data FROM bookings WHERE user_id = ? ORDER BY booking_date DESC, booking_id DESC LIMIT ? OFFSET ?",
+            (user_id, limit or -1, offset)
+        )
+        return [json.loads(data) for data, in rows]
+
+    def set_side_effect(self, booking_id: str, effect: str, status: str, fields: Dict = None):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM bookings WHERE booking_id = ?", (booking_id,)).fetchone()
+            if row:
+                booking = json.loads(row[0])
+                booking["SideEffects"] = dict(booking.get("SideEffects") or {}, **{effect: status})
+                booking.update(fields or {})
+                conn.execute("UPDATE bookings SET data = ? WHERE booking_id = ?", (json.dumps(booking), booking_id))
+
+    def outbox_add(self, booking: Dict, effects):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO outbox (booking_id, effect, available_at, payload) VALUES (?, ?, ?, ?)",
+                [(booking["BookingID"], effect, time.time(), json.dumps(booking)) for effect in effects]
+            )
+
+    def outbox_claim(self, limit: int, lease: float) -> List[Tuple[Dict, str, int]]:
+        # The lease keeps other workers off a job; if this one dies it becomes due again
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT booking_id, effect, attempts, payload FROM outbox WHERE available_at <= ? "
+                "ORDER BY available_at LIMIT ?", (now, limit)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE outbox SET available_at = ? WHERE booking_id = ? AND effect = ?",
+                [(now + lease, booking_id, effect) for booking_id, effect, _, _ in rows]
+            )
+        return [(json.loads(payload), effect, attempts) for _, effect, attempts, payload in rows]
+
+    def outbox_retry(self, booking_id: str, effect: str, delay: float):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE outbox SET available_at = ?, attempts = attempts + 1 WHERE booking_id = ? AND effect = ?",
+                (time.time() + delay, booking_id, effect)
+            )
+
+    def outbox_done(self, booking_id: str, effect: str):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM outbox WHERE booking_id = ? AND effect = ?", (booking_id, effect))
+
+    def ops_record(self, booking: Dict):
+        with self._transaction() as conn:
+            if conn.execute(
+                "INSERT OR IGNORE INTO ops_recorded (booking_id) VALUES (?)", (booking["BookingID"],)
+            ).rowcount == 0:
+                return
+            conn.executemany(
+                "INSERT INTO ops_counters (document, field, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (document, field) DO UPDATE SET value = value + excluded.value",
+                ops_increments(booking)
+            )
+
+    def ops_documents(self, documents: List[str]) -> Dict[str, Dict]:
+        found = {document: {} for document in documents}
+        rows = self._connection().execute(
+            f"SELECT document, field, value FROM ops_counters WHERE document IN ({', '.join('?' * len(documents))})",
+            documents
+        )
+        for document, field, value in rows:
+            found[document][field] = value
+        return found
+
+    def find_user(self, login_value: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            "SELECT users.data FROM login_keys JOIN users USING (user_id) WHERE login_key = ?",
+            ((login_value or '').strip().lower(),)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_user(self, user_id: str) -> Optional[Dict]:
+        row = self._connection().execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def create_user(self, user: Dict) -> Optional[Dict]:
+        try:
+            with self._transaction() as conn:
+                first_user = conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+                user = dict(user, is_admin=first_user)
+                conn.execute(
+                    "INSERT INTO users (user_id, username, email, data) VALUES (?, ?, ?, ?)",
+                    (user['user_id'], user['username'], user['email'], json.dumps(user))
+                )
+                conn.executemany(
+                    "INSERT INTO login_keys (login_key, user_id) VALUES (?, ?)",
+                    [(key, user['user_id']) for key in login_keys(user['username'], user['email'])]
+                )
+                return user
+        except sqlite3.IntegrityError:
+            return None
+
+    def _modify_user(self, user_id: str, modify) -> bool:
+        try:
+            with self._transaction() as conn:
+                row = conn.execute("SELECT data FROM users WHERE user_id = ?", (user_id,)).fetchone()
+                if not row:
+                    return False
+                old = json.loads(row[0])
+                user = modify(dict(old))
+                old_key = old['email'].strip().lower()
+                new_key = user['email'].strip().lower()
+                if new_key != old_key:
+                    owner = conn.execute(
+                        "SELECT user_id FROM login_keys WHERE login_key = ?", (new_key,)
+                    ).fetchone()
+                    if owner and owner[0] != user_id:
+                        return False
+                    if old_key != old['username'].strip().lower():
+                        conn.execute("DELETE FROM login_keys WHERE login_key = ?", (old_key,))
+                    conn.execute(
+                        "INSERT OR IGNORE INTO login_keys (login_key, user_id) VALUES (?, ?)", (new_key, user_id)
+                    )
+                conn.execute(
+                    "UPDATE users SET email = ?, data = ? WHERE user_id = ?",
+                    (user['email'], json.dumps(user), user_id)
+                )
+                return True
+        except sqlite3.IntegrityError:
+            # The new email belongs to another user
+            return False
+
+    def update_user(self, user_id: str, changes: Dict) -> bool:
+        return self._modify_user(
+            user_id,
+            lambda user: dict(user, **changes, session_version=user.get('session_version', 0) + 1)
+        )
+
+    def add_user_booking(self, user_id: str, booking_id: str):
+        def append_booking(user):
+            if booking_id not in user['bookings']:
+                user['bookings'].append(booking_id)
+                user['booking_count'] = user.get('booking_count', 0) + 1
+            return user
+        self._modify_user(user_id, append_booking)
+
+
+class JournaledStateStore(MemoryStateStore):
+    """
+    MemoryStateStore made durable on local disk (one process, like the
+    memory backend: an exclusive lock on <snapshot>.lock makes a second
+    process, e.g. another gunicorn worker, fail to start instead of
+    interleaving logs). Every user, booking, seat-inventory, ID-counter and
+    outbox mutation is appended to a JSON-lines log after it is applied;
+    a compacted snapshot of the whole state is written to MOCK_DB_FILE
+    once the log holds MOCK_JOURNAL_COMPACT_RECORDS records, so a restart
+    loads the snapshot and replays at most that many records.
+
+    Files: <snapshot> and <snapshot>.<generation>.log. Compaction starts a
+    new log generation under the state lock, copies the state, and writes
+    the snapshot from a background thread (temp file, fsync, rename); the
+    snapshot names the first generation to replay, and older logs are then
+    deleted. Log writes are group-committed: a mutation returns once its
+    record is written, and fsynced too when fsync_interval is 0; otherwise a
+    background thread fsyncs every fsync_interval seconds.
+    """
+
+    def __init__(self, path: str, compact_records: int, fsync_interval: float):
+        super().__init__()
+        self.path = path
+        self.compact_records = max(int(compact_records), 1)
+        self.fsync_interval = fsync_interval
+        self._log_lock = threading.Condition()
+        self._pending = []       # serialised records not yet written
+        self._appended = 0       # sequence number of the last record appended
+        self._written = 0        # ... and of the last record written to the log
+        self._flushing = False
+        self._dirty = False      # written but not yet fsynced
+        self._records = 0        # records in the log since the last snapshot
+        self._compacting = False
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock_file = self._acquire_file_lock()
+        self._owner = os.getpid()  # forked children inherit the lock, so they are refused by pid
+        self._generation = self._load()
+        self._log = open(self._log_path(self._generation), 'a', encoding='utf-8')
+        if fsync_interval > 0:
+            threading.Thread(target=self._sync_periodically, name='journal-fsync', daemon=True).start()
+        atexit.register(self.close)
+
+    def _acquire_file_lock(self):
+        """
+        Hold an exclusive lock on <snapshot>.lock for the life of the process
+        Raises:
+            RuntimeError if another process has the journal open
+        """
+        lock_file = open(f"{self.path}.lock", 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            raise RuntimeError(
+                f"Mock journal {self.path} is in use by another process; the journal backend "
+                f"supports one process (run gunicorn with --workers 1, or use MOCK_STATE_BACKEND=sqlite)"
+            )
+        return lock_file
+
+    def _log_path(self, generation: int) -> str:
+        return f"{self.path}.{generation}.log"
+
+    def _log_generations(self) -> List[int]:
+        directory, prefix = os.path.split(self.path)
+        generations = []
+        for name in os.listdir(directory or '.'):
+            middle = name[len(prefix) + 1:-len('.log')]
+            if name.startswith(prefix + '.') and name.endswith('.log') and middle.isdigit():
+                generations.append(int(middle))
+        return sorted(generations)
+
+    # Loading
+
+    def _load(self) -> int:
+        """Load the snapshot and replay the logs after it; returns the generation to append to"""
+        started = time.perf_counter()
+        first_generation = 0
+        if os.path.exists(self.path):
+            first_generation = self._load_snapshot()
+        generations = [g for g in self._log_generations() if g >= first_generation]
+        for generation in self._log_generations():
+            if generation < first_generation:
+                # Left behind by a compaction that stopped before deleting them
+                os.remove(self._log_path(generation))
+        for generation in generations:
+            self._replay(self._log_path(generation))
+        print(
+            f"Mock journal: loaded {len(mock_users)} users and {len(mock_bookings)} bookings, "
+            f"replayed {self._records} log records in {time.perf_counter() - started:.2f}s"
+        )
+        return generations[-1] if generations else first_generation
+
+    def _load_snapshot(self) -> int:
+        global booking_id_counter, pnr_counter
+        with open(self.path, encoding='utf-8') as snapshot:
+            header = json.loads(snapshot.readline())
+            booking_id_counter = header['booking_id_counter']
+            pnr_counter = header['pnr_counter']
+            for line in snapshot:
+                kind, value = json.loads(line)
+                if kind == 'user':
+                    mock_users.append(value)
+                    self._index_user(value)
+                elif kind == 'booking':
+                    mock_bookings.append(value)
+                    self._index_booking(value)
+                elif kind == 'occupancy':
+                    berth_allocator.restore(*value)
+                elif kind == 'ops':
+                    self._ops[value[0]] = value[1]
+                elif kind == 'ops_recorded':
+                    self._ops_recorded.update(value)
+                elif kind == 'outbox':
+                    self._restore_outbox_job(*value)
+        return header['log']
+
+    def _replay(self, log_path: str):
+        """Apply a log's records; a torn record at the end (crash mid-write) is cut off"""
+        good = 0
+        with open(log_path, 'rb') as log:
+            for line in log:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+                self._apply(record)
+                self._records += 1
+                good += len(line)
+        if good < os.path.getsize(log_path):
+            print(f"Mock journal: discarding a torn record at the end of {log_path}")
+            with open(log_path, 'r+b') as log:
+                log.truncate(good)
+
+    def _apply(self, record: List):
+        global booking_id_counter, pnr_counter
+        op, args = record[0], record[1:]
+        if op == 'lease':
+            if args[0] == 'pnr':
+                pnr_counter = max(pnr_counter, args[1])
+            else:
+                booking_id_counter = max(booking_id_counter, args[1])
+        elif op == 'occupancy':
+            berth_allocator.restore(*args)
+        elif op == 'booking':
+            MemoryStateStore.put_booking(self, args[0])
+        elif op == 'delete_booking':
+            MemoryStateStore.delete_booking(self, *args)
+        elif op == 'side_effect':
+            MemoryStateStore.set_side_effect(self, *args)
+        elif op == 'outbox_add':
+            booking = self._bookings_by_id.get(args[0])
+            if booking:
+                MemoryStateStore.outbox_add(self, booking, args[1])
+        elif op == 'outbox_retry':
+            self._restore_outbox_job(*args)
+        elif op == 'outbox_done':
+            MemoryStateStore.outbox_done(self, *args)
+        elif op == 'ops_record':
+            booking = self._bookings_by_id.get(args[0])
+            if booking:
+                MemoryStateStore.ops_record(self, booking)
+        elif op == 'user':
+            MemoryStateStore.create_user(self, args[0])
+        elif op == 'update_user':
+            MemoryStateStore.update_user(self, *args)
+        elif op == 'user_booking':
+            MemoryStateStore.add_user_booking(self, *args)
+
+    def _restore_outbox_job(self, booking_id: str, effect: str, available_at: float = None, attempts: int = 0):
+        """Re-create an outbox job with its backoff (snapshots before attempts were kept have neither)"""
+        booking = self._bookings_by_id.get(booking_id)
+        if booking:
+            self._outbox[(booking_id, effect)] = [available_at or time.time(), attempts, booking]
+
+    # Logging
+
+    def _append(self, *record) -> int:
+        """Queue a record (called under the state lock, so log order is apply order)"""
+        if os.getpid() != self._owner:
+            raise RuntimeError(f"Mock journal {self.path} belongs to process {self._owner}; it cannot be written after a fork")
+        line = json.dumps(record, separators=(',', ':'), default=str) + '\n'
+        with self._log_lock:
+            self._pending.append(line)
+            self._appended += 1
+            self._records += 1
+            if self._records >= self.compact_records and not self._compacting:
+                self._compacting = True
+                threading.Thread(target=self.compact, name='journal-compact', daemon=True).start()
+            return self._appended
+
+    def _commit(self, sequence: int):
+        """
+        Wait until record `sequence` is written (and fsynced, in sync mode).
+        Whichever waiting thread gets here first writes every queued record
+        with one write and one fsync for the whole group.
+        """
+        with self._log_lock:
+            while self._written < sequence:
+                if self._flushing:
+                    self._log_lock.wait()
+                    continue
+                self._flushing = True
+                lines, self._pending = self._pending, []
+                upto = self._appended
+                log = self._log
+                self._log_lock.release()
+                try:
+                    log.write(''.join(lines))
+                    log.flush()
+                    if self.fsync_interval <= 0:
+                        os.fsync(log.fileno())
+                finally:
+                    self._log_lock.acquire()
+                    self._flushing = False
+                    self._log_lock.notify_all()
+                self._written = upto
+                self._dirty = self.fsync_interval > 0
+
+    def _sync_periodically(self):
+        while True:
+            time.sleep(self.fsync_interval)
+            with self._log_lock:
+                if not self._dirty:
+                    continue
+                self._dirty = False
+                log = self._log
+            try:
+                os.fsync(log.fileno())
+            except (OSError, ValueError):
+                pass  # log rotated by a compaction meanwhile; the old one was fsynced
+
+    def _logged(self, record: Tuple, apply, *args):
+        """Apply a MemoryStateStore mutation and log `record` for it"""
+        with self._lock:
+            result = apply(self, *args)
+            sequence = self._append(*record)
+        self._commit(sequence)
+        return result
+
+    def close(self):
+        """Write and fsync everything logged so far"""
+        with self._lock:
+            with self._log_lock:
+                sequence = self._appended
+        self._commit(sequence)
+        with self._log_lock:
+            if not self._log.closed:
+                os.fsync(self._log.fileno())
+
+    # Compaction
+
+    def compact(self):
+        """Write a snapshot of the current state and drop the logs it covers"""
+        try:
+            with self._lock:
+                with self._log_lock:
+                    sequence = self._appended
+                self._commit(sequence)
+                with self._log_lock:
+                    os.fsync(self._log.fileno())
+                    self._log.close()
+                    self._generation += 1
+                    self._log = open(self._log_path(self._generation), 'a', encoding='utf-8')
+                    self._records = 0
+                    self._dirty = False
+                generation = self._generation
+                # Copies taken under the lock; serialising them happens outside it
+                header = {'log': generation, 'booking_id_counter': booking_id_counter,
+                          'pnr_counter': pnr_counter, 'written_at': datetime.now().isoformat()}
+                users = [dict(user, bookings=list(user['bookings'])) for user in mock_users]
+                bookings = [dict(booking) for booking in mock_bookings]
+                occupancy = list(berth_allocator.occupancy().items())
+                ops = [(document, dict(counters)) for document, counters in self._ops.items()]
+                ops_recorded = list(self._ops_recorded)
+                outbox = [(booking_id, effect, job[0], job[1]) for (booking_id, effect), job in self._outbox.items()]
+
+            temporary = f"{self.path}.tmp"
+            with open(temporary, 'w', encoding='utf-8') as snapshot:
+                dump = lambda *entry: snapshot.write(json.dumps(entry, separators=(',', ':'), default=str) + '\n')
+                snapshot.write(json.dumps(header) + '\n')
+                for user in users:
+                    dump('user', user)
+                for booking in bookings:
+                    dump('booking', booking)
+                for (train_id, day, class_name), occupied in occupancy:
+                    dump('occupancy', [train_id, day, class_name, occupied])
+                for document, counters in ops:
+                    dump('ops', [document, counters])
+                for start in range(0, len(ops_recorded), 10000):
+                    dump('ops_recorded', ops_recorded[start:start + 10000])
+                for job in outbox:
+                    dump('outbox', list(job))
+                snapshot.flush()
+                os.fsync(snapshot.fileno())
+            os.replace(temporary, self.path)
+            if hasattr(os, 'O_DIRECTORY'):
+                directory = os.open(os.path.dirname(self.path) or '.', os.O_RDONLY | os.O_DIRECTORY)
+                try:
+                    os.fsync(directory)
+                finally:
+                    os.close(directory)
+            for old in self._log_generations():
+                if old < generation:
+                    os.remove(self._log_path(old))
+        except Exception as e:
+            print(f"Error compacting the mock journal: {str(e)}")
+        finally:
+            with self._log_lock:
+                self._compacting = False
+
+    # Logged mutations
+
+    def lease_ids(self, name: str, count: int) -> int:
+        with self._lock:
+            first = super().lease_ids(name, count)
+            sequence = self._append('lease', name, first + count - 1)
+        self._commit(sequence)
+        return first
+
+    def _log_occupancy(self, train_id: str, journey_date: date, class_name: str) -> int:
+        key = (train_id, journey_date.toordinal(), class_name)
+        return self._append('occupancy', *key, berth_allocator.occupancy().get(key, 0))
+
+    def allocate_berths(self, train_id: str, journey_date: date, class_name: str, seats: int,
+                        preference: str = None) -> Optional[List[Dict]]:
+        with self._lock:
+            berths = super().allocate_berths(train_id, journey_date, class_name, seats, preference)
+            if berths is None:
+                return None
+            sequence = self._log_occupancy(train_id, journey_date, class_name)
+        self._commit(sequence)
+        return berths
+
+    def release_berths(self, train_id: str, journey_date: date, class_name: str, berths: List[Dict]):
+        with self._lock:
+            super().release_berths(train_id, journey_date, class_name, berths)
+            sequence = self._log_occupancy(train_id, journey_date, class_name)
+        self._commit(sequence)
+
+    def put_booking(self, booking: Dict):
+        self._logged(('booking', booking), MemoryStateStore.put_booking, booking)
+
+    def delete_booking(self, booking_id: str):
+        self._logged(('delete_booking', booking_id), MemoryStateStore.delete_booking, booking_id)
+
+    def set_side_effect(self, booking_id: str, effect: str, status: str, fields: Dict = None):
+        self._logged(
+            ('side_effect', booking_id, effect, status, fields),
+            MemoryStateStore.set_side_effect, booking_id, effect, status, fields
+        )
+
+    def outbox_add(self, booking: Dict, effects):
+        effects = list(effects)
+        self._logged(('outbox_add', booking["BookingID"], effects), MemoryStateStore.outbox_add, booking, effects)
+
+    def outbox_retry(self, booking_id: str, effect: str, delay: float):
+        with self._lock:
+            super().outbox_retry(booking_id, effect, delay)
+            job = self._outbox.get((booking_id, effect))
+            if job is None:
+                return
+            # Absolute time and count, so a replay restores the backoff exactly
+            sequence = self._append('outbox_retry', booking_id, effect, job[0], job[1])
+        self._commit(sequence)
+
+    def outbox_done(self, booking_id: str, effect: str):
+        self._logged(('outbox_done', booking_id, effect), MemoryStateStore.outbox_done, booking_id, effect)
+
+    def ops_record(self, booking: Dict):
+        self._logged(('ops_record', booking["BookingID"]), MemoryStateStore.ops_record, booking)
+
+    def create_user(self, user: Dict) -> Optional[Dict]:
+        with self._lock:
+            created = super().create_user(user)
+            if created is None:
+                return None
+            sequence = self._append('user', user)
+        self._commit(sequence)
+        return created
+
+    def update_user(self, user_id: str, changes: Dict) -> bool:
+        with self._lock:
+            if not super().update_user(user_id, changes):
+                return False
+            sequence = self._append('update_user', user_id, changes)
+        self._commit(sequence)
+        return True
+
+    def add_user_booking(self, user_id: str, booking_id: str):
+        self._logged(('user_booking', user_id, booking_id), MemoryStateStore.add_user_booking, user_id, booking_id)
+
+
+class IdAllocator:
+    """
+    Hands out booking IDs and PNRs from blocks leased from a durable counter
+    (the mock state store, or a DynamoDB atomic counter item). Only one
+    round-trip per block, IDs never collide across processes, and they are
+    monotonic within a process because every new lease is above the last.
+    """
+
+    def __init__(self, lease, block_size: int):
+        self._lease = lease          # (name, count) -> first value of the leased block
+        self.block_size = max(int(block_size), 1)
+        self._blocks = {}            # name -> [next value, end of block (exclusive)]
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def next_id(self, name: str) -> int:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker (gunicorn --preload): never reuse the parent's block
+                self._blocks = {}
+                self._pid = os.getpid()
+            block = self._blocks.get(name)
+            if block is None or block[0] >= block[1]:
+                first = self._lease(name, self.block_size)
+                block = self._blocks[name] = [first, first + self.block_size]
+            value = block[0]
+            block[0] += 1
+            return value
+
+
+def create_mock_store():
+    """Build the mock-mode state store selected by MOCK_STATE_BACKEND"""
+    if MOCK_STATE_BACKEND == 'sqlite':
+        path = MOCK_STATE_DB if os.path.isabs(MOCK_STATE_DB) else os.path.join(BASE_DIR, MOCK_STATE_DB)
+        return SqliteStateStore(path)
+    if MOCK_STATE_BACKEND == 'journal':
+        path = MOCK_DB_FILE if os.path.isabs(MOCK_DB_FILE) else os.path.join(BASE_DIR, MOCK_DB_FILE)
+        return JournaledStateStore(path, MOCK_JOURNAL_COMPACT_RECORDS, MOCK_JOURNAL_FSYNC_INTERVAL)
+    return MemoryStateStore()
+
+
+mock_store = create_mock_store()
+
+
+def encode_cursor(position) -> Optional[str]:
+    """
+    Encode a paging position (a DynamoDB LastEvaluatedKey or a mock offset)
+    as an opaque, URL-safe continuation token
+    """
+    if position is None:
+        return None
+    raw = json.dumps(position, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    """
+    Decode a continuation token produced by encode_cursor
+    Returns:
+        The paging position, or None for a blank or malformed token
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        return None
+
+
+def iter_dynamodb_items(operation, **kwargs) -> Iterator[Dict]:
+    """
+    Stream items from a DynamoDB scan/query, following LastEvaluatedKey
+    so results past the 1 MB page limit are not silently dropped.
+    Only one page is held in memory at a time.
+    Args:
+        operation: Bound table method, e.g. table.scan or table.query
+        **kwargs: Arguments passed to every call
+    """
+    while True:
+        response = operation(**kwargs)
+        yield from response.get('Items', [])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+# Items DynamoDB evaluates per call while filling a page. Limit caps what is
+# read before a FilterExpression, so it is never lowered to the few items a
+# nearly full page still needs (that would cost a round trip per item)
+PAGE_SCAN_LIMIT = 200
+
+
+def read_dynamodb_page(operation, limit: int, cursor: str = None, key_attributes: Tuple[str, ...] = (),
+                       **kwargs) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Read up to `limit` items from a DynamoDB scan/query starting at `cursor`.
+    Every call evaluates max(limit, PAGE_SCAN_LIMIT) items, so sparse filters
+    take few round trips. Items past the page are dropped, and the cursor is
+    then the key of the last item returned rather than LastEvaluatedKey, so
+    the next page starts right after it.
+    Args:
+        operation: Bound table method, e.g. table.scan or table.query
+        limit: Maximum number of items to return
+        cursor: Continuation token from the previous page
+        key_attributes: Attributes of the resume key (table key, plus the index key for a GSI)
+        **kwargs: Arguments passed to every call
+    Returns:
+        (items, next_cursor) where next_cursor is None on the last page
+    """
+    start_key = decode_cursor(cursor)
+    if isinstance(start_key, dict):
+        kwargs['ExclusiveStartKey'] = start_key
+
+    items = []
+    last_key = None
+    while len(items) < limit:
+        response = operation(Limit=max(limit, PAGE_SCAN_LIMIT), **kwargs)
+        items.extend(response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        kwargs['ExclusiveStartKey'] = last_key
+    if len(items) > limit:
+        items = items[:limit]
+        last_key = {attribute: items[-1][attribute] for attribute in key_attributes}
+    return items, encode_cursor(last_key)
+
+
+def cursor_offset(cursor: str) -> int:
+    """Offset of an in-memory page cursor (0 for a blank or malformed one)"""
+    position = decode_cursor(cursor)
+    offset = position.get('offset', 0) if isinstance(position, dict) else 0
+    try:
+        return max(int(offset), 0)
+    except (ValueError, TypeError):
+        return 0
+
+
+def slice_page(items, limit: int, cursor: str = None) -> Tuple[list, Optional[str]]:
+    """
+    Offset-based paging over an in-memory sequence, using the same opaque
+    cursor format as the DynamoDB pages. Only the page is copied.
+    Returns:
+        (items, next_cursor) where next_cursor is None on the last page
+    """
+    offset = cursor_offset(cursor)
+    end = offset + limit
+    next_cursor = encode_cursor({'offset': end}) if end < len(items) else None
+    return items[offset:end], next_cursor
+
+
+class DatabaseService:
+    """Service class for database operations"""
+    
+    def __init__(self):
+        self.use_mock = USE_MOCK_AWS
+        
+        if self.use_mock:
+            self.ids = IdAllocator(mock_store.lease_ids, ID_BLOCK_SIZE)
+        else:
+            # DynamoDB tables come from the shared client registry on first use (see below)
+            self.ids = IdAllocator(self._lease_ids_from_dynamodb, ID_BLOCK_SIZE)
+            # Station names are loaded once per process for typeahead/resolution
+            self._station_index = None
+        self.train_cache = TrainCache(TRAIN_CACHE_TTL, TRAIN_AVAILABILITY_TTL)
+        # Hot PNR status views (an empty dict marks an unknown PNR), and which
+        # PNR each cached booking has so a change to the booking can drop it
+        self.pnr_statuses = TTLCache(maxsize=20000 if PNR_CACHE_TTL > 0 else 0, ttl=PNR_CACHE_TTL)
+        self._cached_pnrs = TTLCache(maxsize=20000 if PNR_CACHE_TTL > 0 else 0, ttl=PNR_CACHE_TTL)
+
+    # Real-mode DynamoDB handles come from the shared registry (see AwsClients)
+    @property
+    def dynamodb(self):
+        return aws_clients.resource('dynamodb')
+
+    @property
+    def trains_table(self):
+        return aws_clients.table(DYNAMODB_TABLE_TRAINS)
+
+    @property
+    def bookings_table(self):
+        return aws_clients.table(DYNAMODB_TABLE_BOOKINGS)
+
+    @property
+    def inventory_table(self):
+        return aws_clients.table(DYNAMODB_TABLE_INVENTORY)
+
+    @property
+    def counters_table(self):
+        return aws_clients.table(DYNAMODB_TABLE_COUNTERS)
+    
+    def search_trains(self, route_query: str = None) -> List[Dict]:
+        """
+        Search for trains by route
+        Args:
+            route_query: Optional search term to filter routes
+        Returns:
+            List of train dictionaries matching the search
+        """
+        if self.use_mock:
+            # Mock implementation: Answer from the catalog index
+            if route_query:
+                return train_catalog.search(route_query)
+            return mock_trains.copy()
+        
+        else:
+            # Real DynamoDB implementation, read through the train cache
+            cache_key = ('route', (route_query or '').lower())
+            trains = self.train_cache.searches.get(cache_key)
+            if trains is not None:
+                return list(trains)
+            try:
+                trains = self._search_route_by_stations(route_query) if route_query else None
+                if trains is None:
+                    trains = list(iter_dynamodb_items(self.trains_table.scan, **self._search_scan_kwargs(route_query)))
+                self.train_cache.put_search(cache_key, trains)
+                return list(trains)
+            except Exception as e:
+                print(f"Error searching trains in DynamoDB: {str(e)}")
+                return []
+
+    def _search_route_by_stations(self, route_query: str) -> Optional[List[Dict]]:
+        """
+        Route substring search through the station index and the station GSIs:
+        a query inside one station name is answered by querying the trains
+        from and to every station containing it. Returns None for a query
+        spanning the " - " between two stations, which only a scan can match.
+        """
+        query = route_query.lower()
+        stations = self._get_station_index().containing(query)
+        if not stations:
+            return None if '-' in query else []
+        found = {}
+        for station in stations:
+            for index_name, condition in (
+                ('OriginDestinationIndex', Key('OriginLower').eq(station)),
+                ('DestinationIndex', Key('DestinationLower').eq(station))
+            ):
+                for train in iter_dynamodb_items(
+                    self.trains_table.query, IndexName=index_name, KeyConditionExpression=condition
+                ):
+                    found[train['TrainID']] = train
+        return [found[train_id] for train_id in sorted(found)]
+
+    def _search_scan_kwargs(self, route_query: str = None) -> Dict:
+        if route_query:
+            return {'FilterExpression': Attr('Route').contains(route_query)}
+        return {}
+
+    def search_trains_page(self, route_query: str = None, limit: int = 50,
+                           cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Search for trains by route, one page at a time
+        Args:
+            route_query: Optional search term to filter routes
+            limit: Maximum number of trains to return
+            cursor: Continuation token from the previous page
+        Returns:
+            (trains, next_cursor) where next_cursor is None on the last page
+        """
+        if self.use_mock:
+            # Page over catalog row numbers; only the page's trains are gathered
+            rows = train_catalog.search_rows(route_query) if route_query else range(len(train_catalog.trains))
+            rows, next_cursor = slice_page(rows, limit, cursor)
+            return [train_catalog.trains[row] for row in rows], next_cursor
+
+        if route_query:
+            # Answered from the station GSIs (and the train cache); page over the matches
+            return slice_page(self.search_trains(route_query), limit, cursor)
+
+        try:
+            return read_dynamodb_page(self.trains_table.scan, limit, cursor, ('TrainID',))
+        except Exception as e:
+            print(f"Error searching trains in DynamoDB: {str(e)}")
+            return [], None
+    
+    def _get_station_index(self) -> StationIndex:
+        """
+        Build the station index for DynamoDB mode from a Route-only projection.
+        The station list is small and static, so this runs once per process.
+        """
+        if self._station_index is None:
+            stations = StationIndex()
+            for item in iter_dynamodb_items(self.trains_table.scan, ProjectionExpression='Route'):
+                for station in _split_route(item.get('Route', '')):
+                    stations.add(station)
+            self._station_index = stations
+        return self._station_index
+
+    def suggest_stations(self, query: str, limit: int = 10) -> List[str]:
+        """
+        Station name suggestions for typeahead
+        Args:
+            query: Partial station name
+            limit: Maximum number of suggestions
+        Returns:
+            List of station display names
+        """
+        if self.use_mock:
+            return train_catalog.stations.suggest(query, limit)
+
+        try:
+            return self._get_station_index().suggest(query, limit)
+        except Exception as e:
+            print(f"Error loading stations from DynamoDB: {str(e)}")
+            return []
+
+    def search_trains_by_stations(self, origin: str = None, destination: str = None) -> List[Dict]:
+        """
+        Search for trains by origin and/or destination station
+        Args:
+            origin: Origin station name or prefix (blank matches any)
+            destination: Destination station name or prefix (blank matches any)
+        Returns:
+            List of train dictionaries matching the search
+        """
+        if self.use_mock:
+            return train_catalog.find_by_stations(origin, destination)
+
+        origin = (origin or "").strip()
+        destination = (destination or "").strip()
+        if not origin and not destination:
+            return self.search_trains()
+
+        # Real DynamoDB implementation: resolve stations, then query the
+        # OriginDestinationIndex / DestinationIndex GSIs instead of scanning
+        cache_key = ('stations', origin.lower(), destination.lower())
+        trains = self.train_cache.searches.get(cache_key)
+        if trains is not None:
+            return list(trains)
+        try:
+            stations = self._get_station_index()
+            origins = stations.resolve(origin) if origin else None
+            destinations = stations.resolve(destination) if destination else None
+
+            key_conditions = []
+            if origins is not None:
+                for o in origins:
+                    if destinations is None:
+                        key_conditions.append(('OriginDestinationIndex', Key('OriginLower').eq(o)))
+                    for d in destinations or []:
+                        key_conditions.append((
+                            'OriginDestinationIndex',
+                            Key('OriginLower').eq(o) & Key('DestinationLower').eq(d)
+                        ))
+            else:
+                for d in destinations:
+                    key_conditions.append(('DestinationIndex', Key('DestinationLower').eq(d)))
+
+            results = []
+            for index_name, condition in key_conditions:
+                results.extend(iter_dynamodb_items(
+                    self.trains_table.query, IndexName=index_name, KeyConditionExpression=condition
+                ))
+            self.train_cache.put_search(cache_key, results)
+            return list(results)
+        except Exception as e:
+            print(f"Error searching trains by station in DynamoDB: {str(e)}")
+            return []
+
+    def get_train_by_id(self, train_id: str, consistent: bool = False) -> Optional[Dict]:
+        """
+        Get a specific train by TrainID
+        Args:
+            train_id: The TrainID to search for
+            consistent: Skip the train cache and read strongly (DynamoDB mode)
+        Returns:
+            Train dictionary or None if not found
+        """
+        if self.use_mock:
+            # Mock implementation: O(1) lookup in the catalog index
+            train = train_catalog.get(train_id)
+            return train.copy() if train else None
+        
+        else:
+            # Real DynamoDB implementation, read through the train cache
+            if not consistent:
+                train = self.train_cache.trains.get(train_id)
+                if train is not None:
+                    return train.copy()
+            try:
+                read_kwargs = {'ConsistentRead': True} if consistent else {}
+                response = self.trains_table.get_item(
+                    Key={'TrainID': train_id}, **read_kwargs
+                )
+                train = response.get('Item')
+                if not train:
+                    return None
+                self.train_cache.trains.set(train_id, train)
+                return train.copy()
+            except Exception as e:
+                print(f"Error getting train from DynamoDB: {str(e)}")
+                return None
+
+    def get_trains_by_ids(self, train_ids: List[str]) -> List[Dict]:
+        """
+        Get several trains by TrainID, from the train cache or one BatchGetItem per 100 misses
+        Args:
+            train_ids: TrainIDs to load
+        Returns:
+            The trains that exist, in the order of train_ids
+        """
+        train_ids = list(dict.fromkeys(train_ids))
+        if self.use_mock:
+            return [train.copy() for train in map(train_catalog.get, train_ids) if train]
+
+        found = {}
+        for train_id in train_ids:
+            train = self.train_cache.trains.get(train_id)
+            if train is not None:
+                found[train_id] = train
+        missing = [train_id for train_id in train_ids if train_id not in found]
+        try:
+            for start in range(0, len(missing), 100):
+                request_items = {DYNAMODB_TABLE_TRAINS: {
+                    'Keys': [{'TrainID': train_id} for train_id in missing[start:start + 100]]
+                }}
+                while request_items:
+                    response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                    for item in response.get('Responses', {}).get(DYNAMODB_TABLE_TRAINS, []):
+                        self.train_cache.trains.set(item['TrainID'], item)
+                        found[item['TrainID']] = item
+                    request_items = response.get('UnprocessedKeys') or None
+        except Exception as e:
+            print(f"Error getting trains from DynamoDB: {str(e)}")
+        return [found[train_id].copy() for train_id in train_ids if train_id in found]
+    
+    def _resolve_journey_date(self, journey_date: str = None) -> Optional[date]:
+        if not journey_date:
+            return date.today()
+        return parse_journey_date(journey_date)
+
+    def get_journey_availability(self, train_id: str, journey_date: str = None, train: Dict = None,
+                                 consistent: bool = False) -> Dict[str, int]:
+        """
+        Get remaining seats per class for one journey date
+        Args:
+            train_id: The TrainID
+            journey_date: Journey date (YYYY-MM-DD), defaults to today
+            train: Optional train record already loaded by the caller
+            consistent: Skip the availability cache and read strongly (DynamoDB mode)
+        Returns:
+            Dict of class name -> remaining seats (empty if the train or date is invalid)
+        """
+        day = self._resolve_journey_date(journey_date)
+        if day is None:
+            return {}
+
+        if self.use_mock:
+            return mock_store.journey_availability(train_id, day)
+
+        # Real DynamoDB implementation: one query returns every touched class for the date;
+        # untouched classes still have their full template capacity
+        if not consistent:
+            cached = self.train_cache.availability.get((train_id, day))
+            if cached is not None:
+                return dict(cached)
+        train = train or self.get_train_by_id(train_id)
+        if not train:
+            return {}
+        availability = {
+            class_name: int(class_info["Availability"])
+            for class_name, class_info in (train.get("Classes") or {}).items()
+        }
+        try:
+            for item in iter_dynamodb_items(
+                self.inventory_table.query,
+                KeyConditionExpression=Key('TrainID').eq(train_id) & Key('JourneyKey').begins_with(f"{day.isoformat()}#"),
+                ConsistentRead=consistent
+            ):
+                class_name = item['JourneyKey'].split('#', 1)[1]
+                if class_name in availability:
+                    availability[class_name] = int(item['Availability'])
+            self.train_cache.availability.set((train_id, day), dict(availability))
+        except Exception as e:
+            print(f"Error reading seat inventory from DynamoDB: {str(e)}")
+        return availability
+
+    def with_journey_availability(self, trains: List[Dict], journey_date: str = None,
+                                  consistent: bool = False) -> List[Dict]:
+        """
+        Overlay per-date availability onto train records for display
+        Args:
+            trains: Train records (left unmodified)
+            journey_date: Journey date (YYYY-MM-DD), defaults to today
+            consistent: Skip the availability cache and read strongly (DynamoDB mode)
+        Returns:
+            Copies of the trains whose Classes carry the remaining seats for that date
+        """
+        day = self._resolve_journey_date(journey_date)
+        if day is None:
+            return trains
+
+        if self.use_mock:
+            per_train = [mock_store.journey_availability(train["TrainID"], day) for train in trains]
+        else:
+            per_train = self._batch_get_inventory(trains, day, consistent)
+
+        overlaid = []
+        for train, availability in zip(trains, per_train):
+            train_copy = train.copy()
+            train_copy["Classes"] = {
+                class_name: dict(class_info, Availability=availability.get(class_name, class_info["Availability"]))
+                for class_name, class_info in (train.get("Classes") or {}).items()
+            }
+            overlaid.append(train_copy)
+        return overlaid
+
+    def _batch_get_inventory(self, trains: List[Dict], day: date, consistent: bool = False) -> List[Dict[str, int]]:
+        """
+        Read inventory items for many trains on one date with BatchGetItem.
+        Trains whose availability is in the cache are not read again.
+        """
+        per_train = [None] * len(trains)
+        if not consistent:
+            for position, train in enumerate(trains):
+                per_train[position] = self.train_cache.availability.get((train["TrainID"], day))
+        missing = [train for train, availability in zip(trains, per_train) if availability is None]
+
+        keys = []
+        for train in missing:
+            for class_name in (train.get("Classes") or {}):
+                keys.append({'TrainID': train["TrainID"], 'JourneyKey': f"{day.isoformat()}#{class_name}"})
+
+        found = {}
+        complete = True
+        try:
+            for start in range(0, len(keys), 100):
+                request_items = {DYNAMODB_TABLE_INVENTORY: {'Keys': keys[start:start + 100]}}
+                if consistent:
+                    request_items[DYNAMODB_TABLE_INVENTORY]['ConsistentRead'] = True
+                while request_items:
+                    response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                    for item in response.get('Responses', {}).get(DYNAMODB_TABLE_INVENTORY, []):
+                        found[(item['TrainID'], item['JourneyKey'])] = int(item['Availability'])
+                    request_items = response.get('UnprocessedKeys') or None
+        except Exception as e:
+            complete = False
+            print(f"Error reading seat inventory from DynamoDB: {str(e)}")
+
+        # Only the touched classes are stored; the rest keep their template capacity
+        loaded = iter(missing)
+        for position, availability in enumerate(per_train):
+            if availability is not None:
+                per_train[position] = dict(availability)
+                continue
+            train = next(loaded)
+            availability = {
+                class_name: found[(train["TrainID"], f"{day.isoformat()}#{class_name}")]
+                for class_name in (train.get("Classes") or {})
+                if (train["TrainID"], f"{day.isoformat()}#{class_name}") in found
+            }
+            if complete:
+                self.train_cache.availability.set((train["TrainID"], day), dict(availability))
+            per_train[position] = availability
+        return per_train
+
+    def _read_occupancy(self, key: Dict) -> Tuple[int, int]:
+        """Read (occupancy bitset, version) of an inventory item; (0, 0) if it does not exist yet"""
+        item = self.inventory_table.get_item(Key=key, ConsistentRead=True).get('Item') or {}
+        raw = item.get('Occupancy')
+        occupied = int.from_bytes(bytes(getattr(raw, 'value', raw) or b''), 'big')
+        return occupied, int(item.get('Version', 0))
+
+    def _occupancy_update(self, seat_map: SeatMap, occupied: int, version: int) -> Dict:
+        """
+        Update arguments that store a new occupancy bitset, conditional on the
+        version read before allocating (optimistic concurrency)
+        """
+        return {
+            'UpdateExpression': 'SET #occupancy = :occupancy, #availability = :availability, #version = :next',
+            'ConditionExpression': 'attribute_not_exists(#version) OR #version = :version',
+            'ExpressionAttributeNames': {
+                '#occupancy': 'Occupancy',
+                '#availability': 'Availability',
+                '#version': 'Version'
+            },
+            'ExpressionAttributeValues': {
+                ':occupancy': occupied.to_bytes((occupied.bit_length() + 7) // 8, 'big'),
+                ':availability': seat_map.remaining(occupied),
+                ':version': version,
+                ':next': version + 1
+            }
+        }
+    
+    def _record_journey_seats(self, key: Dict, seat_update: Dict):
+        """
+        Copy the remaining seats an inventory write just stored into the
+        journey#<date> summary document. Runs after every seat write, outside
+        the booking transaction so bookings on one date do not conflict on the
+        summary item; the inventory Version keeps an older write from
+        overwriting a newer one. A lost copy is repaired by backfill_ops_counters.py.
+        Args:
+            key: Inventory key (TrainID, JourneyKey '<date>#<class>')
+            seat_update: The update from _occupancy_update that was written
+        """
+        journey_date, class_name = key['JourneyKey'].split('#', 1)
+        field = f"{key['TrainID']}#{class_name}"
+        values = seat_update['ExpressionAttributeValues']
+        try:
+            self.counters_table.update_item(
+                Key={'CounterName': f"ops#journey#{journey_date}"},
+                UpdateExpression='SET #remaining = :remaining, #version = :version',
+                ConditionExpression='attribute_not_exists(#version) OR #version < :version',
+                ExpressionAttributeNames={'#remaining': f"Remaining#{field}", '#version': f"Version#{field}"},
+                ExpressionAttributeValues={':remaining': values[':availability'], ':version': values[':next']}
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            pass  # A newer seat write has already been copied
+        except Exception as e:
+            print(f"Error updating the operations summary in DynamoDB: {str(e)}")
+
+    def _lease_ids_from_dynamodb(self, name: str, count: int) -> int:
+        """Lease a block of IDs from the atomic counter item in the counters table"""
+        response = self.counters_table.update_item(
+            Key={'CounterName': name},
+            UpdateExpression='SET #value = if_not_exists(#value, :start) + :count',
+            ExpressionAttributeNames={'#value': 'Value'},
+            ExpressionAttributeValues={':start': ID_COUNTER_STARTS[name], ':count': count},
+            ReturnValues='UPDATED_NEW'
+        )
+        return int(response['Attributes']['Value']) - count + 1
+
+    def generate_pnr(self) -> str:
+        """Generate a 10-digit PNR number"""
+        pnr = self.ids.next_id('pnr')
+        if pnr > PNR_MAX:
+            raise RuntimeError('PNR range exhausted')
+        return str(pnr)
+    
+    def _build_booking(self, booking_id: str, pnr: str, train_id: str, route: str, time: str, seats: int,
+                       passenger_name: str, fare_per_seat, train_name: str = None, class_name: str = None,
+                       journey_date: str = None, passengers: list = None, berth_preference: str = None,
+                       user_id: str = None, berth_allocations: list = None, payment: Dict = None) -> Dict:
+        """Assemble the booking record stored by create_booking and commit_booking"""
+        booking = {
+            "BookingID": booking_id,
+            "PNR": pnr,
+            "TrainID": train_id,
+            "Route": route,
+            "Time": time,
+            "Seats": seats,
+            "PassengerName": passenger_name,
+            "BookingDate": datetime.now().isoformat(),
+            "Status": "Confirmed",
+            "Class": class_name or "GN",
+            "JourneyDate": journey_date or datetime.now().strftime("%Y-%m-%d"),
+            "TotalFare": fare_per_seat * seats,
+            "FarePerSeat": fare_per_seat,
+            "BerthAllocations": berth_allocations or [],
+            "BerthPreference": berth_preference or "No Preference",
+            "UserID": user_id
+        }
+        
+        if payment:
+            booking["Payment"] = payment
+        
+        if train_name:
+            booking["TrainName"] = train_name
+        
+        if passengers:
+            booking["Passengers"] = passengers
+        else:
+            # Default passenger if not provided
+            booking["Passengers"] = [{
+                "Name": passenger_name,
+                "Age": "N/A",
+                "Gender": "N/A"
+            }]
+        return booking
+
+    def _new_booking_id(self) -> str:
+        booking_number = self.ids.next_id('booking_id')
+        return str(booking_number) if self.use_mock else f"BK{booking_number}"
+
+    def commit_booking(self, train: Dict, class_name: str, seats: int, passenger_name: str,
+                       journey_date: str = None, passengers: list = None, berth_preference: str = None,
+                       user_id: str = None, payment: Dict = None) -> Optional[Dict]:
+        """
+        Reserve seats, store the booking and link it to the user as one unit.
+        In DynamoDB mode the conditional seat update, the booking put, the PNR
+        claim and the user bookings append go in a single TransactWriteItems; in mock mode
+        a failure after the seats are taken releases them again.
+        Args:
+            train: Train record already loaded by the caller (supplies fare, route, time)
+            class_name: Train class (AC1, AC2, AC3, SL, GN, etc.)
+            seats: Number of seats to book
+            passenger_name: Name of the primary passenger
+            journey_date: Date of journey (YYYY-MM-DD), defaults to today
+            passengers: List of passenger details (name, age, gender)
+            berth_preference: Berth preference (Lower, Middle, Upper, etc.)
+            user_id: ID of the booking user
+            payment: Payment details recorded with the booking
+        Returns:
+            Booking dictionary, or None if the seats could not be booked
+        """
+        day = self._resolve_journey_date(journey_date)
+        capacity = class_capacity(train, class_name)
+        if day is None or capacity is None:
+            return None
+        train_id = train["TrainID"]
+        journey_date = day.isoformat()
+
+        def build(berths: List[Dict]) -> Dict:
+            booking = self._build_booking(
+                booking_id, pnr, train_id, train.get("Route"), train.get("Time"), seats, passenger_name,
+                train["Classes"][class_name]["Fare"], train_name=train.get("TrainName"), class_name=class_name,
+                journey_date=journey_date, passengers=passengers, berth_preference=berth_preference,
+                user_id=user_id, berth_allocations=berths, payment=payment
+            )
+            # Receipt and notification are produced after the commit by the outbox
+            booking["SideEffects"] = {effect: "PENDING" for effect in POST_BOOKING_EFFECTS}
+            return booking
+
+        if self.use_mock:
+            berths = mock_store.allocate_berths(train_id, day, class_name, seats, berth_preference)
+            if not berths:
+                return None
+            self.train_cache.invalidate_availability(train_id, day)
+            booking_id, pnr = self._new_booking_id(), self.generate_pnr()
+            booking = build(berths)
+            try:
+                mock_store.put_booking(booking)
+                if user_id:
+                    mock_store.add_user_booking(user_id, booking_id)
+                self._booking_changed(booking_id, pnr)
+                return booking
+            except Exception as e:
+                # Compensate: undo whatever was written so no seats leak
+                print(f"[MOCK DB] Error committing booking {booking_id}, releasing seats: {e}")
+                mock_store.delete_booking(booking_id)
+                mock_store.release_berths(train_id, day, class_name, berths)
+                self.train_cache.invalidate_availability(train_id, day)
+                self._booking_changed(booking_id, pnr)
+                return None
+
+        # Real DynamoDB implementation: one read of the occupancy, one transaction
+        seat_map = get_seat_map(class_name, capacity)
+        key = {'TrainID': train_id, 'JourneyKey': f"{journey_date}#{class_name}"}
+        client = self.dynamodb.meta.client
+        serializer = TypeSerializer()
+
+        def serialize(values: Dict) -> Dict:
+            return {name: serializer.serialize(value) for name, value in values.items()}
+
+        try:
+            booking_id, pnr = self._new_booking_id(), self.generate_pnr()
+            for _ in range(5):
+                occupied, version = self._read_occupancy(key)
+                result = seat_map.allocate(occupied, seats, berth_preference)
+                if result is None:
+                    print(f"Insufficient availability for train {train_id}, class {class_name} on {journey_date}")
+                    return None
+                berths, occupied = result
+                booking = build(berths)
+
+                seat_update = self._occupancy_update(seat_map, occupied, version)
+                transact_items = [
+                    {'Update': {
+                        'TableName': DYNAMODB_TABLE_INVENTORY,
+                        'Key': serialize(key),
+                        'UpdateExpression': seat_update['UpdateExpression'],
+                        'ConditionExpression': seat_update['ConditionExpression'],
+                        'ExpressionAttributeNames': seat_update['ExpressionAttributeNames'],
+                        'ExpressionAttributeValues': serialize(seat_update['ExpressionAttributeValues'])
+                    }},
+                    {'Put': {
+                        'TableName': DYNAMODB_TABLE_BOOKINGS,
+                        'Item': serialize(booking),
+                        'ConditionExpression': 'attribute_not_exists(BookingID)'
+                    }},
+                    # PNRs are unique: each one claims an item in the counters table
+                    {'Put': {
+                        'TableName': DYNAMODB_TABLE_COUNTERS,
+                        'Item': serialize({'CounterName': f"pnr#{pnr}", 'BookingID': booking_id}),
+                        'ConditionExpression': 'attribute_not_exists(CounterName)'
+                    }}
+                ]
+                if user_id:
+                    transact_items.append({'Update': {
+                        'TableName': DYNAMODB_TABLE_USERS,
+                        'Key': serialize({'UserID': user_id}),
+                        'UpdateExpression': 'SET #bookings = list_append(if_not_exists(#bookings, :empty), :new) '
+                                            'ADD #booking_count :one',
+                        # A stale or deleted UserID must not create a partial user item
+                        'ConditionExpression': 'attribute_exists(UserID)',
+                        'ExpressionAttributeNames': {'#bookings': 'Bookings', '#booking_count': 'BookingCount'},
+                        'ExpressionAttributeValues': serialize({':empty': [], ':new': [booking_id], ':one': 1})
+                    }})
+
+                try:
+                    client.transact_write_items(TransactItems=transact_items)
+                    self.train_cache.invalidate_availability(train_id, day)
+                    self._booking_changed(booking_id, pnr)
+                    self._record_journey_seats(key, seat_update)
+                    return booking
+                except client.exceptions.TransactionCanceledException as e:
+                    failed = [
+                        position for position, reason in enumerate(e.response.get('CancellationReasons', []))
+                        if reason.get('Code') == 'ConditionalCheckFailed'
+                    ]
+                    if 3 in failed:
+                        print(f"Error committing booking: user {user_id} does not exist")
+                        return None
+                    if not failed:
+                        raise
+                    # Retry: another booking changed the seat map first (0), or the
+                    # BookingID (1) or PNR (2) was issued before the counters were seeded
+                    if 1 in failed:
+                        booking_id = self._new_booking_id()
+                    if 2 in failed:
+                        pnr = self.generate_pnr()
+                    continue
+            print(f"Booking commit for train {train_id}, class {class_name} kept conflicting; giving up")
+            return None
+        except Exception as e:
+            print(f"Error committing booking in DynamoDB: {str(e)}")
+            return None
+    
+    def set_side_effect_status(self, booking_id: str, effect: str, status: str, fields: Dict = None):
+        """
+        Record the outcome of a post-booking side effect on the booking
+        Args:
+            booking_id: The BookingID
+            effect: Side effect name (see POST_BOOKING_EFFECTS)
+            status: PENDING, DONE or FAILED
+            fields: Booking attributes to set in the same write (e.g. ReceiptKey)
+        """
+        self._booking_changed(booking_id)
+        if self.use_mock:
+            mock_store.set_side_effect(booking_id, effect, status, fields)
+            return
+
+        fields = fields or {}
+        try:
+            self.bookings_table.update_item(
+                Key={'BookingID': booking_id},
+                UpdateExpression='SET ' + ', '.join(
+                    ['SideEffects.#effect = :status'] + [f"#f{i} = :v{i}" for i in range(len(fields))]
+                ),
+                ExpressionAttributeNames=dict(
+                    {'#effect': effect}, **{f"#f{i}": field for i, field in enumerate(fields)}
+                ),
+                ExpressionAttributeValues=dict(
+                    {':status': status}, **{f":v{i}": value for i, value in enumerate(fields.values())}
+                )
+            )
+        except Exception as e:
+            print(f"Error updating booking side effect in DynamoDB: {str(e)}")
+
+    def _booking_changed(self, booking_id: str, pnr: str = None):
+        """Drop a booking's cached PNR status after this process writes the booking"""
+        pnr = pnr or self._cached_pnrs.get(booking_id)
+        if pnr:
+            self.pnr_statuses.invalidate(pnr)
+
+    @staticmethod
+    def _pnr_status_view(booking: Dict) -> Dict:
+        """The public part of a booking shown for a PNR enquiry (no names, payment or user)"""
+        return {
+            'pnr': booking.get('PNR'),
+            'status': booking.get('Status'),
+            'train_id': booking.get('TrainID'),
+            'train_name': booking.get('TrainName'),
+            'route': booking.get('Route'),
+            'departure': booking.get('Time'),
+            'journey_date': booking.get('JourneyDate'),
+            'class': booking.get('Class'),
+            'seats': int(booking.get('Seats') or 0),
+            'passengers': [
+                {
+                    'number': number,
+                    'coach': berth.get('Coach'),
+                    'berth': berth.get('Berth'),
+                    'berth_type': berth.get('Type')
+                }
+                for number, berth in enumerate(booking.get('BerthAllocations') or [], start=1)
+            ]
+        }
+
+    def get_pnr_status(self, pnr: str) -> Optional[Dict]:
+        """
+        PNR status enquiry, answered from the hot PNR cache when possible
+        Args:
+            pnr: The 10-digit PNR
+        Returns:
+            Public status view of the booking, or None if the PNR is unknown
+        """
+        status = self.pnr_statuses.get(pnr)
+        if status is None:
+            booking = self.get_booking_by_pnr(pnr)
+            if booking:
+                status = self._pnr_status_view(booking)
+                self.pnr_statuses.set(pnr, status)
+                self._cached_pnrs.set(booking['BookingID'], pnr)
+            else:
+                # Unknown PNRs only briefly: the booking may be committed by another worker
+                status = {}
+                if PNR_MISS_CACHE_TTL > 0:
+                    self.pnr_statuses.set(pnr, status, ttl=min(PNR_MISS_CACHE_TTL, PNR_CACHE_TTL))
+        return status or None
+
+    def record_booking_ops(self, booking: Dict) -> bool:
+        """
+        Add a committed booking to the operations summary. Runs from the
+        outbox (standing in for a DynamoDB Streams consumer); counting is
+        idempotent, so a retried job never counts a booking twice.
+        Args:
+            booking: The committed booking
+        Returns:
+            True once the booking is counted
+        """
+        if self.use_mock:
+            mock_store.ops_record(booking)
+            return True
+
+        # Real DynamoDB implementation: the counters and the booking's summary
+        # flag change in one transaction, conditional on the flag not being set yet
+        client = self.dynamodb.meta.client
+        serialize = TypeSerializer().serialize
+        documents = {}
+        for document, field, amount in ops_increments(booking):
+            documents.setdefault(document, []).append((field, Decimal(str(amount))))
+        counters = []
+        for document, fields in documents.items():
+            counters.append({'Update': {
+                'TableName': DYNAMODB_TABLE_COUNTERS,
+                'Key': {'CounterName': serialize(f"ops#{document}")},
+                'UpdateExpression': 'ADD ' + ', '.join(f"#f{i} :v{i}" for i in range(len(fields))),
+                'ExpressionAttributeNames': {f"#f{i}": field for i, (field, _) in enumerate(fields)},
+                'ExpressionAttributeValues': {f":v{i}": serialize(amount) for i, (_, amount) in enumerate(fields)}
+            }})
+        # Bookings from before the outbox have no SideEffects map to put the flag in
+        # (and must not get one, it would hide their legacy receipt): they are
+        # flagged OpsCounted instead, as backfill_ops_counters.py does
+        legacy = booking.get('SideEffects') is None
+        for _ in range(2):
+            flag = dict(self._ops_counted_flag(legacy), TableName=DYNAMODB_TABLE_BOOKINGS,
+                        Key={'BookingID': serialize(booking["BookingID"])})
+            try:
+                client.transact_write_items(TransactItems=[{'Update': flag}] + counters)
+                return True
+            except client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get('CancellationReasons', [])
+                if not (reasons and reasons[0].get('Code') == 'ConditionalCheckFailed'):
+                    raise
+            # Either counted by an earlier attempt, or the copy of the booking was
+            # wrong about its SideEffects map; the stored booking decides
+            stored = self.bookings_table.get_item(
+                Key={'BookingID': booking["BookingID"]},
+                ProjectionExpression='SideEffects, OpsCounted',
+                ConsistentRead=True
+            ).get('Item') or {}
+            if ('SideEffects' not in stored) == legacy:
+                return True
+            legacy = not legacy
+        return True
+
+    @staticmethod
+    def _ops_counted_flag(legacy: bool) -> Dict:
+        """Update marking a booking counted in the summary, failing its condition if it already is"""
+        serialize = TypeSerializer().serialize
+        if legacy:
+            return {
+                'UpdateExpression': 'SET OpsCounted = :yes',
+                'ConditionExpression': 'attribute_not_exists(SideEffects) AND attribute_not_exists(OpsCounted)',
+                'ExpressionAttributeValues': {':yes': serialize(True)}
+            }
+        return {
+            'UpdateExpression': 'SET SideEffects.#effect = :done',
+            'ConditionExpression': (
+                'attribute_exists(SideEffects) AND '
+                '(attribute_not_exists(SideEffects.#effect) OR SideEffects.#effect <> :done)'
+            ),
+            'ExpressionAttributeNames': {'#effect': 'summary'},
+            'ExpressionAttributeValues': {':done': serialize('DONE')}
+        }
+
+    def _ops_documents(self, documents: List[str]) -> Dict[str, Dict]:
+        if self.use_mock:
+            return mock_store.ops_documents(documents)
+
+        found = {document: {} for document in documents}
+        try:
+            request_items = {DYNAMODB_TABLE_COUNTERS: {
+                'Keys': [{'CounterName': f"ops#{document}"} for document in documents]
+            }}
+            while request_items:
+                response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                for item in response.get('Responses', {}).get(DYNAMODB_TABLE_COUNTERS, []):
+                    document = item.pop('CounterName')[len('ops#'):]
+                    found[document] = {field: float(value) for field, value in item.items()}
+                request_items = response.get('UnprocessedKeys') or None
+        except Exception as e:
+            print(f"Error reading the operations summary from DynamoDB: {str(e)}")
+        return found
+
+    def _ops_catalog(self, document: Dict = None) -> Dict[str, Dict[str, int]]:
+        """
+        Seat templates per train and class ({TrainID: {class: capacity}}).
+        Mock mode reads the in-memory catalog; DynamoDB mode reads the
+        ops#catalog document (fields Capacity#<train>#<class>) that
+        seed_trains.py and backfill_ops_counters.py write.
+        """
+        catalog = {}
+        if self.use_mock:
+            for train_id, train in train_catalog.by_id.items():
+                catalog[train_id] = {
+                    class_name: class_capacity(train, class_name) for class_name in (train.get("Classes") or {})
+                }
+            return catalog
+        for field, capacity in (document or {}).items():
+            if field.startswith('Capacity#'):
+                train_id, class_name = field[len('Capacity#'):].split('#', 1)
+                catalog.setdefault(train_id, {})[class_name] = int(capacity)
+        return catalog
 
-        return None
+    def get_ops_summary(self, journey_date: str = None) -> Dict:
+        """
+        Operations summary for the admin console, read from small maintained
+        documents rather than from bookings or a scan of trains or inventory.
+        Seats come from the seat inventory: the mock stores list the journeys
+        written on a date, and in DynamoDB mode every seat write copies its
+        remaining count into the journey#<date> document. Classes without a
+        seat write are at their template capacity, so trains whose templates
+        are zero (e.g. 12284) are sold out without any booking.
+        Args:
+            journey_date: Journey date (YYYY-MM-DD) for occupancy, defaults to today
+        Returns:
+            Dict with the number of trains, seats booked per train and class,
+            sold-out trains and classes, today's bookings per hour and revenue,
+            and all-time totals
+        """
+        day = self._resolve_journey_date(journey_date) or date.today()
+        today = date.today().isoformat()
+        documents = self._ops_documents(
+            [f"journey#{day.isoformat()}", f"day#{today}", "totals"] + ([] if self.use_mock else ["catalog"])
+        )
+        booked_today, totals = documents[f"day#{today}"], documents["totals"]
+        catalog = self._ops_catalog(documents.get("catalog"))
+        if self.use_mock:
+            remaining = mock_store.journey_inventory(day)
+        else:
+            remaining = {
+                tuple(field[len('Remaining#'):].split('#', 1)): int(seats)
+                for field, seats in documents[f"journey#{day.isoformat()}"].items()
+                if field.startswith('Remaining#')
+            }
+
+        booked = {}
+        for (train_id, class_name), seats in sorted(remaining.items()):
+            capacity = catalog.get(train_id, {}).get(class_name)
+            if capacity is not None and capacity > seats:
+                booked.setdefault(train_id, {})[class_name] = capacity - seats
+
+        sold_out_classes = []
+        sold_out_trains = []
+        for train_id, classes in sorted(catalog.items()):
+            full = [
+                class_name for class_name, capacity in classes.items()
+                if remaining.get((train_id, class_name), capacity) <= 0
+            ]
+            sold_out_classes.extend(f"{train_id}#{class_name}" for class_name in full)
+            if full and len(full) == len(classes):
+                sold_out_trains.append(train_id)
+
+        return {
+            'journey_date': day.isoformat(),
+            'trains': len(train_catalog.trains) if self.use_mock else len(catalog),
+            'booked': booked,
+            'sold_out_trains': sold_out_trains,
+            'sold_out_classes': sold_out_classes,
+            'today': {
+                'bookings': int(booked_today.get('Bookings', 0)),
+                'revenue': round(booked_today.get('Revenue', 0), 2),
+                'hourly': {
+                    field[len('Hour#'):]: int(count)
+                    for field, count in sorted(booked_today.items()) if field.startswith('Hour#')
+                }
+            },
+            'totals': {
+                'bookings': int(totals.get('Bookings', 0)),
+                'seats': int(totals.get('Seats', 0)),
+                'revenue': round(totals.get('Revenue', 0), 2)
+            }
+        }
+
+    def get_booking_by_id(self, booking_id: str) -> Optional[Dict]:
+        """
+        Get a booking by BookingID
+        Args:
+            booking_id: The BookingID to search for
+        Returns:
+            Booking dictionary or None if not found
+        """
+        if self.use_mock:
+            # Mock implementation: Look up in the mock state store
+            return mock_store.get_booking(booking_id)
+
+        else:
+            # Real DynamoDB implementation: point read on the key. Strongly consistent,
+            # since the success page reads the booking right after committing it
+            try:
+                response = self.bookings_table.get_item(
+                    Key={'BookingID': booking_id},
+                    ConsistentRead=True
+                )
+                return response.get('Item')
+            except Exception as e:
+                print(f"Error getting booking from DynamoDB: {str(e)}")
+                return None
+
+    def get_booking_by_pnr(self, pnr: str) -> Optional[Dict]:
+        """
+        Get a booking by PNR (PNR status enquiry)
+        Args:
+            pnr: The 10-digit PNR
+        Returns:
+            Booking dictionary or None if not found
+        """
+        pnr = (pnr or "").strip()
+        if not pnr:
+            return None
+
+        if self.use_mock:
+            return mock_store.get_booking_by_pnr(pnr)
+
+        # Real DynamoDB implementation: the PNR GSI projects the whole booking
+        try:
+            response = self.bookings_table.query(
+                IndexName=PNR_INDEX,
+                KeyConditionExpression=Key('PNR').eq(pnr),
+                Limit=1
+            )
+            items = response.get('Items', [])
+            return items[0] if items else None
+        except Exception as e:
+            print(f"Error getting booking by PNR from DynamoDB: {str(e)}")
+            return None
+
+    def get_bookings(self, booking_ids: List[str]) -> List[Dict]:
+        """
+        Get several bookings by BookingID in one round-trip per 100 IDs
+        Args:
+            booking_ids: BookingIDs to load
+        Returns:
+            The bookings that exist, in the order of booking_ids
+        """
+        booking_ids = list(dict.fromkeys(booking_ids))
+        if self.use_mock:
+            return mock_store.get_bookings(booking_ids)
+
+        # Real DynamoDB implementation: BatchGetItem, retrying unprocessed keys
+        found = {}
+        try:
+            for start in range(0, len(booking_ids), 100):
+                request_items = {DYNAMODB_TABLE_BOOKINGS: {
+                    'Keys': [{'BookingID': booking_id} for booking_id in booking_ids[start:start + 100]]
+                }}
+                while request_items:
+                    response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                    for item in response.get('Responses', {}).get(DYNAMODB_TABLE_BOOKINGS, []):
+                        found[item['BookingID']] = item
+                    request_items = response.get('UnprocessedKeys') or None
+        except Exception as e:
+            print(f"Error getting bookings from DynamoDB: {str(e)}")
+        return [found[booking_id] for booking_id in booking_ids if booking_id in found]
+
+    def get_bookings_by_user_id(self, user_id: str, limit: int = None) -> List[Dict]:
+        """
+        Get a user's bookings, newest first
+        Args:
+            user_id: The UserID to search for
+            limit: Only return the newest `limit` bookings (all when None)
+        Returns:
+            List of booking dictionaries
+        """
+        if self.use_mock:
+            # Mock implementation: the store keeps each user's bookings ordered by date
+            return mock_store.bookings_for_user(user_id, limit)
+        
+        else:
+            # Real DynamoDB implementation: the GSI sort key orders by BookingDate,
+            # so the newest bookings come first and a limit stops the read early
+            query_kwargs = {
+                'IndexName': USER_BOOKINGS_INDEX,
+                'KeyConditionExpression': Key('UserID').eq(user_id),
+                'ScanIndexForward': False
+            }
+            try:
+                if limit:
+                    return read_dynamodb_page(
+                        self.bookings_table.query, limit, key_attributes=('BookingID', 'UserID', 'BookingDate'),
+                        **query_kwargs
+                    )[0]
+                return list(iter_dynamodb_items(self.bookings_table.query, **query_kwargs))
+            except Exception as e:
+                print(f"Error getting bookings by user ID from DynamoDB: {str(e)}")
+                return []
+
+    def get_bookings_page(self, user_id: str, limit: int = 20,
+                          cursor: str = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Get a user's bookings one page at a time, newest first
+        Args:
+            user_id: The UserID to search for
+            limit: Maximum number of bookings to return
+            cursor: Continuation token from the previous page
+        Returns:
+            (bookings, next_cursor) where next_cursor is None on the last page
+        """
+        if self.use_mock:
+            # One booking past the page tells whether another page follows
+            offset = cursor_offset(cursor)
+            bookings = mock_store.bookings_for_user(user_id, limit + 1, offset)
+            next_cursor = encode_cursor({'offset': offset + limit}) if len(bookings) > limit else None
+            return bookings[:limit], next_cursor
+
+        try:
+            return read_dynamodb_page(
+                self.bookings_table.query, limit, cursor, ('BookingID', 'UserID', 'BookingDate'),
+                IndexName=USER_BOOKINGS_INDEX,
+                KeyConditionExpression=Key('UserID').eq(user_id),
+                ScanIndexForward=False
+            )
+        except Exception as e:
+            print(f"Error getting bookings by user ID from DynamoDB: {str(e)}")
+            return [], None
+
+
+# Global instance for easy import
+db_service = DatabaseService()
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing pool is saturated"""
+
+
+class PasswordHasher:
+    """
+    Runs password hashing and verification (CPU-bound KDF work) in a small
+    process pool so a login burst cannot pin the request threads. At most
+    `workers + queue_limit` jobs are in flight; beyond that callers get
+    PasswordHasherBusy immediately instead of queueing. With no workers,
+    or where processes cannot be started at all (e.g. Lambda), work runs
+    inline; a pool that breaks later is restarted, never replaced by
+    inline hashing on the request threads.
+    """
+
+    def __init__(self, method: str, workers: int, queue_limit: int):
+        self.method = method
+        self.workers = max(int(workers), 0)
+        self._slots = threading.BoundedSemaphore(self.workers + max(int(queue_limit), 0) or 1)
+        self._pool = None
+        self._pid = None
+        self._started = False
+        self._prefix = self._method_prefix(method)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _method_prefix(method: str) -> str:
+        """The method field werkzeug writes into a hash, with its defaults filled in"""
+        name, *args = method.split(':')
+        if name == 'scrypt' and not args:
+            return f"scrypt:{2 ** 15}:8:1"
+        if name == 'pbkdf2' and len(args) < 2:
+            return f"pbkdf2:{args[0] if args else 'sha256'}:{DEFAULT_PBKDF2_ITERATIONS}"
+        return method
+
+    def _executor(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers == 0:
+            return None
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                try:
+                    # Long-lived spawned workers that import werkzeug, never this app (see worker_pool)
+                    self._pool = start_process_pool(self.workers)
+                except (OSError, NotImplementedError) as e:
+                    if self._started and self._pid == os.getpid():
+                        # Restarting a pool that used to work: report busy, retry on the next call
+                        print(f"Error restarting password hashing pool: {str(e)}")
+                        raise PasswordHasherBusy() from e
+                    print(f"Error starting password hashing pool, hashing inline: {str(e)}")
+                    self.workers = 0
+                    return None
+                self._pid = os.getpid()
+                self._started = True
+            return self._pool
+
+    def _discard(self, executor: ProcessPoolExecutor):
+        with self._lock:
+            if self._pool is executor:
+                self._pool = None
+        executor.shutdown(wait=False)
+
+    def _run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            executor = self._executor()
+            if executor is None:
+                return fn(*args, **kwargs)
+            for attempt in range(2):
+                try:
+                    future = executor.submit(fn, *args, **kwargs)
+                except RuntimeError as e:
+                    # BrokenProcessPool, or a pool shut down under us
+                    error = e
+                else:
+                    try:
+                        return future.result()
+                    except BrokenProcessPool as e:
+                        # A worker died (e.g. OOM-killed)
+                        error = e
+                print(f"Error in password hashing pool, restarting it: {str(error)}")
+                self._discard(executor)
+                if attempt == 0:
+                    executor = self._executor()
+            raise PasswordHasherBusy()
+        finally:
+            self._slots.release()
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured KDF method"""
+        return self._run(generate_password_hash, password, method=self.method)
+
+    def verify(self, password_hash: str, password: str) -> bool:
+        """Check a password against a stored hash"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        """True when a stored hash was made with other KDF parameters than the configured ones"""
+        return password_hash.split('$', 1)[0] != self._prefix
+
+
+# Global instance
+password_hasher = PasswordHasher(PASSWORD_HASH_METHOD, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE)
+
+
+class UserService:
+    """Service class for user authentication and management"""
+
+    def __init__(self):
+        self.use_mock = USE_MOCK_AWS
+        # Short-lived cross-request cache of normalized users by user_id.
+        # Per process: writes here invalidate it, other workers catch up within the TTL.
+        self.user_cache = TTLCache(maxsize=10000 if USER_CACHE_TTL > 0 else 0, ttl=USER_CACHE_TTL)
+        # Latest session version seen per user; only needs to outlive a snapshot
+        self.session_versions = TTLCache(maxsize=100000, ttl=SESSION_SNAPSHOT_MAX_AGE)
+
+    # Real-mode DynamoDB handles come from the shared registry (see AwsClients)
+    @property
+    def dynamodb(self):
+        return aws_clients.resource('dynamodb')
+
+    @property
+    def users_table(self):
+        return aws_clients.table(DYNAMODB_TABLE_USERS)
+
+    @property
+    def login_keys_table(self):
+        return aws_clients.table(DYNAMODB_TABLE_LOGIN_KEYS)
+
+    def invalidate_user(self, user_id: str):
+        """Drop a user from the cross-request cache after it changes"""
+        self.user_cache.invalidate(user_id)
+
+    def _remember_version(self, user_id: str, version: int):
+        if version > self.session_versions.get(user_id, 0):
+            self.session_versions.set(user_id, version)
+
+    def session_snapshot(self, user: Dict) -> Dict:
+        """
+        Build the navbar-sized user snapshot kept in the (signed) session cookie
+        Args:
+            user: Normalized user dictionary
+        Returns:
+            Snapshot dictionary stamped with the user's session version
+        """
+        return {
+            'user_id': user['user_id'],
+            'username': user.get('username'),
+            'full_name': user.get('full_name'),
+            'is_admin': bool(user.get('is_admin')),
+            'v': int(user.get('session_version', 0)),
+            'iat': int(time.time())
+        }
+
+    def snapshot_is_fresh(self, snapshot: Optional[Dict], user_id: str) -> bool:
+        """
+        A snapshot is usable until it is SESSION_SNAPSHOT_MAX_AGE seconds old,
+        or until this process has seen a newer session version for the user.
+        """
+        if not snapshot or snapshot.get('user_id') != user_id:
+            return False
+        age = time.time() - snapshot.get('iat', 0)
+        if age < 0 or age > SESSION_SNAPSHOT_MAX_AGE:
+            return False
+        return snapshot.get('v', 0) >= self.session_versions.get(user_id, 0)
+
+    def _normalize_user(self, user: Optional[Dict]) -> Optional[Dict]:
+        if not user:
+            return None
+
+        if 'user_id' in user:
+            user_copy = user.copy()
+            user_copy.pop('password_hash', None)
+            user_copy.setdefault('booking_count', len(user_copy.get('bookings') or []))
+            return user_copy
+
+        return {
+            'user_id': user.get('UserID'),
+            'username': user.get('Username'),
+            'email': user.get('Email'),
+            'full_name': user.get('FullName'),
+            'phone': user.get('Phone'),
+            'created_at': user.get('CreatedAt'),
+            'bookings': user.get('Bookings', []),
+            'booking_count': int(user.get('BookingCount', len(user.get('Bookings', [])))),
+            'is_admin': user.get('IsAdmin', False),
+            'session_version': int(user.get('SessionVersion', 0))
+        }
+
+    def _get_user_by_username_or_email(self, login_value: str) -> Optional[Dict]:
+        if self.use_mock:
+            return mock_store.find_user(login_value)
+
+        login_value = (login_value or '').strip().lower()
+        if not login_value:
+            return None
+
+        # One point read on the login-keys table resolves a username or an email
+        try:
+            key_item = self.login_keys_table.get_item(Key={'LoginKey': login_value}).get('Item')
+            if not key_item:
+                return None
+            return self.users_table.get_item(Key={'UserID': key_item['UserID']}).get('Item')
+        except Exception:
+            return None
     
     def register_user(self, username: str, email: str, password: str, full_name: str, phone: str = None) -> Dict:
         """
@@ -860,37 +3706,27 @@ class UserService:
             User dictionary or None if registration failed
         """
         if self.use_mock:
-            # Check if username or email already exists
-            for user in mock_users:
-                if user['username'] == username or user['email'] == email:
-                    return None
-
-            # First user becomes admin in mock mode (simple bootstrap)
-            is_admin = len(mock_users) == 0
-
-            # Create new user
+            # Create new user; the store rejects duplicate usernames/emails
+            # and makes the first user admin (simple bootstrap)
             user_id = str(uuid.uuid4())
             user = {
                 'user_id': user_id,
                 'username': username,
                 'email': email,
-                'password_hash': generate_password_hash(password),
+                'password_hash': password_hasher.hash(password),
                 'full_name': full_name,
                 'phone': phone or '',
                 'created_at': datetime.now().isoformat(),
                 'bookings': [],
-                'is_admin': is_admin
+                'booking_count': 0,
+                'is_admin': False
             }
 
-            mock_users.append(user)
-            return self._normalize_user(user)
+            return self._normalize_user(mock_store.create_user(user))
 
         username_lower = (username or '').strip().lower()
         email_lower = (email or '').strip().lower()
 
-        if self._get_user_by_username_or_email(username_lower) or self._get_user_by_username_or_email(email_lower):
-            return None
-
         is_admin = bool(BOOTSTRAP_ADMIN_EMAIL and email_lower == BOOTSTRAP_ADMIN_EMAIL)
 
         user_id = str(uuid.uuid4())
@@ -900,16 +3736,33 @@ class UserService:
             'Email': email,
             'UsernameLower': username_lower,
             'EmailLower': email_lower,
-            'PasswordHash': generate_password_hash(password),
+            'PasswordHash': password_hasher.hash(password),
             'FullName': full_name,
             'Phone': phone or '',
             'CreatedAt': datetime.now().isoformat(),
             'Bookings': [],
+            'BookingCount': 0,
             'IsAdmin': is_admin
         }
 
+        # The user and its login keys are written together; a taken username
+        # or email fails the key condition, so concurrent registrations cannot both win
+        client = self.dynamodb.meta.client
+        serialize = TypeSerializer().serialize
+        transact_items = [{'Put': {
+            'TableName': DYNAMODB_TABLE_USERS,
+            'Item': {k: serialize(v) for k, v in user.items()},
+            'ConditionExpression': 'attribute_not_exists(UserID)'
+        }}]
+        for key in login_keys(username, email):
+            transact_items.append({'Put': {
+                'TableName': DYNAMODB_TABLE_LOGIN_KEYS,
+                'Item': {'LoginKey': serialize(key), 'UserID': serialize(user_id)},
+                'ConditionExpression': 'attribute_not_exists(LoginKey)'
+            }})
+
         try:
-            self.users_table.put_item(Item=user)
+            client.transact_write_items(TransactItems=transact_items)
         except Exception:
             return None
 
@@ -923,6 +3776,8 @@ class UserService:
             password: Plain text password
         Returns:
             User dictionary if authenticated, None otherwise
+        Raises:
+            PasswordHasherBusy: if the hashing pool is saturated
         """
         user = self._get_user_by_username_or_email(username)
         if not user:
@@ -933,24 +3788,52 @@ class UserService:
         else:
             password_hash = user.get('PasswordHash')
 
-        if password_hash and check_password_hash(password_hash, password):
+        if password_hash and password_hasher.verify(password_hash, password):
+            if password_hasher.needs_rehash(password_hash):
+                self._rehash_password(user, password_hash, password)
             return self._normalize_user(user)
 
         return None
+
+    def _rehash_password(self, user: Dict, old_hash: str, password: str):
+        """Upgrade a stored hash to the configured KDF parameters after a successful login"""
+        try:
+            new_hash = password_hasher.hash(password)
+            if self.use_mock:
+                mock_store.update_user(user['user_id'], {'password_hash': new_hash})
+                self.invalidate_user(user['user_id'])
+                return
+            # Conditional, so a concurrent password change is never overwritten
+            self.users_table.update_item(
+                Key={'UserID': user['UserID']},
+                UpdateExpression='SET PasswordHash = :new',
+                ConditionExpression='PasswordHash = :old',
+                ExpressionAttributeValues={':new': new_hash, ':old': old_hash}
+            )
+        except Exception as e:
+            print(f"Error upgrading password hash: {str(e)}")
     
     def get_user_by_id(self, user_id: str) -> Optional[Dict]:
         """
-        Get user by user_id
+        Get user by user_id (served from the short-TTL user cache when possible)
         Args:
             user_id: User ID
         Returns:
             User dictionary or None
         """
+        cached = self.user_cache.get(user_id)
+        if cached is not None:
+            return dict(cached, bookings=list(cached.get('bookings') or []))
+
+        user = self._load_user_by_id(user_id)
+        if user is not None:
+            self._remember_version(user_id, user.get('session_version', 0))
+            self.user_cache.set(user_id, dict(user, bookings=list(user.get('bookings') or [])))
+        return user
+
+    def _load_user_by_id(self, user_id: str) -> Optional[Dict]:
         if self.use_mock:
-            for user in mock_users:
-                if user['user_id'] == user_id:
-                    return self._normalize_user(user)
-            return None
+            return self._normalize_user(mock_store.get_user(user_id))
 
         try:
             response = self.users_table.get_item(Key={'UserID': user_id})
@@ -973,20 +3856,19 @@ class UserService:
             True if updated, False otherwise
         """
         if self.use_mock:
-            for user in mock_users:
-                if user['user_id'] == user_id:
-                    if full_name:
-                        user['full_name'] = full_name
-                    if email:
-                        # Check if email already exists for another user
-                        for other_user in mock_users:
-                            if other_user['user_id'] != user_id and other_user['email'] == email:
-                                return False
-                        user['email'] = email
-                    if phone:
-                        user['phone'] = phone
-                    return True
-            return False
+            changes = {}
+            if full_name:
+                changes['full_name'] = full_name
+            if email:
+                changes['email'] = email
+            if phone:
+                changes['phone'] = phone
+            updated = mock_store.update_user(user_id, changes)
+            self.invalidate_user(user_id)
+            if updated:
+                # The store bumped the session version; make this worker notice it
+                self.get_user_by_id(user_id)
+            return updated
 
         updates = []
         names = {}
@@ -997,11 +3879,9 @@ class UserService:
             names['#full_name'] = 'FullName'
             values[':full_name'] = full_name
 
+        email_lower = None
         if email:
             email_lower = email.strip().lower()
-            existing = self._get_user_by_username_or_email(email_lower)
-            if existing and existing.get('UserID') != user_id:
-                return False
             updates.append('#email = :email')
             updates.append('#email_lower = :email_lower')
             names['#email'] = 'Email'
@@ -1017,52 +3897,90 @@ class UserService:
         if not updates:
             return True
 
+        # Bumping the session version makes outstanding session snapshots stale
+        names['#session_version'] = 'SessionVersion'
+        values[':one'] = 1
         try:
-            self.users_table.update_item(
+            if email_lower is not None:
+                current = self.users_table.get_item(Key={'UserID': user_id}).get('Item')
+                if not current:
+                    return False
+                if current.get('EmailLower') != email_lower:
+                    return self._update_user_with_new_email(
+                        current, email_lower, 'SET ' + ', '.join(updates) + ' ADD #session_version :one',
+                        names, values
+                    )
+            response = self.users_table.update_item(
                 Key={'UserID': user_id},
-                UpdateExpression='SET ' + ', '.join(updates),
+                UpdateExpression='SET ' + ', '.join(updates) + ' ADD #session_version :one',
                 ExpressionAttributeNames=names,
-                ExpressionAttributeValues=values
+                ExpressionAttributeValues=values,
+                ReturnValues='UPDATED_NEW'
             )
+            self._remember_version(user_id, int(response.get('Attributes', {}).get('SessionVersion', 0)))
             return True
         except Exception:
             return False
+        finally:
+            self.invalidate_user(user_id)
     
-    def add_booking_to_user(self, user_id: str, booking_id: str):
+    def _update_user_with_new_email(self, current: Dict, email_lower: str, update_expression: str,
+                                    names: Dict, values: Dict) -> bool:
         """
-        Add booking ID to user's booking list
-        Args:
-            user_id: User ID
-            booking_id: Booking ID
+        Apply a profile update that changes the email: claim the new login key,
+        release the old one and update the user in one transaction.
+        Returns:
+            True if updated, False if the email belongs to another user
         """
-        if self.use_mock:
-            for user in mock_users:
-                if user['user_id'] == user_id:
-                    if booking_id not in user['bookings']:
-                        user['bookings'].append(booking_id)
-                    break
-            return
+        client = self.dynamodb.meta.client
+        serialize = TypeSerializer().serialize
+        user_id = current['UserID']
+        transact_items = [
+            {'Put': {
+                'TableName': DYNAMODB_TABLE_LOGIN_KEYS,
+                'Item': {'LoginKey': serialize(email_lower), 'UserID': serialize(user_id)},
+                'ConditionExpression': 'attribute_not_exists(LoginKey) OR UserID = :user_id',
+                'ExpressionAttributeValues': {':user_id': serialize(user_id)}
+            }},
+            {'Update': {
+                'TableName': DYNAMODB_TABLE_USERS,
+                'Key': {'UserID': serialize(user_id)},
+                'UpdateExpression': update_expression,
+                'ExpressionAttributeNames': names,
+                'ExpressionAttributeValues': {k: serialize(v) for k, v in values.items()}
+            }}
+        ]
+        old_key = current.get('EmailLower')
+        if old_key and old_key != current.get('UsernameLower'):
+            transact_items.append({'Delete': {
+                'TableName': DYNAMODB_TABLE_LOGIN_KEYS,
+                'Key': {'LoginKey': serialize(old_key)},
+                'ConditionExpression': 'UserID = :user_id',
+                'ExpressionAttributeValues': {':user_id': serialize(user_id)}
+            }})
 
         try:
-            self.users_table.update_item(
-                Key={'UserID': user_id},
-                UpdateExpression='SET #bookings = list_append(if_not_exists(#bookings, :empty), :new)',
-                ExpressionAttributeNames={'#bookings': 'Bookings'},
-                ExpressionAttributeValues={
-                    ':empty': [],
-                    ':new': [booking_id]
-                }
-            )
-        except Exception:
-            return
+            client.transact_write_items(TransactItems=transact_items)
+        except client.exceptions.TransactionCanceledException:
+            return False
+        self._remember_version(user_id, int(current.get('SessionVersion', 0)) + 1)
+        return True
 
 
 # Global instance
 user_service = UserService()
 
 
+# Global instance
+receipt_renderer = ReceiptRenderer()
+
+
 class S3Service:
     """Service class for S3 storage operations"""
+
+    # Presigned receipt links are valid for an hour and reused until shortly before that
+    PRESIGN_EXPIRES = 3600
+    PRESIGN_REFRESH_MARGIN = 300
     
     def __init__(self):
         self.use_mock = USE_MOCK_AWS
@@ -1076,29 +3994,39 @@ class S3Service:
             os.makedirs(self.uploads_dir, exist_ok=True)
         
         else:
-            # Initialize S3 client when USE_MOCK_AWS = False
-            self.s3_client = boto3.client('s3', region_name=AWS_REGION)
+            # The S3 client comes from the shared client registry on first use (see s3_client)
+            self.url_cache = TTLCache(maxsize=10000, ttl=self.PRESIGN_EXPIRES - self.PRESIGN_REFRESH_MARGIN)
+
+    @property
+    def s3_client(self):
+        return aws_clients.client('s3')
+
+    @staticmethod
+    def receipt_filename(booking_id: str) -> str:
+        """Receipt file name for a new receipt; the outbox records it on the booking as ReceiptKey"""
+        return f"receipt_{booking_id}.{RECEIPT_FORMAT}"
     
     def save_receipt(self, booking_data: dict) -> Optional[str]:
         """
-        Save a booking receipt as a text file
+        Save a booking receipt in RECEIPT_FORMAT, text or PDF (rewriting it on retries)
         Args:
             booking_data: Dictionary containing booking information
         Returns:
-            File path/URL of the saved receipt, or None if failed
+            File path/S3 key of the saved receipt, or None if failed
         """
+        booking_id = booking_data.get('BookingID', 'unknown')
+        filename = self.receipt_filename(booking_id)
+
         if self.use_mock:
             # Mock implementation: Save to local file system
             try:
-                booking_id = booking_data.get('BookingID', 'unknown')
-                filename = f"receipt_{booking_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
                 filepath = os.path.join(self.uploads_dir, filename)
                 
                 # Generate receipt content
-                receipt_content = self._generate_receipt_content(booking_data)
+                receipt_content = receipt_renderer.render(booking_data, RECEIPT_FORMAT)
                 
                 # Write to file
-                with open(filepath, 'w', encoding='utf-8') as f:
+                with open(filepath, 'wb') as f:
                     f.write(receipt_content)
                 
                 # Return relative path for download link
@@ -1111,140 +4039,253 @@ class S3Service:
         else:
             # Real S3 implementation
             try:
-                booking_id = booking_data.get('BookingID', 'unknown')
-                filename = f"receipt_{booking_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
                 key = f"receipts/{filename}"
                 
                 # Generate receipt content
-                receipt_content = self._generate_receipt_content(booking_data)
+                receipt_content = receipt_renderer.render(booking_data, RECEIPT_FORMAT)
                 
                 # Upload to S3
                 self.s3_client.put_object(
                     Bucket=S3_BUCKET_NAME,
                     Key=key,
-                    Body=receipt_content.encode('utf-8'),
-                    ContentType='text/plain'
-                )
-                
-                # Generate presigned URL for download (valid for 1 hour)
-                url = self.s3_client.generate_presigned_url(
-                    'get_object',
-                    Params={'Bucket': S3_BUCKET_NAME, 'Key': key},
-                    ExpiresIn=3600
+                    Body=receipt_content,
+                    ContentType=ReceiptRenderer.CONTENT_TYPES.get(RECEIPT_FORMAT, 'text/plain')
                 )
                 
-                return url
+                return key
 
             except Exception as e:
                 print(f"[S3] Error saving receipt: {e}")
                 return None
     
-    def _generate_receipt_content(self, booking_data: dict) -> str:
+    def get_receipt_url(self, booking: Dict) -> Optional[str]:
         """
-        Generate the text content for a receipt
+        Get the URL/path to a receipt file, without listing the bucket or directory
         Args:
-            booking_data: Dictionary containing booking information
+            booking: The booking; its ReceiptKey names the receipt written for it
         Returns:
-            Formatted receipt string
+            File path/URL or None if not found
         """
-        train_name_line = ""
-        if booking_data.get('TrainName'):
-            train_name_line = f"Train Name:        {booking_data.get('TrainName', 'N/A')}\n"
-        
-        pnr_line = ""
-        if booking_data.get('PNR'):
-            pnr_line = f"PNR Number:        {booking_data.get('PNR', 'N/A')}\n"
-        
-        class_line = ""
-        if booking_data.get('Class'):
-            class_line = f"Class:             {booking_data.get('Class', 'N/A')}\n"
-        
-        journey_date_line = ""
-        if booking_data.get('JourneyDate'):
-            journey_date_line = f"Journey Date:      {booking_data.get('JourneyDate', 'N/A')}\n"
-        
-        fare_line = ""
-        if booking_data.get('TotalFare'):
-            fare_line = f"Total Fare:        ₹{booking_data.get('TotalFare', 0)}\n"
-        
-        # Passenger details
-        passengers_section = ""
-        if booking_data.get('Passengers'):
-            passengers_section = "\nPassenger Details:\n"
-            for i, p in enumerate(booking_data.get('Passengers', []), 1):
-                passengers_section += f"  {i}. {p.get('Name', 'N/A')} (Age: {p.get('Age', 'N/A')}, Gender: {p.get('Gender', 'N/A')})\n"
-        
-        # Berth allocations
-        berth_section = ""
-        if booking_data.get('BerthAllocations'):
-            berth_section = "\nSeat/Berth Allocations:\n"
-            for i, b in enumerate(booking_data.get('BerthAllocations', []), 1):
-                berth_section += f"  {i}. Coach: {b.get('Coach', 'N/A')}, Berth: {b.get('Berth', 'N/A')}, Type: {b.get('Type', 'N/A')}\n"
-        
-        receipt = f"""
-╔═══════════════════════════════════════════════════════════╗
-║         INDIAN RAILWAYS BOOKING RECEIPT                   ║
-╚═══════════════════════════════════════════════════════════╝
-
-{pnr_line}Booking ID:        {booking_data.get('BookingID', 'N/A')}
-Train Number:      {booking_data.get('TrainID', 'N/A')}
-{train_name_line}Route:             {booking_data.get('Route', 'N/A')}
-{journey_date_line}Departure Time:    {booking_data.get('Time', 'N/A')}
-{class_line}Number of Seats:   {booking_data.get('Seats', 'N/A')}
-{fare_line}{passengers_section}{berth_section}
-Booking Date:      {booking_data.get('BookingDate', 'N/A')}
-Status:            {booking_data.get('Status', 'N/A')}
-
-╔═══════════════════════════════════════════════════════════╗
-║  Thank you for choosing Indian Railways!                  ║
-║  Please arrive at least 30 minutes before departure.     ║
-║  Keep your PNR number safe for future reference.        ║
-╚═══════════════════════════════════════════════════════════╝
-"""
-        return receipt.strip()
-    
-    def get_receipt_url(self, booking_id: str) -> Optional[str]:
+        key = booking.get('ReceiptKey')
+        # Receipts written before keys were recorded use the configured format's name
+        filename = os.path.basename(key) if key else self.receipt_filename(booking.get('BookingID'))
+
+        if self.use_mock:
+            # Mock implementation: the file name is known, so one stat is enough
+            if os.path.exists(os.path.join(self.uploads_dir, filename)):
+                return f"static/uploads/{filename}"
+            return None
+
+        return self._presigned_url(key or f"receipts/{filename}")
+
+    def _presigned_url(self, key: str) -> Optional[str]:
+        url = self.url_cache.get(key)
+        if url is None:
+            try:
+                url = self.s3_client.generate_presigned_url(
+                    'get_object',
+                    Params={'Bucket': S3_BUCKET_NAME, 'Key': key},
+                    ExpiresIn=self.PRESIGN_EXPIRES
+                )
+            except Exception as e:
+                print(f"[S3] Error getting receipt URL: {e}")
+                return None
+            self.url_cache.set(key, url)
+        return url
+
+    def get_legacy_receipt_url(self, booking_id: str) -> Optional[str]:
         """
-        Get the URL/path to a receipt file
+        Find a receipt saved under the old timestamped name
+        (receipt_<booking_id>_<timestamp>.txt) by listing; only needed for
+        bookings made before receipts were produced by the outbox
         Args:
             booking_id: The BookingID
         Returns:
             File path/URL or None if not found
         """
         if self.use_mock:
-            # Mock implementation: Search for file in uploads directory
             try:
                 for filename in os.listdir(self.uploads_dir):
-                    if booking_id in filename and filename.startswith('receipt_'):
+                    if filename.startswith(f"receipt_{booking_id}_"):
                         return f"static/uploads/{filename}"
                 return None
             except Exception as e:
                 print(f"[MOCK S3] Error finding receipt: {e}")
                 return None
-        
-        else:
-            # Real S3 implementation
+
+        try:
+            response = self.s3_client.list_objects_v2(
+                Bucket=S3_BUCKET_NAME,
+                Prefix=f"receipts/receipt_{booking_id}_"
+            )
+            if response.get('Contents'):
+                return self._presigned_url(response['Contents'][0]['Key'])
+            return None
+        except Exception as e:
+            print(f"[S3] Error getting receipt URL: {e}")
+            return None
+
+
+class AsyncLogSink:
+    """
+    Logger whose records are written to stdout by a background listener
+    thread, so request and worker threads never block on the console.
+    (Re)started lazily in each process; flushed at exit.
+    """
+
+    def __init__(self, name: str):
+        self.logger = logging.getLogger(name)
+        self.logger.propagate = False
+        self._listener = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def info(self, message: str, *args):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    records = queue.Queue()
+                    for handler in list(self.logger.handlers):
+                        self.logger.removeHandler(handler)
+                    self.logger.addHandler(logging.handlers.QueueHandler(records))
+                    self.logger.setLevel(logging.INFO)
+                    stdout = logging.StreamHandler(sys.stdout)
+                    stdout.setFormatter(logging.Formatter('%(message)s'))
+                    self._listener = logging.handlers.QueueListener(records, stdout)
+                    self._listener.start()
+                    self._pid = os.getpid()
+        self.logger.info(message, *args)
+
+    def close(self):
+        if self._listener is not None and self._pid == os.getpid():
+            self._listener.stop()
+            self._listener = None
+            self._pid = None
+
+
+class NotificationBatcher:
+    """
+    Groups notification payloads into batches of at most `max_batch` items
+    (and `max_bytes` of JSON) or whatever arrived within `max_wait` seconds
+    of the first one, and hands each batch to `send_batch` from a
+    background thread. submit() returns a Future that resolves to whether
+    the batch carrying the payload was delivered, so the caller (the
+    outbox) records success or retries only once the send has happened.
+    At most `max_pending` payloads are buffered; when full, submit() waits
+    briefly and then resolves to False. Pending batches are flushed at exit.
+    With max_batch <= 1 every payload is sent inline.
+    """
+
+    _STOP = object()
+
+    def __init__(self, send_batch, max_batch: int, max_wait: float, max_pending: int,
+                 max_bytes: int = 200000):
+        self.send_batch = send_batch      # callable(list of payloads) -> bool
+        self.max_batch = max(int(max_batch), 1)
+        self.max_wait = max(float(max_wait), 0.0)
+        self.max_bytes = max_bytes
+        self._queue = queue.Queue(maxsize=max(int(max_pending), 1))
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def submit(self, payload: Dict, timeout: float = 1.0) -> Future:
+        """
+        Queue a payload for the next batch
+        Returns:
+            Future resolving to True once the payload's batch is delivered, and to
+            False if that send failed or the buffer stayed full
+        """
+        future = Future()
+        if self.max_batch <= 1:
+            self._send([(payload, future)])
+            return future
+        self._start()
+        try:
+            self._queue.put((payload, future), timeout=timeout)
+        except queue.Full:
+            print("Error queueing notification: batch buffer is full")
+            future.set_result(False)
+        return future
+
+    def close(self, timeout: float = 5.0):
+        """Flush everything buffered and stop the sender thread"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def _start(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._thread = threading.Thread(target=self._run, name="notification-batcher", daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def _run(self):
+        carry = None
+        while True:
+            item = carry if carry is not None else self._queue.get()
+            carry = None
+            if item is self._STOP:
+                self._drain()
+                return
+
+            batch = [item]
+            size = len(json.dumps(item[0], default=str))
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    carry = item
+                    break
+                item_size = len(json.dumps(item[0], default=str))
+                if size + item_size > self.max_bytes:
+                    carry = item
+                    break
+                batch.append(item)
+                size += item_size
+            self._send(batch)
+
+    def _drain(self):
+        batch = []
+        while True:
             try:
-                # List objects with prefix
-                response = self.s3_client.list_objects_v2(
-                    Bucket=S3_BUCKET_NAME,
-                    Prefix=f"receipts/receipt_{booking_id}_"
-                )
-                
-                if 'Contents' in response and len(response['Contents']) > 0:
-                    key = response['Contents'][0]['Key']
-                    url = self.s3_client.generate_presigned_url(
-                        'get_object',
-                        Params={'Bucket': S3_BUCKET_NAME, 'Key': key},
-                        ExpiresIn=3600
-                    )
-                    return url
-                
-                return None
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                continue
+            batch.append(item)
+            if len(batch) >= self.max_batch:
+                self._send(batch)
+                batch = []
+        if batch:
+            self._send(batch)
 
-            except Exception as e:
-                print(f"[S3] Error getting receipt URL: {e}")
-                return None
+    def _send(self, batch: List[Tuple[Dict, Future]]):
+        try:
+            sent = bool(self.send_batch([payload for payload, _ in batch]))
+        except Exception as e:
+            print(f"Error sending notification batch of {len(batch)}: {str(e)}")
+            sent = False
+        for _, future in batch:
+            future.set_result(sent)
 
 
 class LambdaService:
@@ -1253,70 +4294,76 @@ class LambdaService:
     def __init__(self):
         self.use_mock = USE_MOCK_AWS
         
-        if not self.use_mock:
-            # Initialize Lambda client when USE_MOCK_AWS = False
-            self.lambda_client = boto3.client('lambda', region_name=AWS_REGION)
+        if self.use_mock:
+            # Mock notifications go to stdout through a background log writer
+            self.log_sink = AsyncLogSink('mock_sns')
+        else:
+            # The Lambda client comes from the shared client registry on first use (see lambda_client)
+            pass
             
             # Alternative: Use SNS for notifications
             # self.sns_client = boto3.client('sns', region_name=AWS_REGION)
             # self.sns_topic_arn = 'arn:aws:sns:us-east-1:123456789012:booking-notifications'
+
+        self.batcher = NotificationBatcher(self._send_batch, NOTIFY_BATCH_SIZE, NOTIFY_BATCH_WAIT, NOTIFY_MAX_PENDING)
+
+    @property
+    def lambda_client(self):
+        return aws_clients.client('lambda')
     
-    def send_booking_notification(self, booking_data: dict) -> bool:
+    def send_booking_notification(self, booking_data: dict) -> Future:
         """
-        Send a notification about a new booking
+        Send a notification about a new booking (in the next batch)
         Args:
             booking_data: Dictionary containing booking information
+        Returns:
+            Future resolving to True once the notification is sent, False if it failed
+        """
+        payload = {
+            "event": "booking_confirmed",
+            "booking_id": booking_data.get('BookingID'),
+            "train_id": booking_data.get('TrainID'),
+            "route": booking_data.get('Route'),
+            "passenger_name": booking_data.get('PassengerName'),
+            "seats": booking_data.get('Seats'),
+            "timestamp": booking_data.get('BookingDate')
+        }
+        return self.batcher.submit(payload)
+
+    def _send_batch(self, payloads: List[Dict]) -> bool:
+        """
+        Deliver a batch of notification payloads. A single payload keeps the
+        original event format; several go out as one "booking_confirmed_batch"
+        event whose "notifications" list holds the individual payloads.
+        Args:
+            payloads: Notification payloads
         Returns:
             True if successful, False otherwise
         """
         if self.use_mock:
-            # Mock implementation: Print to console simulating SNS/Lambda
-            try:
-                notification_payload = {
-                    "event": "booking_confirmed",
-                    "booking_id": booking_data.get('BookingID'),
-                    "train_id": booking_data.get('TrainID'),
-                    "route": booking_data.get('Route'),
-                    "passenger_name": booking_data.get('PassengerName'),
-                    "seats": booking_data.get('Seats'),
-                    "timestamp": booking_data.get('BookingDate')
-                }
-                
-                print("\n" + "="*60)
-                print("[MOCK SNS] Email sent for Booking ID:", booking_data.get('BookingID'))
-                print("[MOCK SNS] Notification Payload:")
-                print(json.dumps(notification_payload, indent=2))
-                print("="*60 + "\n")
-                
-                return True
-            
-            except Exception as e:
-                print(f"[MOCK SNS] Error sending notification: {e}")
-                return False
-        
+            # Mock implementation: one compact line per batch simulating SNS/Lambda
+            self.log_sink.info(
+                "[MOCK SNS] Email sent for Booking ID(s): %s | payload: %s",
+                ", ".join(str(p.get('booking_id')) for p in payloads),
+                json.dumps(payloads, default=str)
+            )
+            return True
+
+        # Real Lambda invocation implementation
+        if len(payloads) == 1:
+            event = payloads[0]
         else:
-            # Real Lambda invocation implementation
-            try:
-                payload = {
-                    "event": "booking_confirmed",
-                    "booking_id": booking_data.get('BookingID'),
-                    "train_id": booking_data.get('TrainID'),
-                    "route": booking_data.get('Route'),
-                    "passenger_name": booking_data.get('PassengerName'),
-                    "seats": booking_data.get('Seats'),
-                    "timestamp": booking_data.get('BookingDate')
-                }
-                
-                response = self.lambda_client.invoke(
-                    FunctionName=LAMBDA_FUNCTION_NAME,
-                    InvocationType='Event',  # Async invocation
-                    Payload=json.dumps(payload)
-                )
-                
-                return response['StatusCode'] == 202
-            except Exception as e:
-                print(f"Error sending Lambda notification: {str(e)}")
-                return False
+            event = {"event": "booking_confirmed_batch", "notifications": payloads}
+        try:
+            response = self.lambda_client.invoke(
+                FunctionName=LAMBDA_FUNCTION_NAME,
+                InvocationType='Event',  # Async invocation
+                Payload=json.dumps(event, default=str)
+            )
+            return response['StatusCode'] == 202
+        except Exception as e:
+            print(f"Error sending Lambda notification: {str(e)}")
+            return False
 
 
 # Global instances
@@ -1324,6 +4371,297 @@ s3_service = S3Service()
 lambda_service = LambdaService()
 
 
+class DynamoOutboxQueue:
+    """
+    Outbox job queue in a DynamoDB table (BookingID + Effect), used outside
+    mock mode so jobs outlive the process that queued them: a job leased by
+    a worker that dies, or one queued just before a deploy, becomes due
+    again and is picked up by any process. Due jobs are found with a query
+    on the DueIndex GSI (Queue partition, AvailableAt sort key); the table
+    is never scanned.
+    """
+
+    DUE_INDEX = 'DueIndex'
+    QUEUE = 'pending'  # the one Queue partition of DueIndex
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+
+    @property
+    def table(self):
+        return aws_clients.table(self.table_name)
+
+    def outbox_add(self, booking: Dict, effects):
+        now = Decimal(str(time.time()))
+        for effect in effects:
+            self.table.put_item(Item={
+                'BookingID': booking["BookingID"],
+                'Effect': effect,
+                'Queue': self.QUEUE,
+                'AvailableAt': now,
+                'Attempts': 0,
+                'Booking': booking
+            })
+
+    def outbox_claim(self, limit: int, lease: float) -> List[Tuple[Dict, str, int]]:
+        """Lease up to `limit` due jobs for `lease` seconds; returns (booking, effect, attempts)"""
+        now = time.time()
+        claimed = []
+        # Oldest due jobs first; the index is eventually consistent, which the
+        # conditional claim below tolerates (a stale entry just loses)
+        due = self.table.query(
+            IndexName=self.DUE_INDEX,
+            KeyConditionExpression=Key('Queue').eq(self.QUEUE) & Key('AvailableAt').lte(Decimal(str(now))),
+            Limit=limit * 2
+        ).get('Items', [])
+        for job in due:
+            try:
+                # Conditional on the AvailableAt just read, so only one worker wins a job
+                self.table.update_item(
+                    Key={'BookingID': job['BookingID'], 'Effect': job['Effect']},
+                    UpdateExpression='SET AvailableAt = :until',
+                    ConditionExpression='AvailableAt = :seen',
+                    ExpressionAttributeValues={':until': Decimal(str(now + lease)), ':seen': job['AvailableAt']}
+                )
+            except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+                continue
+            claimed.append((job['Booking'], job['Effect'], int(job.get('Attempts', 0))))
+            if len(claimed) >= limit:
+                break
+        return claimed
+
+    def outbox_retry(self, booking_id: str, effect: str, delay: float):
+        self.table.update_item(
+            Key={'BookingID': booking_id, 'Effect': effect},
+            UpdateExpression='SET AvailableAt = :at ADD Attempts :one',
+            ConditionExpression='attribute_exists(BookingID)',
+            ExpressionAttributeValues={':at': Decimal(str(time.time() + delay)), ':one': 1}
+        )
+
+    def outbox_done(self, booking_id: str, effect: str):
+        self.table.delete_item(Key={'BookingID': booking_id, 'Effect': effect})
+
+
+class PostBookingOutbox:
+    """
+    Produces booking receipts and notifications after the booking commit,
+    off the request path. Jobs live in a queue (the mock state store in mock
+    mode, a DynamoDB table otherwise; see DynamoOutboxQueue) and are
+    leased by background worker threads, retried with exponential backoff
+    and, once done or given up, recorded in the booking's SideEffects.
+    With no workers up to INLINE_CLAIM due jobs run inline in the request:
+    usually the new booking's own, otherwise retries or jobs left behind,
+    which later requests keep working through.
+    """
+
+    LEASE_SECONDS = 60
+    POLL_SECONDS = 1.0
+    # Idle workers poll less and less often, up to this; enqueue wakes them at once
+    MAX_POLL_SECONDS = 30.0
+    INLINE_CLAIM = 10
+    # Effects whose result is stored on the booking with their DONE status
+    RESULT_FIELDS = {'receipt': 'ReceiptKey'}
+
+    def __init__(self, queue, handlers: Dict, workers: int, max_attempts: int):
+        self.queue = queue
+        self.handlers = handlers      # effect -> callable(booking), truthy on success (or a Future of it)
+        self.workers = max(int(workers), 0)
+        self.max_attempts = max(int(max_attempts), 1)
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """Start the worker threads in this process (again after a fork)"""
+        if self.workers == 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._work, name=f"outbox-{i}", daemon=True).start()
+            self._pid = os.getpid()
+
+    def enqueue(self, booking: Dict):
+        """Queue every post-booking side effect of a committed booking"""
+        try:
+            self.queue.outbox_add(booking, [effect for effect in POST_BOOKING_EFFECTS if effect in self.handlers])
+        except Exception as e:
+            # The booking itself is committed; its side effects stay PENDING
+            print(f"Error queueing post-booking jobs for booking {booking['BookingID']}: {str(e)}")
+            return
+        if self.workers == 0:
+            self.drain(self.INLINE_CLAIM)
+            return
+        self.start()
+        self._wake.set()
+
+    def drain(self, limit: int = None):
+        """
+        Run jobs that are due (every one, or at most `limit`) in the calling
+        thread, and wait for their outcomes
+        """
+        pending = []
+        while limit is None or len(pending) < limit:
+            batch = 10 if limit is None else min(10, limit - len(pending))
+            jobs = self.queue.outbox_claim(batch, self.LEASE_SECONDS)
+            if not jobs:
+                break
+            for booking, effect, attempts in jobs:
+                pending.append(self._process(booking, effect, attempts))
+        for future in pending:
+            if future is not None:
+                future.result()
+
+    def _work(self):
+        poll = self.POLL_SECONDS
+        while True:
+            try:
+                jobs = self.queue.outbox_claim(1, self.LEASE_SECONDS)
+            except Exception as e:
+                print(f"Error claiming outbox jobs: {str(e)}")
+                jobs = []
+            if not jobs:
+                # Back off while idle: jobs queued by this process wake the worker,
+                # retries and other processes' jobs wait at most MAX_POLL_SECONDS
+                if self._wake.wait(poll):
+                    poll = self.POLL_SECONDS
+                else:
+                    poll = min(poll * 2, self.MAX_POLL_SECONDS)
+                self._wake.clear()
+                continue
+            poll = self.POLL_SECONDS
+            for booking, effect, attempts in jobs:
+                self._process(booking, effect, attempts)
+
+    def _process(self, booking: Dict, effect: str, attempts: int) -> Optional[Future]:
+        """
+        Run one job. A handler may return a Future (batched notifications); the
+        job is then finished when it resolves, and a Future that resolves once
+        the outcome is recorded is returned.
+        """
+        booking_id = booking["BookingID"]
+        try:
+            outcome = self.handlers[effect](booking)
+        except Exception as e:
+            print(f"Error running {effect} for booking {booking_id}: {str(e)}")
+            outcome = False
+
+        if isinstance(outcome, Future):
+            recorded = Future()
+
+            def finish(future: Future):
+                try:
+                    self._finish(booking_id, effect, attempts, not future.exception() and future.result())
+                finally:
+                    recorded.set_result(None)
+
+            outcome.add_done_callback(finish)
+            return recorded
+        self._finish(booking_id, effect, attempts, outcome)
+        return None
+
+    def _finish(self, booking_id: str, effect: str, attempts: int, succeeded):
+        """Record a job's outcome: done, retried with backoff, or given up on"""
+        if succeeded:
+            self.queue.outbox_done(booking_id, effect)
+            field = self.RESULT_FIELDS.get(effect)
+            fields = {field: succeeded} if field and isinstance(succeeded, str) else None
+            db_service.set_side_effect_status(booking_id, effect, "DONE", fields)
+        elif attempts + 1 >= self.max_attempts:
+            print(f"Error: giving up on {effect} for booking {booking_id} after {attempts + 1} attempts")
+            self.queue.outbox_done(booking_id, effect)
+            db_service.set_side_effect_status(booking_id, effect, "FAILED")
+        else:
+            self.queue.outbox_retry(booking_id, effect, min(2 ** attempts, 300))
+
+
+# Global instance; outside mock mode jobs are kept in the outbox table
+post_booking_outbox = PostBookingOutbox(
+    mock_store if USE_MOCK_AWS else DynamoOutboxQueue(DYNAMODB_TABLE_OUTBOX),
+    {
+        'receipt': s3_service.save_receipt,
+        'notification': lambda_service.send_booking_notification,
+        'summary': db_service.record_booking_ops
+    },
+    OUTBOX_WORKERS,
+    OUTBOX_MAX_ATTEMPTS
+)
+
+
+class JsonResponseCache:
+    """
+    Encoded JSON API responses, keyed on path, query string and a data
+    version. A hit skips serialization and compression entirely; every
+    response carries a weak content-hash ETag (so If-None-Match answers 304)
+    and Cache-Control with stale-while-revalidate. The version covers this
+    process's own writes; `ttl` bounds staleness from other processes.
+    """
+
+    # Smaller bodies are not worth compressing
+    MIN_COMPRESS_SIZE = 1024
+
+    def __init__(self, ttl: float, max_age: int, stale_while_revalidate: int):
+        self.entries = TTLCache(maxsize=2000 if ttl > 0 else 0, ttl=ttl)
+        self.cache_control = f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+
+    def _entry(self, version, build):
+        key = (request.path, request.query_string, version)
+        entry = self.entries.get(key)
+        if entry is None:
+            payload, status = build()
+            if status != 200:
+                return None, (jsonify(payload), status)
+            body = jsonify(payload).get_data()
+            entry = {'etag': hashlib.sha256(body).hexdigest()[:32], 'identity': body}
+            self.entries.set(key, entry)
+        return entry, None
+
+    @staticmethod
+    def _encoding(body: bytes) -> str:
+        if len(body) < JsonResponseCache.MIN_COMPRESS_SIZE:
+            return 'identity'
+        if brotli is not None and request.accept_encodings['br']:
+            return 'br'
+        if request.accept_encodings['gzip']:
+            return 'gzip'
+        return 'identity'
+
+    def respond(self, version, build):
+        """
+        Answer the current request from the cache
+        Args:
+            version: Data version the payload depends on
+            build: Callable returning (payload, status); only 200s are cached
+        Returns:
+            Flask response (200, 304, or whatever build returned otherwise)
+        """
+        entry, uncached = self._entry(version, build)
+        if uncached is not None:
+            return uncached
+
+        if request.if_none_match.contains_weak(entry['etag']):
+            response = app.response_class(status=304)
+        else:
+            encoding = self._encoding(entry['identity'])
+            if encoding not in entry:
+                if encoding == 'br':
+                    entry['br'] = brotli.compress(entry['identity'])
+                else:
+                    entry['gzip'] = gzip.compress(entry['identity'], compresslevel=6)
+            response = app.response_class(entry[encoding], mimetype='application/json')
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(entry['etag'], weak=True)
+        response.headers['Cache-Control'] = self.cache_control
+        response.vary.add('Accept-Encoding')
+        return response
+
+
+api_response_cache = JsonResponseCache(API_CACHE_TTL, API_CACHE_MAX_AGE, API_STALE_WHILE_REVALIDATE)
+pnr_rate_limiter = RateLimiter(PNR_RATE_LIMIT, PNR_RATE_BURST)
+
+
 # Initialize Flask app
 app = Flask(
     __name__,
@@ -1350,6 +4688,12 @@ logging.basicConfig(
     format='%(asctime)s %(levelname)s %(name)s %(message)s'
 )
 
+@app.before_request
+def start_background_workers():
+    """Make sure this worker process runs the outbox threads (no-op once started)"""
+    post_booking_outbox.start()
+
+
 # Initialize app on startup
 if USE_MOCK_AWS:
     print("\n" + "="*60)
@@ -1372,7 +4716,7 @@ def login_required(f):
             flash('Please login to access this page.', 'error')
             return redirect(url_for('login'))
         # Verify user still exists
-        current_user = get_current_user()
+        current_user = get_session_user()
         if current_user is None:
             flash('Session expired. Please login again.', 'error')
             session.clear()
@@ -1391,7 +4735,7 @@ def admin_required(f):
         if 'user_id' not in session:
             flash('Please login to access this page.', 'error')
             return redirect(url_for('login'))
-        user = user_service.get_user_by_id(session['user_id'])
+        user = get_session_user()
         if not user or not user.get('is_admin'):
             flash('Admin access required.', 'error')
             return redirect(url_for('index'))
@@ -1401,13 +4745,66 @@ def admin_required(f):
 
 def get_current_user():
     """
-    Get current logged-in user
+    Get current logged-in user (the full record).
+    Loaded at most once per request and kept on flask.g, so decorators,
+    views and templates share a single lookup.
     Returns:
         User dictionary or None
     """
-    if 'user_id' in session:
-        return user_service.get_user_by_id(session['user_id'])
-    return None
+    if 'user_id' not in session:
+        return None
+    if g.get('current_user_id') != session['user_id']:
+        g.current_user = user_service.get_user_by_id(session['user_id'])
+        g.current_user_id = session['user_id']
+        if SESSION_USER_SNAPSHOT:
+            snapshot = session.get('user_snapshot')
+            if g.current_user is None:
+                session.pop('user_snapshot', None)
+            elif not user_service.snapshot_is_fresh(snapshot, session['user_id']) \
+                    or snapshot['v'] != g.current_user.get('session_version', 0):
+                session['user_snapshot'] = user_service.session_snapshot(g.current_user)
+    return g.current_user
+
+
+def get_session_user():
+    """
+    Get the logged-in user's user_id, username, full_name and is_admin.
+    With SESSION_USER_SNAPSHOT enabled these come from the snapshot in the
+    signed session cookie, so most page views never touch the users table;
+    otherwise (or once the snapshot is stale) from get_current_user().
+    Returns:
+        User (or snapshot) dictionary or None
+    """
+    if 'user_id' not in session:
+        return None
+    if SESSION_USER_SNAPSHOT:
+        snapshot = session.get('user_snapshot')
+        if user_service.snapshot_is_fresh(snapshot, session['user_id']):
+            return snapshot
+    return get_current_user()
+
+
+@app.context_processor
+def inject_current_user():
+    """Expose current_user to every template (views may still pass it explicitly)"""
+    return {'current_user': get_session_user()}
+
+
+def get_page_args(default_limit: int = None, max_limit: int = 100):
+    """
+    Read `limit`/`cursor` paging parameters from the query string
+    Returns:
+        (limit, cursor); limit is None when the request is not paginated
+    """
+    cursor = request.args.get('cursor', '').strip() or None
+    raw_limit = request.args.get('limit', '').strip()
+    if not raw_limit and not cursor and default_limit is None:
+        return None, None
+    try:
+        limit = int(raw_limit) if raw_limit else (default_limit or max_limit)
+    except ValueError:
+        limit = default_limit or max_limit
+    return min(max(limit, 1), max_limit), cursor
 
 
 # Register all routes
@@ -1416,23 +4813,36 @@ def get_current_user():
 @app.route('/')
 def index():
     """Home page with train search form"""
-    current_user = get_current_user()
+    current_user = get_session_user()
     return render_template('index.html', current_user=current_user)
 
 @app.route('/search', methods=['GET', 'POST'])
 def search():
     """Search for trains by route"""
-    if request.method == 'POST':
-        route_query = request.form.get('route', '').strip()
-    else:
-        # GET request - check for query parameter
-        route_query = request.args.get('route', '').strip()
+    params = request.form if request.method == 'POST' else request.args
+    route_query = params.get('route', '').strip()
+    origin = params.get('from', '').strip()
+    destination = params.get('to', '').strip()
+    journey_date = params.get('date', '').strip()
     
-    # Search trains
-    trains = db_service.search_trains(route_query)
-    current_user = get_current_user()
+    # Search trains: structured origin/destination search when given, else route substring
+    if origin or destination:
+        trains = db_service.search_trains_by_stations(origin, destination)
+        route_query = f"{origin or 'Any'} → {destination or 'Any'}"
+    else:
+        trains = db_service.search_trains(route_query)
+
+    # Show seats left on the requested journey date (today when none is given)
+    trains = db_service.with_journey_availability(trains, journey_date)
+    current_user = get_session_user()
     
-    return render_template('results.html', trains=trains, search_query=route_query, current_user=current_user)
+    return render_template(
+        'results.html',
+        trains=trains,
+        search_query=route_query,
+        journey_date=journey_date,
+        current_user=current_user
+    )
 
 @app.route('/register', methods=['GET', 'POST'])
 def register():
@@ -1459,7 +4869,11 @@ def register():
             return render_template('register.html')
         
         # Register user
-        user = user_service.register_user(username, email, password, full_name, phone)
+        try:
+            user = user_service.register_user(username, email, password, full_name, phone)
+        except PasswordHasherBusy:
+            flash('The server is busy right now. Please try again in a moment.', 'error')
+            return render_template('register.html'), 503
         
         if user:
             flash('Registration successful! Please login.', 'success')
@@ -1481,11 +4895,17 @@ def login():
             flash('Please enter both username and password.', 'error')
             return render_template('login.html')
         
-        user = user_service.authenticate_user(username, password)
+        try:
+            user = user_service.authenticate_user(username, password)
+        except PasswordHasherBusy:
+            flash('The server is busy right now. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
         
         if user:
             session['user_id'] = user['user_id']
             session['username'] = user['username']
+            if SESSION_USER_SNAPSHOT:
+                session['user_snapshot'] = user_service.session_snapshot(user)
             flash(f'Welcome back, {user["full_name"]}!', 'success')
             next_page = request.args.get('next')
             return redirect(next_page or url_for('index'))
@@ -1511,10 +4931,10 @@ def profile():
         flash('User not found. Please login again.', 'error')
         return redirect(url_for('login'))
     
-    # Get user booking stats
-    bookings = db_service.get_bookings_by_user_id(current_user['user_id'])
+    # Get user booking stats: the count is kept on the user record, so only the latest booking is read
+    bookings = db_service.get_bookings_by_user_id(current_user['user_id'], limit=1)
     user_stats = {
-        "total_bookings": len(bookings),
+        "total_bookings": current_user['booking_count'],
         "latest_booking": bookings[0] if bookings else None,
     }
     return render_template('profile.html', user=current_user, current_user=current_user, user_stats=user_stats)
@@ -1523,7 +4943,7 @@ def profile():
 @login_required
 def update_profile():
     """Update user profile"""
-    current_user = get_current_user()
+    current_user = get_session_user()
     full_name = request.form.get('full_name', '').strip()
     email = request.form.get('email', '').strip()
     phone = request.form.get('phone', '').strip()
@@ -1546,12 +4966,24 @@ def update_profile():
 @login_required
 def booking_history():
     """User booking history page"""
-    current_user = get_current_user()
+    current_user = get_session_user()
     if current_user is None:
         flash('User not found. Please login again.', 'error')
         return redirect(url_for('login'))
-    bookings = db_service.get_bookings_by_user_id(current_user['user_id'])
-    return render_template('history.html', bookings=bookings, user=current_user, current_user=current_user)
+    limit, cursor = get_page_args()
+    next_cursor = None
+    if limit:
+        bookings, next_cursor = db_service.get_bookings_page(current_user['user_id'], limit, cursor)
+    else:
+        bookings = db_service.get_bookings_by_user_id(current_user['user_id'])
+    return render_template(
+        'history.html',
+        bookings=bookings,
+        user=current_user,
+        current_user=current_user,
+        page_limit=limit,
+        next_cursor=next_cursor
+    )
 
 @app.route('/dashboard')
 @login_required
@@ -1561,37 +4993,53 @@ def dashboard():
     if current_user is None:
         flash('User not found. Please login again.', 'error')
         return redirect(url_for('login'))
-    bookings = db_service.get_bookings_by_user_id(current_user['user_id'])
+    bookings = db_service.get_bookings_by_user_id(current_user['user_id'], limit=5)
     stats = {
-        "total_bookings": len(bookings),
+        "total_bookings": current_user['booking_count'],
         "latest_booking": bookings[0] if bookings else None,
     }
-    return render_template('dashboard.html', current_user=current_user, stats=stats, bookings=bookings[:5])
+    return render_template('dashboard.html', current_user=current_user, stats=stats, bookings=bookings)
 
 @app.route('/admin')
 @admin_required
 def admin_dashboard():
-    """Admin dashboard (mock)."""
-    current_user = get_current_user()
+    """Admin dashboard: operations summary for today's journeys."""
+    current_user = get_session_user()
     if current_user is None:
         flash('User not found. Please login again.', 'error')
         return redirect(url_for('login'))
-    # Basic operational data for capstone/demo (mock)
-    trains = db_service.search_trains("")
-    # compute sold-out trains (all classes 0)
-    sold_out = []
-    for t in trains:
-        classes = t.get("Classes", {}) or {}
-        total = sum(c.get("Availability", 0) for c in classes.values())
-        if total <= 0:
-            sold_out.append(t)
+    # The summary carries the train count; only sold-out train records are looked up, in one batch
+    summary = db_service.get_ops_summary()
     return render_template(
         'admin.html',
         current_user=current_user,
-        trains=trains,
-        sold_out_trains=sold_out
+        sold_out_trains=db_service.get_trains_by_ids(summary['sold_out_trains']),
+        summary=summary
     )
 
+@app.route('/admin/ops/stream')
+@admin_required
+def admin_ops_stream():
+    """Server-sent events with the operations summary whenever its counters change"""
+    def events():
+        # Reconnect hint for EventSource, then the summary now and on every change
+        yield f"retry: {int(OPS_STREAM_INTERVAL * 1000)}\n\n"
+        deadline = time.monotonic() + OPS_STREAM_SECONDS
+        last = None
+        while True:
+            payload = json.dumps(db_service.get_ops_summary(), sort_keys=True)
+            if payload != last:
+                yield f"data: {payload}\n\n"
+                last = payload
+            if time.monotonic() + OPS_STREAM_INTERVAL > deadline:
+                return
+            time.sleep(OPS_STREAM_INTERVAL)
+
+    response = app.response_class(stream_with_context(events()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/booking/<train_id>', methods=['GET', 'POST'])
 @login_required
 def booking(train_id):
@@ -1629,6 +5077,15 @@ def booking(train_id):
                 flash('Please select journey date.', 'error')
                 return render_template('booking.html', train=train)
             
+            travel_date = parse_journey_date(journey_date)
+            today = date.today()
+            if travel_date is None or not today <= travel_date <= today + timedelta(days=BOOKING_WINDOW_DAYS):
+                flash(f'Journey date must be within the next {BOOKING_WINDOW_DAYS} days.', 'error')
+                return render_template('booking.html', train=train)
+            
+            # Availability is tracked per journey date
+            train = db_service.with_journey_availability([train], journey_date)[0]
+            
             # Check availability for selected class
             if 'Classes' not in train or class_name not in train['Classes']:
                 flash('Invalid class selected.', 'error')
@@ -1656,7 +5113,7 @@ def booking(train_id):
                 })
             
             # Get current user
-            current_user = get_current_user()
+            current_user = get_session_user()
 
             # Store pending booking in session (Payment step will finalize + decrement availability)
             session['pending_booking'] = {
@@ -1682,24 +5139,35 @@ def booking(train_id):
             flash(f'An error occurred: {str(e)}', 'error')
             return render_template('booking.html', train=train)
         
-    # GET request - show booking form
-    current_user = get_current_user()
-    return render_template('booking.html', train=train, current_user=current_user)
+    # GET request - show booking form with availability for the chosen date
+    journey_date = request.args.get('date', '').strip()
+    if not parse_journey_date(journey_date):
+        journey_date = date.today().isoformat()
+    train = db_service.with_journey_availability([train], journey_date)[0]
+    current_user = get_session_user()
+    return render_template(
+        'booking.html',
+        train=train,
+        journey_date=journey_date,
+        max_journey_date=(date.today() + timedelta(days=BOOKING_WINDOW_DAYS)).isoformat(),
+        current_user=current_user
+    )
 
 @app.route('/payment', methods=['GET', 'POST'])
 @login_required
 def payment():
     """
     Payment step (mock).
-    Confirms payment and finalizes booking: availability decrement, booking creation, receipt, notification.
+    Confirms payment and finalizes booking: one commit for seats, booking and user link; receipt and notification follow via the outbox.
     """
-    current_user = get_current_user()
+    current_user = get_session_user()
     pending = session.get('pending_booking')
     if not pending:
         flash('No pending booking found. Please start a new booking.', 'error')
         return redirect(url_for('index'))
 
-    train = db_service.get_train_by_id(pending['train_id'])
+    # Fares are charged from here, so this read can bypass the train cache
+    train = db_service.get_train_by_id(pending['train_id'], consistent=TRAIN_CACHE_STRONG_PAYMENT)
     if not train:
         flash('Train not found.', 'error')
         return redirect(url_for('index'))
@@ -1722,39 +5190,33 @@ def payment():
             flash('Please select a payment method.', 'error')
             return render_template('payment.html', current_user=current_user, pending=pending, train=train, total_fare=total_fare)
 
-        # Decrement availability (final check)
-        success = db_service.update_train_availability(pending['train_id'], class_name, seats)
-        if not success:
-            flash('Payment received but seats are no longer available. Please try again.', 'error')
-            return redirect(url_for('booking', train_id=pending['train_id']))
-
-        # Create booking
-        booking_data = db_service.create_booking(
-            train_id=pending['train_id'],
-            route=pending['route'],
-            time=pending['time'],
+        # Reserve seats, store the booking and link it to the user in one commit,
+        # using the fare already loaded above
+        booking_data = db_service.commit_booking(
+            train=train,
+            class_name=class_name,
             seats=seats,
             passenger_name=pending['primary_passenger_name'],
-            train_name=pending.get('train_name'),
-            class_name=class_name,
             journey_date=pending['journey_date'],
             passengers=pending['passengers'],
             berth_preference=pending.get('berth_preference'),
-            user_id=pending['user_id']
+            user_id=pending['user_id'],
+            payment={
+                "Method": payment_method,
+                "Reference": reference or "MOCK-PAYMENT",
+                "Amount": total_fare,
+                "Currency": "INR",
+                "Status": "PAID"
+            }
         )
-        booking_data["Payment"] = {
-            "Method": payment_method,
-            "Reference": reference or "MOCK-PAYMENT",
-            "Amount": total_fare,
-            "Currency": "INR",
-            "Status": "PAID"
-        }
-
-        user_service.add_booking_to_user(current_user['user_id'], booking_data['BookingID'])
+        if not booking_data:
+            flash('Payment received but seats are no longer available. Please try again.', 'error')
+            return redirect(url_for('booking', train_id=pending['train_id']))
+        # The user record now lists the new booking
+        user_service.invalidate_user(pending['user_id'])
 
-        # Receipt + notification
-        s3_service.save_receipt(booking_data)
-        lambda_service.send_booking_notification(booking_data)
+        # Receipt + notification are produced in the background
+        post_booking_outbox.enqueue(booking_data)
 
         # Clear pending booking
         session.pop('pending_booking', None)
@@ -1767,7 +5229,7 @@ def payment():
 @login_required
 def booking_success(booking_id):
     """Success page after booking confirmation"""
-    current_user = get_current_user()
+    current_user = get_session_user()
     # Get booking details
     booking = db_service.get_booking_by_id(booking_id)
     
@@ -1780,25 +5242,108 @@ def booking_success(booking_id):
         flash('Unauthorized access.', 'error')
         return redirect(url_for('index'))
     
-    # Get receipt URL/path
-    receipt_path = s3_service.get_receipt_url(booking_id)
+    # Get receipt URL/path once the outbox has produced it
+    side_effects = booking.get('SideEffects')
+    receipt_pending = (side_effects or {}).get('receipt') == 'PENDING'
+    # While pending the page reloads itself, backing off, a bounded number of times
+    refresh_count = request.args.get('refresh', 0, type=int)
+    refresh_url = refresh_delay = None
+    if receipt_pending and refresh_count < RECEIPT_REFRESH_LIMIT:
+        refresh_delay = 3 * 2 ** refresh_count
+        refresh_url = url_for('booking_success', booking_id=booking_id, refresh=refresh_count + 1)
+    if side_effects is None:
+        receipt_path = s3_service.get_legacy_receipt_url(booking_id)
+    elif side_effects.get('receipt') == 'DONE':
+        receipt_path = s3_service.get_receipt_url(booking)
+    else:
+        receipt_path = None
     
-    return render_template('success.html', booking=booking, receipt_path=receipt_path, current_user=current_user)
+    return render_template('success.html', booking=booking, receipt_path=receipt_path,
+                           receipt_pending=receipt_pending, refresh_url=refresh_url,
+                           refresh_delay=refresh_delay, current_user=current_user)
 
 @app.route('/api/trains', methods=['GET'])
 def api_trains():
     """API endpoint to get all trains (for AJAX/future use)"""
-    route_query = request.args.get('route', '').strip()
-    trains = db_service.search_trains(route_query)
-    return jsonify(trains)
+    def build():
+        route_query = request.args.get('route', '').strip()
+        origin = request.args.get('from', '').strip()
+        destination = request.args.get('to', '').strip()
+        journey_date = request.args.get('date', '').strip()
+        limit, cursor = get_page_args()
+        next_cursor = None
+        if origin or destination:
+            trains = db_service.search_trains_by_stations(origin, destination)
+            if limit:
+                trains, next_cursor = slice_page(trains, limit, cursor)
+        elif limit:
+            trains, next_cursor = db_service.search_trains_page(route_query, limit, cursor)
+        else:
+            trains = db_service.search_trains(route_query)
+
+        if journey_date:
+            trains = db_service.with_journey_availability(trains, journey_date)
+        if limit:
+            return {'trains': trains, 'next_cursor': next_cursor}, 200
+        return trains, 200
+
+    return api_response_cache.respond(db_service.train_cache.version, build)
+
+@app.route('/api/stations', methods=['GET'])
+def api_stations():
+    """API endpoint for station name typeahead"""
+    query = request.args.get('q', '').strip()
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+    except ValueError:
+        limit = 10
+    return jsonify(db_service.suggest_stations(query, limit))
 
 @app.route('/api/train/<train_id>', methods=['GET'])
 def api_train(train_id):
     """API endpoint to get a specific train"""
-    train = db_service.get_train_by_id(train_id)
-    if train:
-        return jsonify(train)
-    return jsonify({'error': 'Train not found'}), 404
+    def build():
+        train = db_service.get_train_by_id(train_id)
+        if train:
+            journey_date = request.args.get('date', '').strip()
+            if journey_date:
+                train = db_service.with_journey_availability([train], journey_date)[0]
+            return train, 200
+        return {'error': 'Train not found'}, 404
+
+    return api_response_cache.respond(db_service.train_cache.version, build)
+
+def client_address() -> str:
+    """Client IP for rate limiting; with TRUST_PROXY, behind the local nginx proxy it comes from X-Real-IP"""
+    if TRUST_PROXY and request.remote_addr in ('127.0.0.1', '::1'):
+        return request.headers.get('X-Real-IP', request.remote_addr)
+    return request.remote_addr or ''
+
+@app.route('/api/pnr/<pnr>', methods=['GET'])
+def api_pnr_status(pnr):
+    """API endpoint for PNR status enquiry (no login; passenger names are not included)"""
+    retry_after = pnr_rate_limiter.hit(client_address())
+    if retry_after:
+        response = jsonify({'error': 'Too many PNR enquiries, please retry shortly'})
+        response.headers['Retry-After'] = str(int(retry_after) + 1)
+        return response, 429
+    if not re.fullmatch(r'\d{10}', pnr):
+        return jsonify({'error': 'PNR must be 10 digits'}), 400
+    status = db_service.get_pnr_status(pnr)
+    if status is None:
+        return jsonify({'error': 'PNR not found'}), 404
+    return jsonify(status)
+
+@app.route('/admin/cache-stats', methods=['GET'])
+@admin_required
+def admin_cache_stats():
+    """Train and PNR cache hit/miss counters for this worker process"""
+    pnr_statuses = db_service.pnr_statuses
+    return jsonify({
+        'pid': os.getpid(),
+        'train_cache': db_service.train_cache.stats(),
+        'pnr_cache': {'hits': pnr_statuses.hits, 'misses': pnr_statuses.misses, 'size': len(pnr_statuses)}
+    })
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -1806,64 +5351,176 @@ def health_check():
     return jsonify({'status': 'ok'}), 200
 
 
+class ApiGatewayAdapter:
+    """
+    Runs a WSGI app for API Gateway proxy events, both REST API (payload v1)
+    and HTTP API (payload v2). The event is mapped straight onto a WSGI
+    environ; binary response bodies go back base64-encoded, and repeated
+    headers and cookies are kept in both directions.
+    """
+
+    # Response types returned as plain text; everything else is base64-encoded
+    TEXT_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    @staticmethod
+    def _wsgi_path(path: str, raw: bool) -> str:
+        # PATH_INFO carries the URL-decoded bytes as latin-1, as WSGI servers do
+        data = unquote_to_bytes(path) if raw else path.encode('utf-8')
+        return data.decode('latin-1')
+
+    def to_environ(self, event: dict) -> dict:
+        """
+        Build the WSGI environ for an API Gateway event
+        Args:
+            event: API Gateway proxy event (v1 or v2)
+        Returns:
+            WSGI environ dictionary
+        """
+        request_context = event.get('requestContext') or {}
+        if event.get('version') == '2.0':
+            http = request_context.get('http') or {}
+            method = http.get('method', 'GET')
+            path = self._wsgi_path(event.get('rawPath') or '/', raw=True)
+            query_string = event.get('rawQueryString') or ''
+            headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+            if event.get('cookies'):
+                headers['cookie'] = '; '.join(event['cookies'])
+            remote_addr = http.get('sourceIp')
+        else:
+            method = event.get('httpMethod', 'GET')
+            path = self._wsgi_path(event.get('path') or '/', raw=False)
+            multi_query = event.get('multiValueQueryStringParameters')
+            if multi_query:
+                query_string = urlencode([(name, value) for name, values in multi_query.items() for value in values])
+            else:
+                query_string = urlencode(event.get('queryStringParameters') or {})
+            multi_headers = event.get('multiValueHeaders')
+            if multi_headers:
+                headers = {
+                    name.lower(): ('; ' if name.lower() == 'cookie' else ', ').join(values)
+                    for name, values in multi_headers.items() if values
+                }
+            else:
+                headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+            remote_addr = (request_context.get('identity') or {}).get('sourceIp')
+
+        body = event.get('body') or ''
+        if event.get('isBase64Encoded'):
+            body = base64.b64decode(body)
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': path,
+            'QUERY_STRING': query_string,
+            'SERVER_NAME': headers.get('host', 'lambda'),
+            'SERVER_PORT': headers.get('x-forwarded-port', '443'),
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': remote_addr or '127.0.0.1',
+            'CONTENT_TYPE': headers.get('content-type', ''),
+            'CONTENT_LENGTH': str(len(body)),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': headers.get('x-forwarded-proto', 'https'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': False,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ['HTTP_' + key] = value
+        return environ
+
+    def __call__(self, event: dict) -> dict:
+        """
+        Handle one API Gateway event
+        Args:
+            event: API Gateway proxy event (v1 or v2)
+        Returns:
+            API Gateway proxy response in the event's payload format
+        """
+        started = {}
+
+        def start_response(status, response_headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = response_headers
+            return chunks.append
+
+        chunks = []
+        result = self.wsgi_app(self.to_environ(event), start_response)
+        try:
+            chunks.extend(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        body = b''.join(chunks)
+
+        grouped = {}
+        for name, value in started['headers']:
+            grouped.setdefault(name, []).append(value)
+        content_type = next((values[0] for name, values in grouped.items() if name.lower() == 'content-type'), '')
+        encoded = any(name.lower() == 'content-encoding' for name in grouped)
+        is_text = not encoded and content_type.startswith(self.TEXT_TYPES)
+
+        response = {
+            'statusCode': started['status'],
+            'body': body.decode('utf-8') if is_text else base64.b64encode(body).decode('ascii'),
+            'isBase64Encoded': not is_text,
+        }
+        if event.get('version') == '2.0':
+            response['cookies'] = grouped.pop('Set-Cookie', [])
+            response['headers'] = {name: ', '.join(values) for name, values in grouped.items()}
+        else:
+            response['multiValueHeaders'] = grouped
+        return response
+
+
+api_gateway_adapter = ApiGatewayAdapter(app)
+lambda_logger = logging.getLogger('lambda_handler')
+lambda_logger.setLevel(logging.INFO)
+_cold_start = True
+
+
 # Lambda handler function
 def lambda_handler(event, context):
     """AWS Lambda handler for API Gateway"""
-    from werkzeug.test import EnvironBuilder
-    from werkzeug.wrappers import Request, Response
-    import json
-    import logging
-    
-    logger = logging.getLogger()
-    logger.setLevel(logging.INFO)
-    
+    global _cold_start
+    if _cold_start:
+        _cold_start = False
+        init_ms = (_IMPORT_FINISHED - _IMPORT_STARTED) * 1000
+        if init_ms > COLD_START_BUDGET_MS:
+            lambda_logger.warning(f"Cold start took {init_ms:.0f}ms (budget {COLD_START_BUDGET_MS}ms)")
+        else:
+            lambda_logger.info(f"Cold start took {init_ms:.0f}ms")
+
+    started = time.perf_counter()
+    method = event.get('httpMethod') or ((event.get('requestContext') or {}).get('http') or {}).get('method', 'GET')
+    path = event.get('rawPath') or event.get('path') or '/'
     try:
-        # Log the incoming event
-        logger.info(f"Received event: {json.dumps(event)}")
-        
-        # Extract components from API Gateway event
-        http_method = event.get('httpMethod', 'GET')
-        path = event.get('path', '/')
-        query_params = event.get('queryStringParameters', {}) or {}
-        headers = event.get('headers', {}) or {}
-        body = event.get('body', '')
-        
-        # Handle base64 encoded body
-        if event.get('isBase64Encoded', False) and body:
-            import base64
-            body = base64.b64decode(body)
-        
-        # Create environ using EnvironBuilder
-        builder = EnvironBuilder(
-            method=http_method,
-            path=path,
-            query_string=query_params,
-            headers=headers,
-            data=body
-        )
-        environ = builder.get_environ()
-        
-        # Process request through Flask app
-        response = Response.from_app(app, environ)
-        
-        # Prepare response for API Gateway
-        api_gateway_response = {
-            'statusCode': response.status_code,
-            'headers': dict(response.headers),
-            'body': response.get_data(as_text=True)
-        }
-        
-        logger.info(f"Returning response with status {response.status_code}")
-        return api_gateway_response
-        
+        response = api_gateway_adapter(event)
     except Exception as e:
-        logger.error(f"Error in lambda_handler: {str(e)}")
+        lambda_logger.exception(f"Error in lambda_handler: {method} {path}: {str(e)}")
         return {
             'statusCode': 500,
             'headers': {'Content-Type': 'application/json'},
             'body': json.dumps({'error': str(e)})
         }
 
+    # One compact line for a sample of requests; server errors are always logged
+    status = response['statusCode']
+    if status >= 500 or random.random() < LAMBDA_LOG_SAMPLE_RATE:
+        lambda_logger.info(f"{method} {path} {status} {(time.perf_counter() - started) * 1000:.1f}ms")
+    return response
+
+
+_IMPORT_FINISHED = time.perf_counter()
 
 if __name__ == '__main__':
     # Run the Flask development server
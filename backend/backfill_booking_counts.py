@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Backfill script to set BookingCount on existing DynamoDB users.
+Run this once on a deployment that already has users with bookings; new
+bookings keep the counter up to date themselves. Safe to re-run: each user
+is set to the length of their Bookings list, conditional on that list not
+changing in between.
+
+Usage:
+    python backfill_booking_counts.py
+"""
+
+import os
+import sys
+import boto3
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+DYNAMODB_TABLE_USERS = os.getenv('DYNAMODB_TABLE_USERS', 'users')
+
+
+def backfill_booking_counts():
+    """Set BookingCount to the number of bookings linked to each user."""
+    print(f"Backfilling booking counts in {DYNAMODB_TABLE_USERS} in region {AWS_REGION}")
+
+    try:
+        dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
+        users_table = dynamodb.Table(DYNAMODB_TABLE_USERS)
+
+        updated = 0
+        skipped = 0
+        scan_kwargs = {
+            'ProjectionExpression': 'UserID, Bookings, BookingCount'
+        }
+        while True:
+            response = users_table.scan(**scan_kwargs)
+            for user in response.get('Items', []):
+                count = len(user.get('Bookings') or [])
+                if int(user.get('BookingCount', -1)) == count:
+                    continue
+                condition = 'size(Bookings) = :count'
+                if 'Bookings' not in user:
+                    condition = 'attribute_not_exists(Bookings)'
+                try:
+                    users_table.update_item(
+                        Key={'UserID': user['UserID']},
+                        UpdateExpression='SET BookingCount = :count',
+                        ConditionExpression=condition,
+                        ExpressionAttributeValues={':count': count}
+                    )
+                    updated += 1
+                except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+                    # A booking landed meanwhile; the next run picks this user up again
+                    skipped += 1
+                    print(f"  ! Bookings of {user['UserID']} changed during the backfill (re-run to fix)")
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        print(f"\n✓ Updated {updated} users ({skipped} changed during the run) in {DYNAMODB_TABLE_USERS}")
+        return skipped == 0
+
+    except Exception as e:
+        print(f"Error backfilling booking counts: {e}")
+        return False
+
+
+if __name__ == '__main__':
+    success = backfill_booking_counts()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Backfill script to seed the durable booking ID and PNR counters.
+Run this once on a deployment that already has bookings, before the first
+booking through the leased counters: before them every process counted from
+the same starting values, so existing BookingIDs and PNRs would be issued
+again. Each counter is raised above the highest value in use (never
+lowered), and every existing PNR claims its pnr#<PNR> item so a new booking
+can never reuse it. Safe to re-run.
+
+Usage:
+    python backfill_id_counters.py
+"""
+
+import os
+import sys
+import boto3
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+DYNAMODB_TABLE_BOOKINGS = os.getenv('DYNAMODB_TABLE_BOOKINGS', 'bookings')
+DYNAMODB_TABLE_COUNTERS = os.getenv('DYNAMODB_TABLE_COUNTERS', 'counters')
+
+# Same starting values as ID_COUNTER_STARTS in app.py
+ID_COUNTER_STARTS = {'booking_id': 10000, 'pnr': 8000000000}
+
+
+def counter_value(value, prefix=''):
+    """Numeric part of a BookingID ('BK10001') or PNR, or None for other formats."""
+    value = str(value or '')
+    if prefix and value.startswith(prefix):
+        value = value[len(prefix):]
+    return int(value) if value.isdigit() else None
+
+
+def backfill_id_counters():
+    """Raise the booking_id and pnr counters above existing bookings and claim their PNRs."""
+    print(f"Seeding ID counters in {DYNAMODB_TABLE_COUNTERS} from {DYNAMODB_TABLE_BOOKINGS} in region {AWS_REGION}")
+
+    try:
+        dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
+        bookings_table = dynamodb.Table(DYNAMODB_TABLE_BOOKINGS)
+        counters_table = dynamodb.Table(DYNAMODB_TABLE_COUNTERS)
+
+        highest = dict(ID_COUNTER_STARTS)
+        claimed = 0
+        duplicates = 0
+        scan_kwargs = {'ProjectionExpression': 'BookingID, PNR'}
+        while True:
+            response = bookings_table.scan(**scan_kwargs)
+            for booking in response.get('Items', []):
+                booking_number = counter_value(booking.get('BookingID'), 'BK')
+                if booking_number is not None:
+                    highest['booking_id'] = max(highest['booking_id'], booking_number)
+                pnr = counter_value(booking.get('PNR'))
+                if pnr is None:
+                    continue
+                highest['pnr'] = max(highest['pnr'], pnr)
+                try:
+                    counters_table.put_item(
+                        Item={'CounterName': f"pnr#{pnr}", 'BookingID': booking['BookingID']},
+                        ConditionExpression='attribute_not_exists(CounterName) OR BookingID = :booking_id',
+                        ExpressionAttributeValues={':booking_id': booking['BookingID']}
+                    )
+                    claimed += 1
+                except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+                    # Issued twice by the old per-process counters; the first booking keeps the claim
+                    duplicates += 1
+                    print(f"  ! PNR {pnr} is shared by more than one booking ({booking['BookingID']})")
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        for name, value in highest.items():
+            try:
+                counters_table.update_item(
+                    Key={'CounterName': name},
+                    UpdateExpression='SET #value = :value',
+                    ConditionExpression='attribute_not_exists(#value) OR #value < :value',
+                    ExpressionAttributeNames={'#value': 'Value'},
+                    ExpressionAttributeValues={':value': value}
+                )
+                print(f"  ✓ {name} counter starts after {value}")
+            except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+                print(f"  ✓ {name} counter is already past {value}")
+
+        print(f"\n✓ Claimed {claimed} PNRs ({duplicates} duplicates) in {DYNAMODB_TABLE_COUNTERS}")
+        return True
+
+    except Exception as e:
+        print(f"Error seeding ID counters: {e}")
+        return False
+
+
+if __name__ == '__main__':
+    success = backfill_id_counters()
+    sys.exit(0 if success else 1)
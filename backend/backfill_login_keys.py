@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Backfill script to populate the DynamoDB LoginKeys table from existing users.
+Run this once after provisioning the LoginKeys table on a deployment that
+already has registered users (new registrations write their keys themselves).
+
+Usage:
+    python backfill_login_keys.py
+"""
+
+import os
+import sys
+import boto3
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+DYNAMODB_TABLE_USERS = os.getenv('DYNAMODB_TABLE_USERS', 'users')
+DYNAMODB_TABLE_LOGIN_KEYS = os.getenv('DYNAMODB_TABLE_LOGIN_KEYS', 'login-keys')
+
+
+def backfill_login_keys():
+    """Write a login key for every existing username and email."""
+    print(f"Backfilling login keys: {DYNAMODB_TABLE_USERS} -> {DYNAMODB_TABLE_LOGIN_KEYS} in region {AWS_REGION}")
+
+    try:
+        dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
+        users_table = dynamodb.Table(DYNAMODB_TABLE_USERS)
+        keys_table = dynamodb.Table(DYNAMODB_TABLE_LOGIN_KEYS)
+
+        written = 0
+        conflicts = 0
+        scan_kwargs = {'ProjectionExpression': 'UserID, Username, Email'}
+        while True:
+            response = users_table.scan(**scan_kwargs)
+            for user in response.get('Items', []):
+                for value in (user.get('Username'), user.get('Email')):
+                    key = (value or '').strip().lower()
+                    if not key:
+                        continue
+                    try:
+                        keys_table.put_item(
+                            Item={'LoginKey': key, 'UserID': user['UserID']},
+                            ConditionExpression='attribute_not_exists(LoginKey) OR UserID = :user_id',
+                            ExpressionAttributeValues={':user_id': user['UserID']}
+                        )
+                        written += 1
+                    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+                        conflicts += 1
+                        print(f"  ! Login key '{key}' already belongs to another user (skipped {user['UserID']})")
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        print(f"\n✓ Wrote {written} login keys ({conflicts} conflicts) into {DYNAMODB_TABLE_LOGIN_KEYS}")
+        return conflicts == 0
+
+    except Exception as e:
+        print(f"Error backfilling login keys: {e}")
+        return False
+
+
+if __name__ == '__main__':
+    success = backfill_login_keys()
+    sys.exit(0 if success else 1)
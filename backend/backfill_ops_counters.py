@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Backfill script for the admin operations summary kept in the counters table.
+Run this once on a deployment that already has trains, seat inventory or
+bookings from before the summary existed; afterwards seat writes and the
+booking outbox keep it up to date themselves. Safe to re-run:
+
+- ops#catalog is rewritten from the trains table (seat templates per class)
+- journey#<date> gets the remaining seats of every inventory item, unless a
+  newer seat write (higher inventory Version) is already recorded
+- day#<date> and totals count each booking once: bookings from before the
+  outbox are flagged OpsCounted, newer ones carry SideEffects.summary = DONE
+
+Usage:
+    python backfill_ops_counters.py
+"""
+
+import os
+import sys
+import boto3
+from decimal import Decimal
+from boto3.dynamodb.types import TypeSerializer
+from dotenv import load_dotenv
+
+from seed_trains import catalog_document
+
+# Load environment variables
+load_dotenv()
+
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+DYNAMODB_TABLE_TRAINS = os.getenv('DYNAMODB_TABLE_TRAINS', 'trains')
+DYNAMODB_TABLE_INVENTORY = os.getenv('DYNAMODB_TABLE_INVENTORY', 'inventory')
+DYNAMODB_TABLE_BOOKINGS = os.getenv('DYNAMODB_TABLE_BOOKINGS', 'bookings')
+DYNAMODB_TABLE_COUNTERS = os.getenv('DYNAMODB_TABLE_COUNTERS', 'counters')
+
+
+def scan_all(table, **scan_kwargs):
+    """Yield every item of a table scan, following LastEvaluatedKey."""
+    while True:
+        response = table.scan(**scan_kwargs)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def booking_increments(booking):
+    """Counter increments of one booking per document (same as ops_increments in app.py)."""
+    booked_at = booking.get('BookingDate') or ''
+    day, hour = booked_at[:10], booked_at[11:13]
+    seats = Decimal(str(booking.get('Seats') or 0))
+    revenue = Decimal(str(booking.get('TotalFare') or 0))
+    return {
+        f"day#{day}": [(f"Hour#{hour}", Decimal(1)), ("Bookings", Decimal(1)), ("Revenue", revenue)],
+        "totals": [("Bookings", Decimal(1)), ("Seats", seats), ("Revenue", revenue)]
+    }
+
+
+def backfill_catalog(dynamodb):
+    """Rewrite ops#catalog from the trains table."""
+    trains = list(scan_all(dynamodb.Table(DYNAMODB_TABLE_TRAINS), ProjectionExpression='TrainID, Classes'))
+    dynamodb.Table(DYNAMODB_TABLE_COUNTERS).put_item(Item=catalog_document(trains))
+    print(f"  ✓ Wrote seat templates of {len(trains)} trains")
+
+
+def backfill_journeys(dynamodb):
+    """Copy the remaining seats of every inventory item into its journey#<date> document."""
+    counters_table = dynamodb.Table(DYNAMODB_TABLE_COUNTERS)
+    updated = 0
+    current = 0
+    for item in scan_all(
+        dynamodb.Table(DYNAMODB_TABLE_INVENTORY),
+        ProjectionExpression='TrainID, JourneyKey, Availability, Version'
+    ):
+        journey_date, class_name = item['JourneyKey'].split('#', 1)
+        field = f"{item['TrainID']}#{class_name}"
+        try:
+            counters_table.update_item(
+                Key={'CounterName': f"ops#journey#{journey_date}"},
+                UpdateExpression='SET #remaining = :remaining, #version = :version',
+                ConditionExpression='attribute_not_exists(#version) OR #version < :version',
+                ExpressionAttributeNames={'#remaining': f"Remaining#{field}", '#version': f"Version#{field}"},
+                ExpressionAttributeValues={':remaining': item['Availability'], ':version': item.get('Version', 0)}
+            )
+            updated += 1
+        except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            current += 1
+    print(f"  ✓ Updated {updated} journeys ({current} already current)")
+
+
+def backfill_bookings(dynamodb):
+    """Count every booking not yet in day#<date> and totals, flagging it in the same transaction."""
+    client = dynamodb.meta.client
+    serialize = TypeSerializer().serialize
+    counted = 0
+    for booking in scan_all(
+        dynamodb.Table(DYNAMODB_TABLE_BOOKINGS),
+        ProjectionExpression='BookingID, BookingDate, Seats, TotalFare, SideEffects, OpsCounted'
+    ):
+        side_effects = booking.get('SideEffects')
+        if booking.get('OpsCounted') or (side_effects or {}).get('summary') == 'DONE':
+            continue
+        if side_effects is None:
+            # Booked before the outbox: a SideEffects map would hide its legacy receipt
+            flag = {
+                'UpdateExpression': 'SET OpsCounted = :yes',
+                'ConditionExpression': 'attribute_not_exists(SideEffects) AND attribute_not_exists(OpsCounted)',
+                'ExpressionAttributeValues': {':yes': serialize(True)}
+            }
+        else:
+            flag = {
+                'UpdateExpression': 'SET SideEffects.#effect = :done',
+                'ConditionExpression': 'attribute_not_exists(SideEffects.#effect) OR SideEffects.#effect <> :done',
+                'ExpressionAttributeNames': {'#effect': 'summary'},
+                'ExpressionAttributeValues': {':done': serialize('DONE')}
+            }
+        transact_items = [{'Update': dict(
+            flag, TableName=DYNAMODB_TABLE_BOOKINGS, Key={'BookingID': serialize(booking['BookingID'])}
+        )}]
+        for document, fields in booking_increments(booking).items():
+            transact_items.append({'Update': {
+                'TableName': DYNAMODB_TABLE_COUNTERS,
+                'Key': {'CounterName': serialize(f"ops#{document}")},
+                'UpdateExpression': 'ADD ' + ', '.join(f"#f{i} :v{i}" for i in range(len(fields))),
+                'ExpressionAttributeNames': {f"#f{i}": field for i, (field, _) in enumerate(fields)},
+                'ExpressionAttributeValues': {f":v{i}": serialize(amount) for i, (_, amount) in enumerate(fields)}
+            }})
+        try:
+            client.transact_write_items(TransactItems=transact_items)
+            counted += 1
+        except client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get('CancellationReasons', [])
+            if not (reasons and reasons[0].get('Code') == 'ConditionalCheckFailed'):
+                raise
+            # Counted by the outbox meanwhile
+    print(f"  ✓ Counted {counted} bookings")
+
+
+def backfill_ops_counters():
+    """Rebuild the operations summary documents from trains, inventory and bookings."""
+    print(f"Backfilling operations summary in {DYNAMODB_TABLE_COUNTERS} in region {AWS_REGION}")
+
+    try:
+        dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
+        backfill_catalog(dynamodb)
+        backfill_journeys(dynamodb)
+        backfill_bookings(dynamodb)
+        print(f"\n✓ Operations summary backfilled in {DYNAMODB_TABLE_COUNTERS}")
+        return True
+
+    except Exception as e:
+        print(f"Error backfilling operations summary: {e}")
+        return False
+
+
+if __name__ == '__main__':
+    success = backfill_ops_counters()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the receipt renderer: receipts per second for text and PDF
+output, rendered one at a time as the booking outbox does, and the size of
+a receipt in each format.
+
+Usage:
+    python benchmark_receipts.py [--count 20000]
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from receipts import ReceiptRenderer
+
+
+def sample_bookings(count):
+    """Synthetic bookings shaped like the ones commit_booking stores."""
+    bookings = []
+    for i in range(count):
+        seats = i % 6 + 1
+        bookings.append({
+            "BookingID": str(10001 + i),
+            "PNR": str(8000000001 + i),
+            "TrainID": "12951",
+            "TrainName": "Mumbai Rajdhani Express",
+            "Route": "Mumbai Central - New Delhi",
+            "Time": "06:15 AM",
+            "JourneyDate": "2026-12-01",
+            "Class": "AC2",
+            "Seats": seats,
+            "TotalFare": 2800 * seats,
+            "Passengers": [{"Name": f"Passenger {n}", "Age": 30 + n, "Gender": "F"} for n in range(seats)],
+            "BerthAllocations": [{"Coach": "B1", "Berth": n + 1, "Type": "Lower"} for n in range(seats)],
+            "BookingDate": datetime.now().isoformat(),
+            "Status": "Confirmed"
+        })
+    return bookings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=20000)
+    args = parser.parse_args()
+
+    renderer = ReceiptRenderer()
+    bookings = sample_bookings(args.count)
+
+    print(f"  {'format':<6} {'receipts/s':>12} {'avg size':>10}")
+    for fmt in ('txt', 'pdf'):
+        start = time.perf_counter()
+        total = sum(len(renderer.render(booking, fmt)) for booking in bookings)
+        elapsed = time.perf_counter() - start
+        print(f"  {fmt:<6} {args.count / elapsed:>12,.0f} {total / args.count:>9,.0f}B")
+
+
+if __name__ == '__main__':
+    main()
@@ -37,12 +37,98 @@ class Config:
 		self.DYNAMODB_TABLE_TRAINS = os.getenv("DYNAMODB_TABLE_TRAINS", "trains")
 		self.DYNAMODB_TABLE_BOOKINGS = os.getenv("DYNAMODB_TABLE_BOOKINGS", "bookings")
 		self.DYNAMODB_TABLE_USERS = os.getenv("DYNAMODB_TABLE_USERS", "users")
+		self.DYNAMODB_TABLE_INVENTORY = os.getenv("DYNAMODB_TABLE_INVENTORY", "inventory")
+		self.DYNAMODB_TABLE_COUNTERS = os.getenv("DYNAMODB_TABLE_COUNTERS", "counters")
+		self.DYNAMODB_TABLE_LOGIN_KEYS = os.getenv("DYNAMODB_TABLE_LOGIN_KEYS", "login-keys")
+		self.DYNAMODB_TABLE_OUTBOX = os.getenv("DYNAMODB_TABLE_OUTBOX", "booking-outbox")
 		self.S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME", "train-booking-receipts")
 		self.LAMBDA_FUNCTION_NAME = os.getenv("LAMBDA_FUNCTION_NAME", "send-booking-notification")
 
+		# Booking
+		self.BOOKING_WINDOW_DAYS = int(os.getenv("BOOKING_WINDOW_DAYS", "120"))
+		# Booking IDs/PNRs leased per round-trip to the durable counter
+		self.ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "100"))
+
+		# Shared AWS clients: connection pool per process (match gunicorn --threads;
+		# background threads are added on top), timeouts in seconds and attempts
+		# per call under adaptive retries
+		self.AWS_MAX_POOL_CONNECTIONS = int(os.getenv("AWS_MAX_POOL_CONNECTIONS", "10"))
+		self.AWS_CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "2"))
+		self.AWS_READ_TIMEOUT = float(os.getenv("AWS_READ_TIMEOUT", "10"))
+		self.AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "4"))
+
+		# Seconds a user record may be served from the per-process cache (0 disables it)
+		self.USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+		# DynamoDB mode train cache (per process, 0 disables a tier): seconds for static
+		# train attributes and search results, and for per-date seat availability.
+		# The payment step reads the train strongly unless TRAIN_CACHE_STRONG_PAYMENT is off
+		self.TRAIN_CACHE_TTL = float(os.getenv("TRAIN_CACHE_TTL", "3600"))
+		self.TRAIN_AVAILABILITY_TTL = float(os.getenv("TRAIN_AVAILABILITY_TTL", "5"))
+		self.TRAIN_CACHE_STRONG_PAYMENT = _parse_bool(os.getenv("TRAIN_CACHE_STRONG_PAYMENT"), default=True)
+		# Encoded /api/trains and /api/train responses: seconds a worker reuses one
+		# (0 disables), and the Cache-Control max-age / stale-while-revalidate sent to clients
+		self.API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "5"))
+		self.API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "5"))
+		self.API_STALE_WHILE_REVALIDATE = int(os.getenv("API_STALE_WHILE_REVALIDATE", "30"))
+		# PNR status enquiries: seconds a hot PNR stays cached per worker (0 disables), and
+		# requests per second per client with bursts of PNR_RATE_BURST (0 disables the limit)
+		self.PNR_CACHE_TTL = float(os.getenv("PNR_CACHE_TTL", "30"))
+		self.PNR_RATE_LIMIT = float(os.getenv("PNR_RATE_LIMIT", "0.5"))
+		self.PNR_RATE_BURST = int(os.getenv("PNR_RATE_BURST", "10"))
+		# Seconds an unknown PNR stays cached, kept short so a booking made through
+		# another worker is found quickly (0 does not cache unknown PNRs)
+		self.PNR_MISS_CACHE_TTL = float(os.getenv("PNR_MISS_CACHE_TTL", "2"))
+		# Behind the bundled nginx proxy: take the client IP (for rate limiting) from
+		# its X-Real-IP header. Leave off when clients can reach the app directly
+		self.TRUST_PROXY = _parse_bool(os.getenv("TRUST_PROXY"), default=False)
+		# Admin live operations stream: seconds between summary checks, and how long one
+		# stream stays open before the browser reconnects (0 sends one update per connection)
+		self.OPS_STREAM_INTERVAL = float(os.getenv("OPS_STREAM_INTERVAL", "2"))
+		self.OPS_STREAM_SECONDS = float(os.getenv("OPS_STREAM_SECONDS", "55"))
+		# Keep a signed user snapshot in the session so page views skip the users table;
+		# profile changes bump a per-user version, and snapshots older than the max age are reloaded
+		self.SESSION_USER_SNAPSHOT = _parse_bool(os.getenv("SESSION_USER_SNAPSHOT"), default=False)
+		self.SESSION_SNAPSHOT_MAX_AGE = int(os.getenv("SESSION_SNAPSHOT_MAX_AGE", "300"))
+
+		# Password hashing: werkzeug KDF method (e.g. "scrypt:32768:8:1", "pbkdf2:sha256:600000");
+		# existing hashes are upgraded on the next successful login when it changes
+		self.PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+		# Processes per app worker doing the hashing (0 hashes inline) and how many
+		# further requests may wait for them before logins are turned away
+		self.PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+		self.PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+
+		# Post-booking outbox: background threads per worker producing receipts and
+		# notifications (0 runs them inline), and attempts before a job is given up
+		self.OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+		self.OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+		# Booking notifications are sent in batches of up to NOTIFY_BATCH_SIZE (1 sends each
+		# one inline) or whatever arrived within NOTIFY_BATCH_WAIT seconds; at most
+		# NOTIFY_MAX_PENDING wait in memory before the outbox is told to retry later
+		self.NOTIFY_BATCH_SIZE = int(os.getenv("NOTIFY_BATCH_SIZE", "25"))
+		self.NOTIFY_BATCH_WAIT = float(os.getenv("NOTIFY_BATCH_WAIT", "0.5"))
+		self.NOTIFY_MAX_PENDING = int(os.getenv("NOTIFY_MAX_PENDING", "1000"))
+
+		# Receipt documents written by the outbox: "txt" or "pdf"
+		self.RECEIPT_FORMAT = os.getenv("RECEIPT_FORMAT", "txt").strip().lower()
+
+		# Lambda entry point: fraction of requests logged (errors always are) and the
+		# cold-start time in milliseconds above which initialisation logs a warning
+		self.LAMBDA_LOG_SAMPLE_RATE = float(os.getenv("LAMBDA_LOG_SAMPLE_RATE", "0.01"))
+		self.COLD_START_BUDGET_MS = int(os.getenv("COLD_START_BUDGET_MS", "1000"))
+
 		# Optional admin bootstrap
 		self.BOOTSTRAP_ADMIN_EMAIL = os.getenv("BOOTSTRAP_ADMIN_EMAIL", "").strip().lower()
 
 		# Local Mock Configuration
 		self.MOCK_UPLOADS_DIR = os.getenv("MOCK_UPLOADS_DIR", "frontend/static/uploads")
 		self.MOCK_DB_FILE = os.getenv("MOCK_DB_FILE", "mock_database.json")
+		# "memory" keeps mock state per process; "sqlite" shares it across gunicorn workers;
+		# "journal" keeps it in one process but persists it to MOCK_DB_FILE (snapshot) plus a log
+		self.MOCK_STATE_BACKEND = os.getenv("MOCK_STATE_BACKEND", "memory").strip().lower()
+		self.MOCK_STATE_DB = os.getenv("MOCK_STATE_DB", "mock_state.sqlite3")
+		# Journal: log records after which a compacted snapshot is written (bounds startup
+		# replay), and seconds between log fsyncs (0 = fsync before each mutation returns)
+		self.MOCK_JOURNAL_COMPACT_RECORDS = int(os.getenv("MOCK_JOURNAL_COMPACT_RECORDS", "100000"))
+		self.MOCK_JOURNAL_FSYNC_INTERVAL = float(os.getenv("MOCK_JOURNAL_FSYNC_INTERVAL", "0"))
@@ -0,0 +1,118 @@
+"""
+Booking receipt rendering (plain text and PDF). Kept apart from app.py so
+that benchmark_receipts.py can time it without starting the app.
+"""
+
+from typing import Dict
+
+
+class ReceiptRenderer:
+    """
+    Renders booking receipts. The layout lives in f-strings, which Python
+    compiles once with the module, with the fixed banners as constants and
+    list sections built with a single join. Outputs plain text (as stored
+    in S3 today) or a single-font PDF built directly, without a PDF library.
+    """
+
+    HEADER = (
+        "╔═══════════════════════════════════════════════════════════╗\n"
+        "║         INDIAN RAILWAYS BOOKING RECEIPT                   ║\n"
+        "╚═══════════════════════════════════════════════════════════╝\n"
+    )
+    FOOTER = (
+        "╔═══════════════════════════════════════════════════════════╗\n"
+        "║  Thank you for choosing Indian Railways!                  ║\n"
+        "║  Please arrive at least 30 minutes before departure.     ║\n"
+        "║  Keep your PNR number safe for future reference.        ║\n"
+        "╚═══════════════════════════════════════════════════════════╝"
+    )
+
+    # The PDF uses the standard Courier font (Latin-1 only)
+    PDF_REPLACEMENTS = (('═', '='), ('║', '|'), ('╔', '+'), ('╗', '+'), ('╚', '+'), ('╝', '+'), ('₹', 'Rs.'))
+    PDF_LINES_PER_PAGE = 60
+
+    CONTENT_TYPES = {'txt': 'text/plain', 'pdf': 'application/pdf'}
+
+    def render_text(self, booking: Dict) -> str:
+        """Render the plain-text receipt of a booking"""
+        get = booking.get
+        pnr, train_name, journey_date = get('PNR'), get('TrainName'), get('JourneyDate')
+        class_name, total_fare = get('Class'), get('TotalFare')
+        passengers, berths = get('Passengers'), get('BerthAllocations')
+
+        passengers_section = "\nPassenger Details:\n" + "".join([
+            f"  {i}. {p.get('Name', 'N/A')} (Age: {p.get('Age', 'N/A')}, Gender: {p.get('Gender', 'N/A')})\n"
+            for i, p in enumerate(passengers, 1)
+        ]) if passengers else ""
+        berth_section = "\nSeat/Berth Allocations:\n" + "".join([
+            f"  {i}. Coach: {b.get('Coach', 'N/A')}, Berth: {b.get('Berth', 'N/A')}, Type: {b.get('Type', 'N/A')}\n"
+            for i, b in enumerate(berths, 1)
+        ]) if berths else ""
+
+        return (
+            f"{self.HEADER}\n"
+            f"{f'PNR Number:        {pnr}{chr(10)}' if pnr else ''}"
+            f"Booking ID:        {get('BookingID', 'N/A')}\n"
+            f"Train Number:      {get('TrainID', 'N/A')}\n"
+            f"{f'Train Name:        {train_name}{chr(10)}' if train_name else ''}"
+            f"Route:             {get('Route', 'N/A')}\n"
+            f"{f'Journey Date:      {journey_date}{chr(10)}' if journey_date else ''}"
+            f"Departure Time:    {get('Time', 'N/A')}\n"
+            f"{f'Class:             {class_name}{chr(10)}' if class_name else ''}"
+            f"Number of Seats:   {get('Seats', 'N/A')}\n"
+            f"{f'Total Fare:        ₹{total_fare}{chr(10)}' if total_fare else ''}"
+            f"{passengers_section}{berth_section}\n"
+            f"Booking Date:      {get('BookingDate', 'N/A')}\n"
+            f"Status:            {get('Status', 'N/A')}\n"
+            f"\n{self.FOOTER}"
+        )
+
+    def render_pdf(self, booking: Dict) -> bytes:
+        """Render the receipt of a booking as a PDF document"""
+        return self._text_to_pdf(self.render_text(booking))
+
+    def render(self, booking: Dict, fmt: str = 'txt') -> bytes:
+        """Render a receipt in `fmt` ('txt' or 'pdf') as bytes ready to store"""
+        if fmt == 'pdf':
+            return self.render_pdf(booking)
+        return self.render_text(booking).encode('utf-8')
+
+    def _text_to_pdf(self, text: str) -> bytes:
+        # Chained replace: much faster than str.translate for a few characters
+        for char, replacement in self.PDF_REPLACEMENTS:
+            text = text.replace(char, replacement)
+        lines = text.split('\n')
+        pages = [lines[i:i + self.PDF_LINES_PER_PAGE] for i in range(0, len(lines), self.PDF_LINES_PER_PAGE)] or [[]]
+
+        # Objects: 1 catalog, 2 page tree, 3 font, then a (page, content) pair per page
+        objects = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>"]
+        page_refs = []
+        for page_lines in pages:
+            escaped = (
+                line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+                for line in page_lines
+            )
+            stream = "BT /F1 10 Tf 12 TL 40 800 Td " + " ".join(f"({line}) '" for line in escaped) + " ET"
+            stream = stream.encode('latin-1', 'replace')
+            page_refs.append(len(objects) + 1)
+            objects.append(
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects) + 2} 0 R >>".encode()
+            )
+            objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+        objects[1] = (
+            "<< /Type /Pages /Kids [" + " ".join(f"{ref} 0 R" for ref in page_refs) + f"] /Count {len(pages)} >>"
+        ).encode()
+
+        out = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(len(out))
+            out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        xref = len(out)
+        out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+        return bytes(out)
+
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Seed script to populate DynamoDB Trains table with initial data.
-Run this once after provisioning the Trains table.
+Run this once after provisioning the Trains table. It also writes the
+seat templates the admin operations summary reads (ops#catalog).
 
 Usage:
     python seed_trains.py
@@ -17,6 +18,7 @@ load_dotenv()
 
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 DYNAMODB_TABLE_TRAINS = os.getenv('DYNAMODB_TABLE_TRAINS', 'trains')
+DYNAMODB_TABLE_COUNTERS = os.getenv('DYNAMODB_TABLE_COUNTERS', 'counters')
 
 # Train data (same as mock_trains in app.py)
 TRAIN_DATA = [
@@ -413,6 +415,26 @@ TRAIN_DATA = [
 ]
 
 
+def with_station_keys(train):
+    """Add the Origin/Destination attributes used by the station search GSIs."""
+    origin, _, destination = train["Route"].partition(" - ")
+    item = dict(train)
+    item["Origin"] = origin.strip()
+    item["Destination"] = destination.strip()
+    item["OriginLower"] = item["Origin"].lower()
+    item["DestinationLower"] = item["Destination"].lower()
+    return item
+
+
+def catalog_document(trains):
+    """The ops#catalog counters item: seats per journey date of every train class."""
+    item = {'CounterName': 'ops#catalog'}
+    for train in trains:
+        for class_name, class_info in (train.get("Classes") or {}).items():
+            item[f"Capacity#{train['TrainID']}#{class_name}"] = int(class_info["Availability"])
+    return item
+
+
 def seed_trains():
     """Seed the DynamoDB Trains table with initial data."""
     print(f"Seeding trains table: {DYNAMODB_TABLE_TRAINS} in region {AWS_REGION}")
@@ -432,9 +454,12 @@ def seed_trains():
         # Batch write items
         with table.batch_writer() as batch:
             for train in TRAIN_DATA:
-                batch.put_item(Item=train)
+                batch.put_item(Item=with_station_keys(train))
                 print(f"  ✓ Inserted train {train['TrainID']} - {train['TrainName']}")
         
+        dynamodb.Table(DYNAMODB_TABLE_COUNTERS).put_item(Item=catalog_document(TRAIN_DATA))
+        print(f"  ✓ Wrote seat templates to {DYNAMODB_TABLE_COUNTERS}")
+
         print(f"\n✓ Successfully seeded {len(TRAIN_DATA)} trains into {DYNAMODB_TABLE_TRAINS}")
         return True
     
@@ -0,0 +1,52 @@
+"""
+Shared setup for the backend tests. The app reads its configuration at
+import time, so mock mode is configured here before anything imports it.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+MOCK_ENV = {
+    'USE_MOCK_AWS': 'true',
+    'SECRET_KEY': 'test-secret',
+    'MOCK_STATE_BACKEND': 'memory',
+    'MOCK_UPLOADS_DIR': tempfile.mkdtemp(prefix='uploads-'),
+    'PASSWORD_HASH_WORKERS': '0',
+    'OUTBOX_WORKERS': '0',
+}
+os.environ.update(MOCK_ENV)
+
+
+def start_app(*blocks: str, **env) -> subprocess.Popen:
+    """Start the code blocks in a fresh interpreter that has imported the app as `app` (see run_app)"""
+    script = "import json, os, sys\nimport app\n" \
+             "def emit(value):\n    print('RESULT ' + json.dumps(value, default=str), flush=True)\n" \
+             + ''.join(textwrap.dedent(block) + '\n' for block in blocks)
+    return subprocess.Popen(
+        [sys.executable, '-c', script], cwd=BACKEND_DIR, env={**os.environ, **MOCK_ENV, **env},
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True
+    )
+
+
+def app_result(process: subprocess.Popen):
+    """Wait for a process from start_app and return the last value it passed to emit()"""
+    stdout, stderr = process.communicate(timeout=120)
+    results = [line[len('RESULT '):] for line in stdout.splitlines() if line.startswith('RESULT ')]
+    assert results, f"no result (exit {process.returncode}):\n{stdout}\n{stderr}"
+    return json.loads(results[-1])
+
+
+def run_app(*blocks: str, **env):
+    """
+    Run the code blocks in a fresh interpreter that has imported the app as `app`,
+    and return the JSON object it passes to emit(). Used where the app's
+    module-level state matters, e.g. to restart the journal store.
+    """
+    return app_result(start_app(*blocks, **env))
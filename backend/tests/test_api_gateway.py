@@ -0,0 +1,155 @@
+"""ApiGatewayAdapter: REST API (v1) and HTTP API (v2) events to WSGI and back."""
+
+import base64
+import gzip
+import json
+
+import app
+
+
+def echo(environ, start_response):
+    """WSGI app answering with what it received; /binary answers with raw bytes"""
+    body = environ['wsgi.input'].read(int(environ['CONTENT_LENGTH'] or 0))
+    if environ['PATH_INFO'] == '/binary':
+        start_response('200 OK', [('Content-Type', 'image/png')])
+        return [b'\x89PNG\x00\xff', b'\x01']
+    seen = {
+        'method': environ['REQUEST_METHOD'],
+        'path': environ['PATH_INFO'],
+        'query': environ['QUERY_STRING'],
+        'remote_addr': environ['REMOTE_ADDR'],
+        'content_type': environ['CONTENT_TYPE'],
+        'body': body.decode('latin-1'),
+        'headers': {key: value for key, value in environ.items() if key.startswith('HTTP_')},
+    }
+    start_response('201 Created', [
+        ('Content-Type', 'application/json'),
+        ('Set-Cookie', 'a=1; Path=/'),
+        ('Set-Cookie', 'b=2; Path=/'),
+        ('X-Seen', 'one'),
+        ('X-Seen', 'two'),
+    ])
+    return [json.dumps(seen).encode('utf-8')]
+
+
+adapter = app.ApiGatewayAdapter(echo)
+
+
+def v1_event(**fields):
+    event = {
+        'httpMethod': 'GET',
+        'path': '/',
+        'headers': {'Host': 'example.com'},
+        'requestContext': {'identity': {'sourceIp': '203.0.113.7'}},
+        'body': None,
+        'isBase64Encoded': False,
+    }
+    event.update(fields)
+    return event
+
+
+def v2_event(**fields):
+    event = {
+        'version': '2.0',
+        'rawPath': '/',
+        'rawQueryString': '',
+        'headers': {'host': 'example.com'},
+        'requestContext': {'http': {'method': 'GET', 'sourceIp': '198.51.100.9'}},
+        'isBase64Encoded': False,
+    }
+    event.update(fields)
+    return event
+
+
+def test_v1_event_maps_onto_the_environ():
+    response = adapter(v1_event(
+        httpMethod='POST',
+        path='/search/New Delhi',
+        headers={'Host': 'example.com', 'Content-Type': 'application/x-www-form-urlencoded', 'X-Trace': 't1'},
+        queryStringParameters={'from': 'Mumbai Central', 'to': 'Delhi'},
+        body='seats=2&name=%C3%89va',
+    ))
+    assert response['statusCode'] == 201
+    assert response['isBase64Encoded'] is False
+    seen = json.loads(response['body'])
+    assert seen['method'] == 'POST'
+    assert seen['path'] == '/search/New Delhi'
+    assert seen['query'] == 'from=Mumbai+Central&to=Delhi'
+    assert seen['remote_addr'] == '203.0.113.7'
+    assert seen['content_type'] == 'application/x-www-form-urlencoded'
+    assert seen['body'] == 'seats=2&name=%C3%89va'
+    assert seen['headers']['HTTP_X_TRACE'] == 't1'
+    assert 'HTTP_CONTENT_TYPE' not in seen['headers']
+
+
+def test_v1_multi_value_query_and_headers_are_kept():
+    response = adapter(v1_event(
+        multiValueQueryStringParameters={'class': ['AC1', 'AC2'], 'date': ['2026-12-01']},
+        multiValueHeaders={
+            'Host': ['example.com'],
+            'Accept': ['text/html', 'application/json'],
+            'Cookie': ['session=abc', 'theme=dark'],
+        },
+    ))
+    seen = json.loads(response['body'])
+    assert seen['query'] == 'class=AC1&class=AC2&date=2026-12-01'
+    assert seen['headers']['HTTP_ACCEPT'] == 'text/html, application/json'
+    assert seen['headers']['HTTP_COOKIE'] == 'session=abc; theme=dark'
+    # Repeated response headers come back as lists
+    assert response['multiValueHeaders']['Set-Cookie'] == ['a=1; Path=/', 'b=2; Path=/']
+    assert response['multiValueHeaders']['X-Seen'] == ['one', 'two']
+
+
+def test_v2_event_maps_onto_the_environ():
+    response = adapter(v2_event(
+        rawPath='/api/train/%2F12951',
+        rawQueryString='date=2026-12-01&x=a%20b',
+        cookies=['session=abc', 'theme=dark'],
+        requestContext={'http': {'method': 'PUT', 'sourceIp': '198.51.100.9'}},
+    ))
+    seen = json.loads(response['body'])
+    assert seen['method'] == 'PUT'
+    # rawPath is percent-decoded into PATH_INFO, as a WSGI server would
+    assert seen['path'] == '/api/train//12951'
+    assert seen['query'] == 'date=2026-12-01&x=a%20b'
+    assert seen['remote_addr'] == '198.51.100.9'
+    assert seen['headers']['HTTP_COOKIE'] == 'session=abc; theme=dark'
+    # v2 responses carry cookies separately and join other repeated headers
+    assert response['cookies'] == ['a=1; Path=/', 'b=2; Path=/']
+    assert response['headers']['X-Seen'] == 'one, two'
+    assert 'Set-Cookie' not in response['headers']
+
+
+def test_v2_path_with_non_ascii_characters():
+    seen = json.loads(adapter(v2_event(rawPath='/station/%C3%89vora'))['body'])
+    assert seen['path'].encode('latin-1').decode('utf-8') == '/station/Évora'
+
+
+def test_base64_request_bodies_are_decoded():
+    payload = bytes(range(256))
+    for event in (v1_event, v2_event):
+        response = adapter(event(body=base64.b64encode(payload).decode('ascii'), isBase64Encoded=True))
+        assert json.loads(response['body'])['body'].encode('latin-1') == payload
+
+
+def test_binary_responses_are_base64_encoded():
+    for event in (v1_event(path='/binary'), v2_event(rawPath='/binary')):
+        response = adapter(event)
+        assert response['isBase64Encoded'] is True
+        assert base64.b64decode(response['body']) == b'\x89PNG\x00\xff\x01'
+
+
+def test_flask_app_through_the_lambda_handler():
+    response = app.lambda_handler(v2_event(rawPath='/health'), None)
+    assert response['statusCode'] == 200
+    assert json.loads(response['body']) == {'status': 'ok'}
+
+    # A compressed JSON response is binary to API Gateway
+    response = app.lambda_handler(v1_event(
+        path='/api/trains', headers={'Host': 'example.com', 'Accept-Encoding': 'gzip'}
+    ), None)
+    assert response['statusCode'] == 200
+    assert response['isBase64Encoded'] is True
+    assert response['multiValueHeaders']['Content-Encoding'] == ['gzip']
+    trains = json.loads(gzip.decompress(base64.b64decode(response['body'])))
+    assert trains
@@ -0,0 +1,167 @@
+"""
+JournaledStateStore: replay, compaction, crashes and the one-process lock.
+Every test restarts the store in a fresh interpreter (run_app), since the
+store loads into the app's module-level state.
+"""
+
+import glob
+import os
+
+import pytest
+
+from conftest import run_app
+
+POPULATE = """
+    from datetime import date, timedelta
+    DAY = (date.today() + timedelta(days=1)).isoformat()
+    user = app.user_service.register_user('alice', 'alice@example.com', 'pw', 'Alice')
+    train = app.db_service.get_train_by_id('12951')
+    booking = app.db_service.commit_booking(train, 'AC2', 2, 'Alice', journey_date=DAY, user_id=user['user_id'])
+    app.mock_store.outbox_add(booking, ['receipt', 'notification'])
+    app.mock_store.outbox_retry(booking['BookingID'], 'receipt', 600)
+    app.mock_store.outbox_retry(booking['BookingID'], 'receipt', 600)
+"""
+
+STATE = """
+    from datetime import date, timedelta
+    import time
+    DAY = (date.today() + timedelta(days=1)).isoformat()
+    emit({
+        'users': sorted(user['username'] for user in app.mock_users),
+        'bookings': sorted(booking['BookingID'] for booking in app.mock_bookings),
+        'seats': app.db_service.get_journey_availability('12951', DAY)['AC2'],
+        'outbox': {
+            f"{booking_id}#{effect}": [job[1], job[0] > time.time() + 60]
+            for (booking_id, effect), job in app.mock_store._outbox.items()
+        },
+        'booking_id_counter': app.booking_id_counter,
+    })
+"""
+
+
+@pytest.fixture
+def journal(tmp_path):
+    """Environment of a journal store in a fresh directory (compaction only when asked)"""
+    return {
+        'MOCK_STATE_BACKEND': 'journal',
+        'MOCK_DB_FILE': str(tmp_path / 'state.json'),
+        'MOCK_JOURNAL_COMPACT_RECORDS': '1000000',
+        'MOCK_JOURNAL_FSYNC_INTERVAL': '0',
+    }
+
+
+def expected_state(journal):
+    state = run_app(POPULATE, STATE, **journal)
+    assert state['users'] == ['alice']
+    assert state['seats'] == 28 - 2
+    assert state['outbox'] == {
+        f"{state['bookings'][0]}#receipt": [2, True],
+        f"{state['bookings'][0]}#notification": [0, False],
+    }
+    return state
+
+
+def test_restart_replays_the_log(journal):
+    before = expected_state(journal)
+    assert not os.path.exists(journal['MOCK_DB_FILE'])
+    assert run_app(STATE, **journal) == before
+
+
+def test_restart_keeps_issuing_new_ids(journal):
+    first = run_app(POPULATE, "emit(booking['BookingID'])", **journal)
+    second = run_app("""
+    train = app.db_service.get_train_by_id('12951')
+    emit(app.db_service.commit_booking(train, 'AC2', 1, 'Bob')['BookingID'])
+""", **journal)
+    assert int(second) > int(first)
+
+
+def test_compaction_writes_a_snapshot_and_drops_old_logs(journal):
+    before = run_app(POPULATE, "app.mock_store.compact()", STATE, **journal)
+    path = journal['MOCK_DB_FILE']
+    assert os.path.exists(path)
+    assert glob.glob(f"{path}.*.log") == [f"{path}.1.log"]
+    assert os.path.getsize(f"{path}.1.log") == 0
+    assert run_app(STATE, **journal) == before
+
+
+def test_compaction_is_triggered_by_the_record_count(journal):
+    journal['MOCK_JOURNAL_COMPACT_RECORDS'] = '3'
+    before = run_app(POPULATE, """
+    import time
+    for _ in range(100):
+        if os.path.exists(app.mock_store.path) and not app.mock_store._compacting:
+            break
+        time.sleep(0.05)
+""", STATE, **journal)
+    assert os.path.exists(journal['MOCK_DB_FILE'])
+    assert run_app(STATE, **journal) == before
+
+
+def test_crash_before_the_snapshot_is_renamed(journal):
+    # The new log generation exists but the snapshot was never installed:
+    # the load must replay both generations from the start
+    before = run_app(POPULATE, STATE, """
+    def crash(*args):
+        raise OSError('crash')
+    os.replace = crash
+    app.mock_store.compact()
+    os._exit(0)
+""", **journal)
+    path = journal['MOCK_DB_FILE']
+    assert not os.path.exists(path)
+    assert sorted(glob.glob(f"{path}.*.log")) == [f"{path}.0.log", f"{path}.1.log"]
+    assert run_app(STATE, **journal) == before
+
+
+def test_crash_before_old_logs_are_deleted(journal):
+    # The snapshot already covers generation 0; replaying it again would
+    # double every booking, so the load must skip and delete it
+    before = run_app(POPULATE, STATE, """
+    def crash(*args):
+        raise OSError('crash')
+    os.remove = crash
+    app.mock_store.compact()
+    os._exit(0)
+""", **journal)
+    path = journal['MOCK_DB_FILE']
+    assert os.path.exists(f"{path}.0.log")
+    assert run_app(STATE, **journal) == before
+    assert not os.path.exists(f"{path}.0.log")
+
+
+def test_torn_record_at_the_end_is_discarded(journal):
+    before = expected_state(journal)
+    log_path = f"{journal['MOCK_DB_FILE']}.0.log"
+    with open(log_path, 'a', encoding='utf-8') as log:
+        log.write('["booking",{"BookingID":"torn"')
+    assert run_app(STATE, **journal) == before
+    with open(log_path, 'rb') as log:
+        assert log.read().endswith(b'\n')
+
+
+def test_a_second_process_is_refused(journal):
+    result = run_app("""
+    try:
+        app.JournaledStateStore(app.mock_store.path, 1000, 0)
+        emit('opened')
+    except RuntimeError as e:
+        emit(str(e))
+""", **journal)
+    assert 'in use by another process' in result
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_a_forked_child_cannot_write(journal):
+    result = run_app("""
+    pid = os.fork()
+    if pid == 0:
+        try:
+            app.mock_store.outbox_done('x', 'receipt')
+            os._exit(0)
+        except RuntimeError:
+            os._exit(3)
+    _, status = os.waitpid(pid, 0)
+    emit(os.waitstatus_to_exitcode(status))
+""", **journal)
+    assert result == 3
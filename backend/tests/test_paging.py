@@ -0,0 +1,77 @@
+"""Cursor paging: DynamoDB pages under a FilterExpression, and the mock pages."""
+
+import app
+
+
+class FilteredScan:
+    """
+    Stands in for table.scan with a FilterExpression: each call evaluates
+    `Limit` items from the key-ordered table and returns the ones that pass.
+    """
+
+    def __init__(self, items, keep):
+        self.items = items
+        self.keep = keep
+        self.calls = []
+
+    def __call__(self, Limit, ExclusiveStartKey=None, **kwargs):
+        self.calls.append(Limit)
+        start = 0
+        if ExclusiveStartKey:
+            start = next(i for i, item in enumerate(self.items) if item['ID'] == ExclusiveStartKey['ID']) + 1
+        evaluated = self.items[start:start + Limit]
+        response = {'Items': [item for item in evaluated if self.keep(item)]}
+        if start + Limit < len(self.items):
+            response['LastEvaluatedKey'] = {'ID': evaluated[-1]['ID']}
+        return response
+
+
+def read_all(scan, limit):
+    pages, cursor = [], None
+    while True:
+        items, cursor = app.read_dynamodb_page(scan, limit, cursor, ('ID',))
+        pages.append([item['ID'] for item in items])
+        if cursor is None:
+            return pages
+
+
+def test_sparse_filter_reads_a_fixed_limit_per_call():
+    items = [{'ID': f"{n:05d}"} for n in range(2000)]
+    scan = FilteredScan(items, lambda item: int(item['ID']) % 100 == 0)
+    pages = read_all(scan, 5)
+    assert [len(page) for page in pages] == [5, 5, 5, 5]
+    assert sum(pages, []) == [f"{n:05d}" for n in range(0, 2000, 100)]
+    assert set(scan.calls) == {app.PAGE_SCAN_LIMIT}
+    # One read per PAGE_SCAN_LIMIT items, plus at most one re-read per page boundary
+    assert len(scan.calls) <= 2000 // app.PAGE_SCAN_LIMIT + len(pages)
+
+
+def test_items_past_the_page_are_not_skipped():
+    items = [{'ID': f"{n:05d}"} for n in range(1000)]
+    scan = FilteredScan(items, lambda item: True)
+    pages = read_all(scan, 30)
+    assert all(len(page) == 30 for page in pages[:-1])
+    assert sum(pages, []) == [item['ID'] for item in items]
+
+
+def test_mock_train_pages_cover_the_search_once():
+    for query in (None, 'delhi'):
+        expected = app.db_service.search_trains(query)
+        seen, cursor = [], None
+        while True:
+            trains, cursor = app.db_service.search_trains_page(query, 4, cursor)
+            seen.extend(trains)
+            if cursor is None:
+                break
+        assert [t['TrainID'] for t in seen] == [t['TrainID'] for t in expected]
+
+
+def test_mock_booking_pages_are_newest_first():
+    store = app.MemoryStateStore()
+    for n in range(7):
+        store.put_booking({'BookingID': f"B{n}", 'UserID': 'u1', 'BookingDate': f"2026-01-0{n + 1}"})
+    assert [b['BookingID'] for b in store.bookings_for_user('u1', 3)] == ['B6', 'B5', 'B4']
+    assert [b['BookingID'] for b in store.bookings_for_user('u1', 3, 3)] == ['B3', 'B2', 'B1']
+    assert [b['BookingID'] for b in store.bookings_for_user('u1', 3, 6)] == ['B0']
+    assert store.bookings_for_user('u1', 3, 9) == []
+    assert len(store.bookings_for_user('u1')) == 7
@@ -0,0 +1,150 @@
+"""JsonResponseCache: cached encoded bodies, ETag/304 and Content-Encoding negotiation."""
+
+import gzip
+import json
+import types
+
+import pytest
+
+import app
+
+LARGE = {'trains': [{'TrainID': str(n), 'Route': 'Mumbai Central - New Delhi'} for n in range(100)]}
+SMALL = {'ok': True}
+
+
+class Builder:
+    """build() callable for respond() that counts how often it runs"""
+
+    def __init__(self, payload, status=200):
+        self.payload = payload
+        self.status = status
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.payload, self.status
+
+
+@pytest.fixture
+def cache():
+    return app.JsonResponseCache(ttl=60, max_age=5, stale_while_revalidate=30)
+
+
+def respond(cache, build, version=1, path='/api/trains', headers=None):
+    with app.app.test_request_context(path, headers=headers or {}):
+        # As Flask does with a view's return value (errors come back as (body, status))
+        return app.app.make_response(cache.respond(version, build))
+
+
+def test_response_carries_etag_and_cache_headers(cache):
+    response = respond(cache, Builder(SMALL))
+    assert response.status_code == 200
+    assert json.loads(response.get_data()) == SMALL
+    etag, weak = response.get_etag()
+    assert etag and weak
+    assert response.headers['Cache-Control'] == 'public, max-age=5, stale-while-revalidate=30'
+    assert 'Accept-Encoding' in response.vary
+
+
+def test_hits_skip_the_build(cache):
+    build = Builder(SMALL)
+    first = respond(cache, build)
+    second = respond(cache, build)
+    assert build.calls == 1
+    assert second.get_data() == first.get_data()
+    assert second.get_etag() == first.get_etag()
+
+
+def test_entries_are_keyed_on_query_string_and_version(cache):
+    build = Builder(SMALL)
+    respond(cache, build, path='/api/trains?route=delhi')
+    respond(cache, build, path='/api/trains?route=pune')
+    respond(cache, build, path='/api/trains?route=delhi', version=2)
+    respond(cache, build, path='/api/trains?route=delhi', version=2)
+    assert build.calls == 3
+
+
+def test_matching_if_none_match_answers_304(cache):
+    build = Builder(LARGE)
+    etag, _ = respond(cache, build).get_etag()
+    for header in (f'W/"{etag}"', f'"other", W/"{etag}"', '*'):
+        response = respond(cache, build, headers={'If-None-Match': header, 'Accept-Encoding': 'gzip'})
+        assert response.status_code == 304
+        assert response.get_data() == b''
+        assert response.get_etag() == (etag, True)
+        assert 'Content-Encoding' not in response.headers
+    assert respond(cache, build, headers={'If-None-Match': 'W/"stale"'}).status_code == 200
+
+
+def test_etag_changes_with_the_payload(cache):
+    first, _ = respond(cache, Builder(SMALL)).get_etag()
+    second, _ = respond(cache, Builder({'ok': False}), version=2).get_etag()
+    assert first != second
+
+
+def test_errors_are_returned_and_not_cached(cache):
+    build = Builder({'error': 'Train not found'}, 404)
+    for _ in range(2):
+        response = respond(cache, build, path='/api/train/0')
+        assert response.status_code == 404
+        assert json.loads(response.get_data()) == {'error': 'Train not found'}
+        assert response.get_etag() == (None, None)
+    assert build.calls == 2
+
+
+def test_large_bodies_are_gzipped_when_accepted(cache, monkeypatch):
+    monkeypatch.setattr(app, 'brotli', None)
+    build = Builder(LARGE)
+    plain = respond(cache, build)
+    assert 'Content-Encoding' not in plain.headers
+
+    for accept in ('gzip', 'br, gzip;q=0.5', 'gzip, deflate'):
+        response = respond(cache, build, headers={'Accept-Encoding': accept})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.get_data()) == plain.get_data()
+        assert response.get_etag() == plain.get_etag()
+    assert respond(cache, build, headers={'Accept-Encoding': 'gzip;q=0'}).headers.get('Content-Encoding') is None
+    assert build.calls == 1
+
+
+def test_small_bodies_are_not_compressed(cache):
+    response = respond(cache, Builder(SMALL), headers={'Accept-Encoding': 'gzip, br'})
+    assert 'Content-Encoding' not in response.headers
+    assert len(response.get_data()) < app.JsonResponseCache.MIN_COMPRESS_SIZE
+
+
+def test_brotli_is_preferred_when_available(cache, monkeypatch):
+    compressed = []
+
+    def compress(data):
+        compressed.append(data)
+        return b'BR' + data
+
+    monkeypatch.setattr(app, 'brotli', types.SimpleNamespace(compress=compress))
+    build = Builder(LARGE)
+    for _ in range(2):
+        response = respond(cache, build, headers={'Accept-Encoding': 'gzip, br'})
+        assert response.headers['Content-Encoding'] == 'br'
+        assert response.get_data().startswith(b'BR')
+    # Each encoding is produced once per entry
+    assert len(compressed) == 1
+    response = respond(cache, build, headers={'Accept-Encoding': 'gzip, br;q=0'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+
+
+def test_zero_ttl_disables_reuse():
+    cache = app.JsonResponseCache(ttl=0, max_age=0, stale_while_revalidate=0)
+    build = Builder(SMALL)
+    etags = {respond(cache, build).get_etag() for _ in range(2)}
+    assert build.calls == 2
+    assert len(etags) == 1
+
+
+def test_train_api_revalidates_with_304():
+    client = app.app.test_client()
+    first = client.get('/api/trains?route=delhi')
+    assert first.status_code == 200
+    etag, _ = first.get_etag()
+    again = client.get('/api/trains?route=delhi', headers={'If-None-Match': f'W/"{etag}"'})
+    assert again.status_code == 304
+    assert client.get('/api/train/12951', headers={'If-None-Match': f'W/"{etag}"'}).status_code == 200
@@ -0,0 +1,124 @@
+"""Berth geometry and allocation: CoachLayout, SeatMap bitsets and the mock BerthAllocator."""
+
+from datetime import date
+
+import app
+
+DAY = date(2026, 12, 1)
+
+
+def bits(*positions):
+    mask = 0
+    for position in positions:
+        mask |= 1 << position
+    return mask
+
+
+def test_coach_layout_repeats_its_bay():
+    layout = app.COACH_LAYOUTS['AC3']
+    assert [layout.berth_type(n) for n in (1, 2, 3, 7, 8, 9)] == [
+        'Lower', 'Middle', 'Upper', 'Side Lower', 'Side Upper', 'Lower'
+    ]
+    assert app.SeatMap('Unknown class', 10).layout is app.DEFAULT_COACH_LAYOUT
+
+
+def test_positions_map_to_coaches_and_back():
+    seat_map = app.SeatMap('AC2', 100)
+    assert seat_map.describe(0) == {'Coach': 'B1', 'Berth': '1', 'Type': 'Lower'}
+    assert seat_map.describe(50) == {'Coach': 'B2', 'Berth': '3', 'Type': 'Lower'}
+    assert seat_map.describe(99) == {'Coach': 'B3', 'Berth': '4', 'Type': 'Upper'}
+    assert all(seat_map.position(seat_map.describe(p)) == p for p in range(100))
+    # Only the first `capacity` positions are sellable
+    assert seat_map.remaining(0) == 100
+    assert seat_map.remaining(bits(0, 99, 100, 140)) == 98
+
+
+def test_group_is_seated_together_inside_one_coach():
+    seat_map = app.SeatMap('AC2', 96)
+    # Coach 1 has only berths 47 and 48 left: a group of four goes to coach 2
+    berths, occupied = seat_map.allocate(bits(*range(46)), 4)
+    assert [(b['Coach'], b['Berth']) for b in berths] == [('B2', '1'), ('B2', '2'), ('B2', '3'), ('B2', '4')]
+    assert occupied == bits(*range(46), 48, 49, 50, 51)
+
+
+def test_group_prefers_a_run_with_the_preferred_berth():
+    seat_map = app.SeatMap('AC2', 48)
+    berths, _ = seat_map.allocate(0, 2, 'Side Lower')
+    assert [b['Type'] for b in berths] == ['Upper', 'Side Lower']
+
+
+def test_group_without_a_free_run_is_split():
+    seat_map = app.SeatMap('AC1', 4)
+    berths, occupied = seat_map.allocate(bits(1, 2), 2)
+    assert [b['Berth'] for b in berths] == ['1', '4']
+    assert occupied == bits(0, 1, 2, 3)
+
+
+def test_preference_falls_back_to_the_lowest_free_berth():
+    seat_map = app.SeatMap('AC2', 48)
+    berths, _ = seat_map.allocate(0, 1, 'Side Lower')
+    assert berths == [{'Coach': 'B1', 'Berth': '5', 'Type': 'Side Lower'}]
+
+    side_lowers = seat_map.type_masks['Side Lower']
+    berths, _ = seat_map.allocate(side_lowers | bits(0), 1, 'Side Lower')
+    assert berths == [{'Coach': 'B1', 'Berth': '2', 'Type': 'Upper'}]
+
+
+def test_allocation_fails_without_enough_free_seats():
+    seat_map = app.SeatMap('SL', 5)
+    assert seat_map.allocate(bits(0, 1, 2), 3) is None
+    assert seat_map.allocate(0, 0) is None
+    _, occupied = seat_map.allocate(bits(0, 1, 2), 2)
+    assert seat_map.remaining(occupied) == 0
+    assert seat_map.allocate(occupied, 1) is None
+
+
+def test_release_frees_exactly_the_given_berths():
+    seat_map = app.SeatMap('AC3', 72)
+    first, occupied = seat_map.allocate(0, 3)
+    second, occupied = seat_map.allocate(occupied, 2)
+    occupied = seat_map.release(occupied, first)
+    assert occupied == bits(*(seat_map.position(b) for b in second))
+    assert seat_map.remaining(occupied) == 70
+
+
+def test_seat_maps_are_shared_per_class_and_capacity():
+    assert app.get_seat_map('AC2', 48) is app.get_seat_map('AC2', 48)
+    assert app.get_seat_map('AC2', 48) is not app.get_seat_map('AC2', 96)
+
+
+def allocator(availability=3):
+    catalog = app.TrainCatalog([
+        {'TrainID': 'T1', 'Route': 'Alpha - Beta', 'Classes': {'AC1': {'Availability': availability, 'Fare': 100}}}
+    ])
+    return app.BerthAllocator(catalog, app.SeatInventory(catalog))
+
+
+def test_allocator_keeps_the_inventory_counter_in_step():
+    berths = allocator()
+    assert berths.inventory.get('T1', DAY, 'AC1') == 3
+    first = berths.allocate('T1', DAY, 'AC1', 2)
+    assert [b['Berth'] for b in first] == ['1', '2']
+    assert berths.inventory.get('T1', DAY, 'AC1') == 1
+    assert berths.allocate('T1', DAY, 'AC1', 2) is None
+    assert berths.inventory.get('T1', DAY, 'AC1') == 1
+    # Other dates are untouched
+    assert berths.inventory.get('T1', date(2026, 12, 2), 'AC1') == 3
+    assert berths.journeys(DAY) == [('T1', 'AC1')]
+
+
+def test_allocator_release_returns_the_seats():
+    berths = allocator()
+    first = berths.allocate('T1', DAY, 'AC1', 2)
+    berths.release('T1', DAY, 'AC1', first)
+    assert berths.inventory.get('T1', DAY, 'AC1') == 3
+    assert berths.occupancy() == {('T1', DAY.toordinal(), 'AC1'): 0}
+    assert [b['Berth'] for b in berths.allocate('T1', DAY, 'AC1', 3)] == ['1', '2', '3']
+
+
+def test_allocator_ignores_unknown_trains_and_classes():
+    berths = allocator()
+    assert berths.allocate('T1', DAY, 'SL', 1) is None
+    assert berths.allocate('T9', DAY, 'AC1', 1) is None
+    berths.release('T9', DAY, 'AC1', [{'Coach': 'A1', 'Berth': '1'}])
+    assert berths.occupancy() == {}
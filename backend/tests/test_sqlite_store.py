@@ -0,0 +1,118 @@
+"""
+SqliteStateStore: state shared by several processes through one database,
+with BEGIN IMMEDIATE serialising their writes. Every process is a fresh
+interpreter (start_app) pointed at the same file.
+"""
+
+import os
+import sqlite3
+import time
+
+import pytest
+
+from conftest import app_result, run_app, start_app
+
+WORKERS = 4
+
+# Each worker reports ready, then waits for the test to release all of them at once
+START_TOGETHER = """
+    import time
+    open(os.path.join(os.environ['SYNC_DIR'], f"ready-{os.getpid()}"), 'w').close()
+    while not os.path.exists(os.path.join(os.environ['SYNC_DIR'], 'go')):
+        time.sleep(0.01)
+"""
+
+
+@pytest.fixture
+def sqlite_env(tmp_path):
+    return {
+        'MOCK_STATE_BACKEND': 'sqlite',
+        'MOCK_STATE_DB': str(tmp_path / 'state.sqlite3'),
+        'SYNC_DIR': str(tmp_path),
+    }
+
+
+def run_together(env, *blocks):
+    """Run the blocks in WORKERS processes released at the same moment; returns their results"""
+    processes = [start_app(START_TOGETHER, *blocks, **env) for _ in range(WORKERS)]
+    deadline = time.time() + 60
+    while sum(name.startswith('ready-') for name in os.listdir(env['SYNC_DIR'])) < WORKERS:
+        assert time.time() < deadline, 'workers did not start'
+        time.sleep(0.05)
+    open(os.path.join(env['SYNC_DIR'], 'go'), 'w').close()
+    return [app_result(process) for process in processes]
+
+
+def test_concurrent_bookings_never_oversell(sqlite_env):
+    # AC1 on 12951 has 12 seats; four processes try to book 10 each
+    results = run_together(sqlite_env, """
+    train = app.db_service.get_train_by_id('12951')
+    booked = []
+    for n in range(10):
+        booking = app.db_service.commit_booking(train, 'AC1', 1, f"P{n}", journey_date='2026-12-01')
+        if booking:
+            berth = booking['BerthAllocations'][0]
+            booked.append([booking['BookingID'], booking['PNR'], f"{berth['Coach']}/{berth['Berth']}"])
+    emit(booked)
+""")
+    booked = sum(results, [])
+    assert len(booked) == 12
+    for column in range(3):
+        assert len({row[column] for row in booked}) == 12
+    assert run_app("""
+    emit(app.db_service.get_journey_availability('12951', '2026-12-01'))
+""", **sqlite_env) == {'AC1': 0, 'AC2': 28, 'AC3': 45}
+
+
+def test_concurrent_registrations_have_one_winner(sqlite_env):
+    results = run_together(sqlite_env, """
+    user = app.user_service.register_user('Alice', 'alice@example.com', 'secret1', 'Alice')
+    emit(user['user_id'] if user else None)
+""")
+    winners = [user_id for user_id in results if user_id]
+    assert len(winners) == 1
+    assert run_app("""
+    emit([app.mock_store.find_user('alice')['user_id'], app.mock_store.find_user('ALICE@example.com')['user_id']])
+""", **sqlite_env) == winners * 2
+
+
+def test_id_leases_do_not_overlap(sqlite_env):
+    results = run_together(sqlite_env, """
+    emit([app.mock_store.lease_ids('booking_id', 50) for _ in range(20)])
+""")
+    starts = sorted(sum(results, []))
+    assert len(starts) == WORKERS * 20
+    assert all(later - earlier >= 50 for earlier, later in zip(starts, starts[1:]))
+
+
+def test_writes_are_visible_to_other_processes(sqlite_env):
+    booking = run_app("""
+    user = app.user_service.register_user('bob', 'bob@example.com', 'secret1', 'Bob')
+    train = app.db_service.get_train_by_id('12627')
+    booking = app.db_service.commit_booking(train, 'SL', 2, 'Bob', journey_date='2026-12-01', user_id=user['user_id'])
+    emit({'id': booking['BookingID'], 'pnr': booking['PNR'], 'user': user['user_id']})
+""", **sqlite_env)
+    seen = run_app(f"""
+    emit({{
+        'by_pnr': app.db_service.get_booking_by_pnr('{booking['pnr']}')['BookingID'],
+        'by_user': [b['BookingID'] for b in app.db_service.get_bookings_by_user_id('{booking['user']}')],
+        'seats': app.db_service.get_journey_availability('12627', '2026-12-01')['SL'],
+    }})
+""", **sqlite_env)
+    assert seen == {'by_pnr': booking['id'], 'by_user': [booking['id']], 'seats': 42 - 2}
+
+
+def test_databases_from_before_the_booking_columns_are_migrated(sqlite_env):
+    conn = sqlite3.connect(sqlite_env['MOCK_STATE_DB'])
+    conn.executescript("""
+        CREATE TABLE bookings (booking_id TEXT PRIMARY KEY, user_id TEXT, data TEXT NOT NULL);
+        INSERT INTO bookings VALUES ('B1', 'u1', '{"BookingID": "B1", "UserID": "u1", "PNR": "4000000001", "BookingDate": "2026-01-02"}');
+        INSERT INTO bookings VALUES ('B2', 'u1', '{"BookingID": "B2", "UserID": "u1", "PNR": "4000000002", "BookingDate": "2026-01-03"}');
+    """)
+    conn.close()
+    assert run_app("""
+    emit([
+        [b['BookingID'] for b in app.mock_store.bookings_for_user('u1')],
+        app.mock_store.get_booking_by_pnr('4000000001')['BookingID'],
+    ])
+""", **sqlite_env) == [['B2', 'B1'], 'B1']
@@ -0,0 +1,47 @@
+"""
+Process pools for CPU-bound work (password hashing) whose workers
+import only the modules their tasks live in, never the app.
+
+Spawned workers normally re-run the parent's __main__ script so that
+functions defined there can be unpickled; under `python app.py` that would
+re-run the whole app (mock store, journal replay, banners) in every worker.
+Pool tasks never live in __main__, so the workers are started while
+__main__ points at this module, whose import has no side effects.
+"""
+
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_start_lock = threading.Lock()
+
+
+def _started() -> int:
+    return os.getpid()
+
+
+def start_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Start a spawn-based process pool with all of its workers running
+    Args:
+        workers: Number of worker processes
+    Returns:
+        The pool; its workers are long-lived and reused for every task
+    Raises:
+        OSError/NotImplementedError where processes cannot be started (e.g. Lambda)
+    """
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    with _start_lock:
+        main = sys.modules['__main__']
+        sys.modules['__main__'] = sys.modules[__name__]
+        try:
+            # Workers are started as tasks are submitted; submitting one task per
+            # worker back to back starts all of them now, while __main__ is swapped
+            warmup = [pool.submit(_started) for _ in range(workers)]
+        finally:
+            sys.modules['__main__'] = main
+    for future in warmup:
+        future.result()
+    return pool